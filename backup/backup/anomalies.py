@@ -0,0 +1,114 @@
+# anomalies.py
+# Materialized threshold anomalies. Rows of system_usage that breach
+# CPU_THRESHOLD / MEM_THRESHOLD are copied into the anomalies table as they
+# arrive (rowid watermark in etl_state, BATCH_ROWS per refresh() call); the
+# table is rebuilt whenever the serving app's thresholds (app.create_app
+# config, defaulting to constants.py) change. Runs outside an app keep the ones
+# it was built with. A rebuild rescans the archived partitions (partitions.py)
+# and then read.db in rowid batches, one transaction each; the new thresholds
+# are only recorded at the end, so an interrupted rebuild starts over.
+#
+# Requests only read the table: maybe_refresh() runs the refresh, and any
+# rebuild, on a background thread.
+import time
+import threading
+import logging
+from constants import CPU_THRESHOLD, MEM_THRESHOLD
+from schema import get_state, set_state
+from flask import has_app_context
+from utils import get_db_connection, setting, db_path, in_background
+import partitions
+
+STATE_NAME = "anomalies"
+REFRESH_INTERVAL_SECONDS = 5
+BATCH_ROWS = 200_000  # rowids scanned per transaction
+
+INSERT_SQL = """INSERT OR REPLACE INTO anomalies (id, timestamp, customer, sid, host, cpu, memory)
+                SELECT rowid, timestamp, customer, sid, host, cpu, memory FROM {schema}.system_usage
+                WHERE rowid > ? AND rowid <= ? AND (cpu >= ? OR memory >= ?)"""
+
+_lock = threading.Lock()
+_last_refresh = {}  # db path -> monotonic time
+
+
+def _thresholds_key(cpu_threshold, mem_threshold):
+    return f"cpu>={cpu_threshold};memory>={mem_threshold}"
+
+
+def _thresholds(meta):
+    if meta and not has_app_context():
+        cpu, memory = (float(part.split(">=")[1]) for part in meta.split(";"))
+        return cpu, memory
+    return setting("CPU_THRESHOLD", CPU_THRESHOLD), setting("MEM_THRESHOLD", MEM_THRESHOLD)
+
+
+def refresh(conn=None, cpu_threshold=None, mem_threshold=None):
+    # one batch of new rows, or a whole rebuild; returns rowids scanned (0: caught up)
+    conn = conn or get_db_connection()
+    with _lock:
+        watermark, meta = get_state(conn, STATE_NAME)
+        defaults = _thresholds(meta)
+        cpu_threshold = defaults[0] if cpu_threshold is None else cpu_threshold
+        mem_threshold = defaults[1] if mem_threshold is None else mem_threshold
+        thresholds = _thresholds_key(cpu_threshold, mem_threshold)
+        if meta != thresholds:
+            logging.info("Anomaly thresholds changed (%s -> %s); rebuilding", meta, thresholds)
+            scanned = _rebuild(conn, cpu_threshold, mem_threshold)
+            with conn:
+                set_state(conn, STATE_NAME, scanned, thresholds)
+        else:
+            high = conn.execute("SELECT MAX(rowid) FROM main.system_usage").fetchone()[0] or 0
+            high = min(high, watermark + BATCH_ROWS)
+            scanned = max(high - watermark, 0)
+            if scanned:
+                with conn:
+                    conn.execute(INSERT_SQL.format(schema="main"), (watermark, high, cpu_threshold, mem_threshold))
+                    set_state(conn, STATE_NAME, high, thresholds)
+        _last_refresh[db_path()] = time.monotonic()
+    return scanned
+
+
+def _rescan(conn, schema, cpu_threshold, mem_threshold):
+    # replace what the old thresholds kept of one database's rows; returns its MAX(rowid)
+    low, high = conn.execute(f"SELECT MIN(rowid) - 1, MAX(rowid) FROM {schema}.system_usage").fetchone()
+    if high is None:
+        return 0
+    for lo in range(low, high, BATCH_ROWS):
+        hi = min(lo + BATCH_ROWS, high)
+        with conn:
+            conn.execute(f"""DELETE FROM anomalies WHERE id IN
+                             (SELECT rowid FROM {schema}.system_usage WHERE rowid > ? AND rowid <= ?)""", (lo, hi))
+            conn.execute(INSERT_SQL.format(schema=schema), (lo, hi, cpu_threshold, mem_threshold))
+    return high
+
+
+def _rebuild(conn, cpu_threshold, mem_threshold):
+    # ATTACH is not allowed inside a transaction, so attach a batch of months, then rescan it
+    months = partitions.archived_months()
+    for i in range(0, len(months), partitions.MAX_ATTACHED):
+        batch = months[i:i + partitions.MAX_ATTACHED]
+        partitions.attach_months(conn, batch)
+        for month in batch:
+            _rescan(conn, partitions.schema_name(month), cpu_threshold, mem_threshold)
+        logging.info("Rescanned archived months %s..%s for anomalies", batch[0], batch[-1])
+    return _rescan(conn, "main", cpu_threshold, mem_threshold)
+
+
+def catch_up(conn=None, cpu_threshold=None, mem_threshold=None):
+    while refresh(conn, cpu_threshold, mem_threshold):
+        pass
+
+
+def maybe_refresh():
+    # called on the request path: never waits for a refresh. The background
+    # thread has no app context, so it is handed this app's thresholds.
+    path = db_path()
+    if time.monotonic() - _last_refresh.get(path, 0.0) >= REFRESH_INTERVAL_SECONDS:
+        _last_refresh[path] = time.monotonic()
+        in_background("anomaly-refresh", catch_up, None, *_thresholds(None))
+
+
+if __name__ == "__main__":
+    import logsetup
+    logsetup.setup()
+    catch_up()
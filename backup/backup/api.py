@@ -0,0 +1,165 @@
+# api.py
+# Compact columnar JSON for the usage and filesystem charts.
+# Each series is {"name", "t": [epoch seconds], "v": [values]} after
+# downsampling; responses carry a content ETag and are gzipped on request.
+import gzip
+import json
+import hashlib
+import logging
+import numpy as np
+from flask import Response, request
+from constants import SQL, CHART_POINT_BUDGET, COMPARE_MAX_HOSTS, COMPARE_POINT_BUDGET, COMPARE_HEATMAP_BUCKETS
+from utils import fetch_query, get_db_connection, day_range, date_span, epoch_range
+import rollups
+import downsample
+import partitions
+import dimensions
+
+MIN_GZIP_BYTES = 1024
+
+USAGE_LABELS = ["CPU %", "Memory %"]
+COMPARE_METRICS = {"cpu": 0, "memory": 1}  # heatmap metric -> USAGE_LABELS index
+FS_DB_METRICS = ["hana_data_used_percent", "hana_backup_used_percent", "hana_log_used_percent"]
+FS_DB_LABELS = ["/hana/data (used %)", "/hana/backup (used %)", "/hana/logs (used %)"]
+FS_APP_METRICS = ["usr_sap_used_percent", "sapmnt_used_percent", "usr_sap_trans_used_percent"]
+FS_APP_LABELS = ["/usr/sap (used %)", "/sapmnt (used %)", "/usr/sap/trans (used %)"]
+
+
+def _routed(sql, span):
+    # raw rows older than the hot window live in monthly partition files
+    return partitions.routed(get_db_connection(), sql, *span)
+
+
+def usage_rows(values):
+    customer, sid, host = values.get("customer", ""), values.get("sid", ""), values.get("host", "")
+    report_type = values.get("report_type", "day")
+    if report_type == "day":
+        span = epoch_range(day_range(values["date"]))
+        return fetch_query(_routed(SQL["daily_usage"], span), (customer, sid, host, *span), "daily_usage")
+    if report_type == "custom":
+        start, end = date_span(values["start_date"], values["end_date"])
+        rows = rollups.series("system_usage", ["cpu", "memory"], customer, sid, host, start, end)
+        if rows is None:
+            span = epoch_range((start, end))
+            rows = fetch_query(_routed(SQL["custom_usage"], span), (customer, sid, host, *span), "custom_usage")
+        return rows
+    return []
+
+
+def filesystem_rows(values):
+    customer, sid, host = values.get("customer", ""), values.get("sid", ""), values.get("host", "")
+    report_type = values.get("report_type", "day")
+    is_db_host = "db" in host.lower()
+    labels = FS_DB_LABELS if is_db_host else FS_APP_LABELS
+    if report_type == "day":
+        key = "daily_db_file_system" if is_db_host else "daily_app_file_system"
+        span = epoch_range(day_range(values["date"]))
+        return fetch_query(_routed(SQL[key], span), (customer, sid, host, *span), key), labels
+    if report_type == "custom":
+        start, end = date_span(values["start_date"], values["end_date"])
+        rows = rollups.series("file_system_usage", FS_DB_METRICS if is_db_host else FS_APP_METRICS,
+                              customer, sid, host, start, end)
+        if rows is None:
+            key = "custom_db_file_usage" if is_db_host else "custom_app_file_usage"
+            span = epoch_range((start, end))
+            rows = fetch_query(_routed(SQL[key], span), (customer, sid, host, *span), key)
+        return rows, labels
+    return [], labels
+
+
+def _values(y):
+    rounded = np.round(y, 2)
+    return [None if v != v else v for v in rounded.tolist()]  # NaN -> null
+
+
+def _epochs(x):
+    return x.astype("datetime64[s]").astype(np.int64)
+
+
+def _series(x, ys, labels, budget=CHART_POINT_BUDGET):
+    series = []
+    for label, y in zip(labels, ys):
+        sx, sy = downsample.reduce(x, y, budget)
+        series.append({"name": label, "t": _epochs(sx).tolist(), "v": _values(sy)})
+    return series
+
+
+def columnar(rows, labels, complete_only=False):
+    x, ys = downsample.columns(rows, len(labels))
+    if complete_only:
+        x, ys = downsample.drop_incomplete(x, ys)
+    series = _series(x, ys, labels)
+    logging.info("Chart payload", extra={"fields": {
+        "rows": len(rows), "points": max((len(s["t"]) for s in series), default=0)}})
+    return {"rows": len(rows), "series": series}
+
+
+def compare_rows(values):
+    # (host, ts, cpu, memory) rows of several hosts of one SID, ordered by host,
+    # from a single statement: the host IN list is one seek per host on
+    # idx_system_usage_cust_sid_host_epoch (or on the rollup primary key)
+    customer, sid = values["customer"], values["sid"]
+    hosts = sorted({h for h in values.getlist("host") if h}) or dimensions.hosts("system_usage", customer, sid)
+    hosts = hosts[:COMPARE_MAX_HOSTS]
+    report_type = values.get("report_type", "day")
+    if report_type == "day":
+        bounds = day_range(values["date"])
+    elif report_type == "custom":
+        bounds = date_span(values["start_date"], values["end_date"])
+    else:
+        raise ValueError(f"Unsupported report type: {report_type}")
+    span = epoch_range(bounds)
+    if not hosts:
+        return [], hosts, span
+    rows = rollups.series_by_host("system_usage", ["cpu", "memory"], customer, sid, hosts, *bounds)
+    if rows is None:
+        sql = f"""SELECT host, ts, cpu, memory FROM system_usage
+                  WHERE customer=? AND sid=? AND host IN ({', '.join('?' * len(hosts))})
+                    AND ts >= ? AND ts < ?
+                  ORDER BY host, ts"""
+        rows = fetch_query(_routed(sql, span), (customer, sid, *hosts, *span), "compare_usage")
+    return rows, hosts, span
+
+
+def heatmap(keys, x, y, span, buckets=COMPARE_HEATMAP_BUCKETS):
+    # mean of y per (key, time bucket) with np.bincount over a flat index
+    start, end = span
+    step = max(1, -(-(end - start) // buckets))
+    columns = -(-(end - start) // step)
+    row = np.zeros(len(keys), dtype=np.int64)
+    if len(keys):
+        row[1:] = np.cumsum(keys[1:] != keys[:-1])
+    column = (_epochs(x) - start) // step
+    mask = np.isfinite(y) & (column >= 0) & (column < columns)
+    flat = row[mask] * columns + column[mask]
+    size = (int(row[-1]) + 1 if len(keys) else 0) * columns
+    sums = np.bincount(flat, weights=y[mask], minlength=size)
+    counts = np.bincount(flat, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = (sums / counts).reshape(-1, columns)
+    return {"t0": start, "step": step, "z": [_values(line) for line in means]}
+
+
+def compare(values):
+    rows, hosts, span = compare_rows(values)
+    metric = COMPARE_METRICS[values.get("metric", "cpu")]
+    keys, x, ys = downsample.keyed_columns(rows, len(USAGE_LABELS))
+    budget = COMPARE_POINT_BUDGET
+    series = [{"host": host, "series": _series(hx, hys, USAGE_LABELS, budget)}
+              for host, hx, hys in downsample.split_by_key(keys, x, ys)]
+    grid = heatmap(keys, x, ys[metric], span)
+    grid.update(metric=USAGE_LABELS[metric], hosts=[entry["host"] for entry in series])
+    logging.info("Compare payload", extra={"fields": {"rows": len(rows), "hosts": len(series), "requested": len(hosts)}})
+    return {"rows": len(rows), "hosts": hosts, "series": series, "heatmap": grid}
+
+
+def json_response(payload):
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    etag = hashlib.sha1(body).hexdigest()
+    if etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+    headers = {"ETag": f'"{etag}"', "Vary": "Accept-Encoding", "Cache-Control": "private, no-cache"}
+    if len(body) >= MIN_GZIP_BYTES and "gzip" in request.headers.get("Accept-Encoding", ""):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, mimetype="application/json", headers=headers)
@@ -1,81 +1,103 @@
-
-
-
-from flask import Flask, jsonify, render_template, request, send_file, redirect
+# app.py
+# Flask routes, registered on every app built by create_app(). The module-level
+# `app` (gunicorn app:app, asgi.py) is created on first access; servers that
+# want settings or a warm-up call the factory instead, e.g.
+#   gunicorn 'app:create_app(WARM_UP=True)'
+import time
+_startup_from = time.perf_counter()  # the first create_app() is measured from the import
+
+from flask import Flask, Response, abort, current_app, jsonify, render_template, request, redirect, send_file, url_for
 from datetime import datetime
-import io
-import xlsxwriter
-import plotly.graph_objs as go
-from constants import SQL, CPU_THRESHOLD, MEM_THRESHOLD, DB_PATH, PAGE_SIZE
-from utils import fetch_query
+from constants import (SQL, DB_PATH, PAGE_SIZE, CPU_THRESHOLD, MEM_THRESHOLD, FS_THRESHOLD, FORECAST_WARN_DAYS,
+                       STARTUP_TARGET_SECONDS)
+from utils import get_db_connection, day_range, date_span, epoch_range
+from schema import migrate, backfill_pending
+from db import pool
+import rollups
+from export import export_response, iter_file, attachment, requested_format, MIMETYPES
+import reports
+import jobs
+import pagination
+import anomalies
+import baselines
+import api
+import ingest
+import partitions
+import dimensions
+import httpcache
+import fleet
+import forecast
+import backup_sla
+import metrics
+import logsetup
 import logging
-import sqlite3
+import json
 import os
-import math
-
-app = Flask(__name__)
-
-@app.route("/")
-@app.route("/report")
+import re
+import functools
+import importlib.util
+
+JOB_ID_RE = re.compile(r"[0-9a-f]{32}")
+PLOTLY_JS_MAX_AGE = 24 * 3600  # revalidated afterwards; send_file sends the ETag
+
+# settings create_app() accepts, read per request (utils.setting) so several
+# apps can share a process; the partition, archive and export directories are
+# resolved next to DB_PATH
+DEFAULT_CONFIG = {
+    "DB_PATH": DB_PATH,
+    "PAGE_SIZE": PAGE_SIZE,
+    "CPU_THRESHOLD": CPU_THRESHOLD,
+    "MEM_THRESHOLD": MEM_THRESHOLD,
+    "FS_THRESHOLD": FS_THRESHOLD,
+    "WARM_UP": False,
+}
+ROUTES = []  # (rule, options, view)
+
+
+def route(rule, **options):
+    # like Flask.route, but collected for create_app()
+    def register(view):
+        ROUTES.append((rule, options, view))
+        return view
+    return register
+
+
+@route("/metrics")
+def metrics_view():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@route("/")
+@route("/report")
 def landing():
     return render_template("landing.html")
 
 
-@app.route("/dashboard", methods=["GET", "POST"])
+@route("/dashboard", methods=["GET", "POST"])
 def dashboard():
     try:
-        logging.info("starting dashboard route")
-        customers = [row[0] for row in fetch_query(SQL["distinct_customer_dashboard"])]
-        print(f"Available customers: {customers}")
+        customers = dimensions.customers("system_usage")
 
         selected_customer = request.form.get("customer", "")
-        logging.info(f"Selected customer: {selected_customer}")
         selected_sid = request.form.get("sid", "")
-        logging.info(f"Selected SID: {selected_sid}")
         selected_host = request.form.get("host", "")
-    
+
         report_type = request.form.get("report_type", "day")
         date = request.form.get("date", datetime.now().strftime("%Y-%m-%d"))
         start_date = request.form.get("start_date", "")
         end_date = request.form.get("end_date", "")
         graph_html = ""
 
-        sids = [row[0] for row in fetch_query(SQL["distinct_sids"], (selected_customer,))] if selected_customer else []
-        hosts = [row[0] for row in fetch_query(SQL["distinct_hosts"], (selected_customer, selected_sid))] if selected_sid else []
-        
-        logging.info(f"Selected customer: {selected_customer}, SID: {selected_sid}, Host: {selected_host}, Report type: {report_type}, Date: {date}, Start date: {start_date}, End date: {end_date}")
+        sids = dimensions.sids("system_usage", selected_customer) if selected_customer else []
+        hosts = dimensions.hosts("system_usage", selected_customer, selected_sid) if selected_sid else []
         
+        logging.info("%s selection", request.path, extra={"fields": {
+            "customer": selected_customer, "sid": selected_sid, "host": selected_host,
+            "report_type": report_type, "date": date, "start_date": start_date, "end_date": end_date}})
 
-        if request.method == "POST":
-            if report_type == "day":
-                data = fetch_query(SQL["daily_usage"], (selected_customer, selected_sid, selected_host, date))
-                print(f"Daily data for {selected_host}: {data}")
-                logging.info(f"Daily data for {selected_host}: {data}")
-            elif report_type == "custom":
-                data = fetch_query(SQL["custom_usage"], (selected_customer, selected_sid, selected_host, start_date, end_date))
-                print(f"Custom data for {selected_host}: {data}")
-                logging.info(f"Custom data for {selected_host}: {data}")
-            else:
-                data = []
-
-            if data:
-                timestamps = [datetime.fromisoformat(row[0]) for row in data]
-                cpus, mems = zip(*[(row[1], row[2]) for row in data])
-                fig = go.Figure([
-                    go.Scatter(x=timestamps, y=cpus, mode='lines+markers', name="CPU %"),
-                    go.Scatter(x=timestamps, y=mems, mode='lines+markers', name="Memory %")
-                ])
-                print(f"Rendering graph for {selected_host}")
-                logging.info(f"Rendering graph for {selected_host}")
-                
-                fig.update_layout(title="System Usage", xaxis_title="Time", yaxis_title="%", template="plotly_white")
-                graph_html = fig.to_html(
-                    full_html=False,
-                    config={
-                        "modeBarButtonsToAdd": [ "zoom", "pan", "lasso2d", "hoverClosestCartesian"],
-                        "displayModeBar": False,
-                    }
-                )
+        if request.method == "POST" and report_type in ("day", "custom"):
+            graph_html = chart_snippet("api_usage", "System Usage", "%", selected_customer, selected_sid,
+                                       selected_host, report_type, date, start_date, end_date)
 
         return render_template("dashboard.html", customers=customers, sids=sids, hosts=hosts,
                                selected_customer=selected_customer, selected_sid=selected_sid,
@@ -87,312 +109,364 @@ def dashboard():
 
 
 
-@app.route("/download_dashboard", methods=["POST"])
+def chart_snippet(endpoint, title, yaxis_title, customer, sid, host, report_type, date, start_date, end_date):
+    # charts are drawn in the browser from the JSON API; the page only embeds the fetch
+    params = {"date": date} if report_type == "day" else {"start_date": start_date, "end_date": end_date}
+    chart_url = url_for(endpoint, customer=customer, sid=sid, host=host, report_type=report_type, **params)
+    return render_template("_chart.html", chart_id=f"chart-{endpoint}", chart_url=chart_url,
+                           title=title, yaxis_title=yaxis_title)
+
+
+@functools.lru_cache(maxsize=1)
+def plotly_bundle():
+    # plotly.min.js shipped with the plotly package; found without importing it
+    spec = importlib.util.find_spec("plotly")
+    return spec and os.path.join(os.path.dirname(spec.origin), "package_data", "plotly.min.js")
+
+
+@route("/static/plotly.min.js")
+def plotly_js():
+    # the charts load plotly.js from here rather than a CDN the browser may not reach
+    if not plotly_bundle():
+        abort(404)
+    return send_file(plotly_bundle(), mimetype="text/javascript", max_age=PLOTLY_JS_MAX_AGE)
+
+
+@route("/api/usage")
+def api_usage():
+    try:
+        return api.json_response(api.columnar(api.usage_rows(request.args), api.USAGE_LABELS))
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid parameters: {e}"}), 400
+
+
+@route("/api/filesystem")
+def api_filesystem():
+    try:
+        rows, labels = api.filesystem_rows(request.args)
+        return api.json_response(api.columnar(rows, labels, complete_only=True))
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid parameters: {e}"}), 400
+
+
+@route("/compare")
+def compare():
+    # small multiples + heatmap for several hosts of one SID, drawn from /api/compare
+    customer, sid = request.args.get("customer", ""), request.args.get("sid", "")
+    report_type = request.args.get("report_type", "day")
+    date = request.args.get("date", datetime.now().strftime("%Y-%m-%d"))
+    start_date, end_date = request.args.get("start_date", ""), request.args.get("end_date", "")
+    metric = request.args.get("metric", "cpu")
+
+    sids = dimensions.sids("system_usage", customer) if customer else []
+    hosts = dimensions.hosts("system_usage", customer, sid) if sid else []
+    selected_hosts = [h for h in request.args.getlist("host") if h in hosts]
+
+    chart_url = None
+    if customer and sid and (report_type == "day" or (start_date and end_date)):
+        params = {"date": date} if report_type == "day" else {"start_date": start_date, "end_date": end_date}
+        chart_url = url_for("api_compare", customer=customer, sid=sid, host=selected_hosts,
+                            report_type=report_type, metric=metric, **params)
+    return render_template("compare.html", customers=dimensions.customers("system_usage"), sids=sids,
+                           hosts=hosts, selected_customer=customer, selected_sid=sid,
+                           selected_hosts=selected_hosts, report_type=report_type, date=date,
+                           start_date=start_date, end_date=end_date, metric=metric, chart_url=chart_url)
+
+
+@route("/api/compare")
+def api_compare():
+    try:
+        return api.json_response(api.compare(request.args))
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid parameters: {e}"}), 400
+
+
+def rollup_version():
+    rollups.maybe_refresh()
+    return httpcache.data_version(get_db_connection(), [],
+                                  ["rollup:system_usage", "rollup:file_system_usage", "partitions"])
+
+
+@route("/fleet")
+@httpcache.conditional(rollup_version)
+def fleet_view():
+    try:
+        summary = fleet.summary(request.args)
+    except ValueError as e:
+        return str(e), 400
+    return render_template("fleet.html", summary=summary, metrics=fleet.METRICS,
+                           selected_metric=request.args.get("metric", "cpu"))
+
+
+@route("/api/fleet")
+@httpcache.conditional(rollup_version)
+def api_fleet():
+    try:
+        return api.json_response(fleet.summary(request.args))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameters: {e}"}), 400
+
+
+def forecast_version():
+    rollups.maybe_refresh()
+    forecast.maybe_refresh()
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    httpcache.modified_since(today.timestamp())  # days left count from today
+    return httpcache.data_version(get_db_connection(), [], ["forecast", "partitions"]) + [str(today.date())]
+
+
+@route("/fs_forecast")
+@httpcache.conditional(forecast_version)
+def fs_forecast():
+    rows = forecast.listing(request.args)
+    return render_template("fs_forecast.html", rows=rows, customers=dimensions.customers("file_system_usage"),
+                           selected_customer=request.args.get("customer", ""), warn_days=FORECAST_WARN_DAYS)
+
+
+@route("/api/fs_forecast")
+@httpcache.conditional(forecast_version)
+def api_fs_forecast():
+    return api.json_response({"forecasts": forecast.listing(request.args)})
+
+
+def backup_sla_version():
+    # ages are computed per minute, so the minute is part of the version
+    backup_sla.maybe_refresh()
+    minute = int(time.time() // 60)
+    httpcache.modified_since(minute * 60)
+    return httpcache.data_version(get_db_connection(), [], ["backup_sla"]) + [minute]
+
+
+@route("/backup_sla")
+@httpcache.conditional(backup_sla_version)
+def backup_sla_view():
+    try:
+        summary = backup_sla.summary(request.args, now=time.time() // 60 * 60)
+    except ValueError as e:
+        return f"Invalid parameters: {e}", 400
+    return render_template("backup_sla.html", summary=summary, customers=dimensions.customers("backup_dashboard"),
+                           selected_customer=request.args.get("customer", ""),
+                           breaching_only=bool(request.args.get("breaching")))
+
+
+@route("/api/backup_sla")
+@httpcache.conditional(backup_sla_version)
+def api_backup_sla():
+    try:
+        return api.json_response(backup_sla.summary(request.args, now=time.time() // 60 * 60))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameters: {e}"}), 400
+
+
+def download_report(name, values):
+    try:
+        report = reports.build(name, values)
+    except ValueError as e:
+        return str(e), 400
+    if report.uses_rollups:
+        rollups.maybe_refresh()
+    try:
+        rows = reports.rows(get_db_connection(), report)
+    except ValueError as e:
+        return str(e), 400
+    return export_response(None, report.headers, report.sheet, report.filename, rows=rows)
+
+
+@route("/exports/<report_name>", methods=["POST"])
+def submit_export(report_name):
+    if report_name not in reports.REPORTS:
+        return jsonify({"error": f"Unknown report {report_name}"}), 404
+    try:
+        status = jobs.submit(report_name, request.values, requested_format())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(status), 202
+
+
+@route("/exports/jobs/<job_id>")
+def export_status(job_id):
+    status = jobs.job_status(job_id) if JOB_ID_RE.fullmatch(job_id) else None
+    if status is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(status)
+
+
+@route("/exports/jobs/<job_id>/download")
+def export_download(job_id):
+    status = jobs.job_status(job_id) if JOB_ID_RE.fullmatch(job_id) else None
+    if status is None or status["status"] != "done":
+        return jsonify(status or {"error": "Unknown job"}), 404 if status is None else 409
+    path, manifest = jobs.artifact_path(job_id)
+    return Response(iter_file(path, remove=False), mimetype=MIMETYPES[manifest["format"]],
+                    headers=attachment(manifest["filename"]))
+
+
+@route("/download_dashboard", methods=["POST"])
+@httpcache.conditional(httpcache.report("download_dashboard"))
 def download_dashboard():
-    customer = request.form["customer"]
-    date = request.form["date"]
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT customer, sid, timestamp, host, cpu, memory FROM system_usage
-        WHERE customer=? AND DATE(timestamp)=DATE(?) ORDER BY timestamp ASC
-    """, (customer, date))
-
-    print(f"Downloading report for customer: {customer}, date: {date}")
-    logging.info(f"Downloading report for customer: {customer}, date: {date}")
-    records = cursor.fetchall()
-    conn.close()
-
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    sheet = workbook.add_worksheet("Daily Report")
-    sheet.write_row(0, 0, ["Customer", "SID", "Date", "Host", "CPU (%)", "Memory (%)"])
-    for i, row in enumerate(records):
-        sheet.write_row(i + 1, 0, row)
-    logging.info(f"Writing {len(records)} records to the report")
-    print(f"Writing {len(records)} records to the report")
-    workbook.close()
-    output.seek(0)
-    return send_file(output, download_name=f"{customer}_Daily_Report.xlsx", as_attachment=True)
-
-
-@app.route("/download_monthly", methods=["POST"])
+    return download_report("download_dashboard", request.form)
+
+
+@route("/download_monthly", methods=["POST"])
+@httpcache.conditional(httpcache.report("download_monthly"))
 def download_monthly():
-    customer = request.form["customer"]
-    date = request.form["date"][:7]
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(SQL["download_monthly"], (customer, date))
-   
-    print(f"Downloading monthly report for customer: {customer}, date: {date}")
-    logging.info(f"Downloading monthly report for customer: {customer}, date: {date}")
-    
-    records = cursor.fetchall()
-    conn.close()
-
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    sheet = workbook.add_worksheet("Monthly Report")
-    sheet.write_row(0, 0, ["Customer", "SID", "Date", "Host", "Avg CPU (%)", "Avg Memory (%)"])
-    for i, row in enumerate(records):
-        sheet.write_row(i + 1, 0, row)
-    logging.info(f"Writing {len(records)} records to the monthly report")
-    print(f"Writing {len(records)} records to the monthly report")
-    workbook.close()
-    output.seek(0)
-    return send_file(output, download_name=f"{customer}_Monthly_Report.xlsx", as_attachment=True)
-
-
-@app.route("/download_custom", methods=["POST"])
+    return download_report("download_monthly", request.form)
+
+
+@route("/download_custom", methods=["POST"])
+@httpcache.conditional(httpcache.report("download_custom"))
 def download_custom():
-    customer = request.form["customer"]
-    sid = request.form["sid"]
-    host = request.form["host"]
-    start_date = request.form["start_date"]
-    end_date = request.form["end_date"]
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(SQL["download_monthly"], (customer, start_date, end_date))
-    
-    print(f"Downloading custom report for customer: {customer}, from {start_date} to {end_date}")
-    logging.info(f"Downloading CPU & memory custom report for customer: {customer}, from {start_date} to {end_date}")
-    records = cursor.fetchall()
-    conn.close()
-
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    sheet = workbook.add_worksheet("Custom Report")
-    sheet.write_row(0, 0, ["Customer", "SID", "Date", "Host", "CPU (%)", "Memory (%)"])
-    for i, row in enumerate(records):
-        sheet.write_row(i + 1, 0, row)
-    logging.info(f"Writing {len(records)} records to the custom report")
-    print(f"Writing {len(records)} records to the custom report")
-    workbook.close()
-    output.seek(0)
-    return send_file(output, download_name=f"{customer}_Custom_Report.xlsx", as_attachment=True)
-
-
-
-
-@app.route("/anomaly")
+    return download_report("download_custom", request.form)
+
+
+ANOMALY_HEADERS = ["Timestamp", "Customer", "SID", "Host", "CPU (%)", "Memory (%)"]
+BASELINE_ANOMALY_HEADERS = ["Timestamp", "Customer", "SID", "Host", "Metric", "Value (%)",
+                            "EWMA (%)", "Rolling mean (%)", "Rolling p95 (%)", "Z-score"]
+
+
+def anomaly_version():
+    # the version of the tables as they are now; refreshes run in the background
+    # and change it once they commit
+    if request.args.get("mode") == "baseline":
+        baselines.maybe_refresh()
+        return httpcache.data_version(get_db_connection(), ["baseline_anomalies"], ["baselines", "partitions"])
+    anomalies.maybe_refresh()
+    return httpcache.data_version(get_db_connection(), ["anomalies"], ["anomalies", "partitions"])
+
+
+@route("/anomaly")
+@httpcache.conditional(anomaly_version)
 def anomaly():
-    page = int(request.args.get("page", 1))  # Default to page 1
-    offset = (page - 1) * PAGE_SIZE
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Count total anomalies
-    cursor.execute(SQL["SQL_COUNT_ANOMALIES"], (CPU_THRESHOLD, MEM_THRESHOLD))
-    total_records = cursor.fetchone()[0]
-    total_pages = math.ceil(total_records / PAGE_SIZE)
-    print(f"Total anomalies: {total_records}, Total pages: {total_pages}")
-    logging.info(f"Total anomalies: {total_records}, Total pages: {total_pages}")
-    
-    # Fetch paginated anomalies
-    cursor.execute(SQL["SQL_SELECT_ANOMALIES"], (CPU_THRESHOLD, MEM_THRESHOLD, PAGE_SIZE, offset))
-    anomalies = cursor.fetchall()
-    conn.close()
-    
-    return render_template("anomaly.html", 
-                           anomalies=anomalies,
+    page = int(request.args.get("page", 1))  # display only; the token does the seeking
+    token = request.args.get("page_token")
+    mode = request.args.get("mode", "threshold")  # "threshold" | "baseline"
+
+    conn = get_db_connection()
+
+    if mode == "baseline":
+        baselines.maybe_refresh()
+        count_sql, select_sql, key = SQL["SQL_COUNT_BASELINE_ANOMALIES"], SQL["SQL_SELECT_BASELINE_ANOMALIES"], "rowid"
+        columns = BASELINE_ANOMALY_HEADERS
+    else:
+        anomalies.maybe_refresh()
+        count_sql, select_sql, key = SQL["SQL_COUNT_ANOMALIES"], SQL["SQL_SELECT_ANOMALIES"], "id"
+        columns = ANOMALY_HEADERS
+
+    # Count total anomalies (cached)
+    total_records = pagination.cached_total(conn, count_sql)
+    total_pages = pagination.total_pages(total_records, current_app.config["PAGE_SIZE"])
+    logging.info("Anomaly page", extra={"fields": {"mode": mode, "total": total_records, "pages": total_pages}})
+
+    # Fetch one keyset page of anomalies
+    try:
+        rows, next_token, prev_token = pagination.fetch_page(
+            conn, select_sql, "", (), "timestamp", key, current_app.config["PAGE_SIZE"], token)
+    except ValueError as e:
+        return str(e), 400
+
+    return render_template("anomaly.html",
+                           anomalies=rows,
+                           columns=columns,
+                           mode=mode,
                            current_page=page,
-                           total_pages=total_pages)
+                           total_pages=total_pages,
+                           next_token=next_token,
+                           prev_token=prev_token)
 
 
 
-@app.route("/download_anomalies")
+@route("/download_anomalies")
+@httpcache.conditional(anomaly_version)
 def download_anomalies():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT timestamp, customer, sid, host, cpu, memory FROM system_usage ORDER BY timestamp DESC LIMIT 1000")
-    records = cursor.fetchall()
-    conn.close()
-    print(f"Fetched {len(records)} records for anomalies")
-    logging.info(f"Fetched {len(records)} records for anomalies")
-    anomalies = [r for r in records if r[4] >= CPU_THRESHOLD or r[5] >= MEM_THRESHOLD]
-
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    sheet = workbook.add_worksheet("Anomalies")
-    sheet.write_row(0, 0, ["Timestamp", "Customer", "SID", "Host", "CPU (%)", "Memory (%)"])
-    for i, row in enumerate(anomalies):
-        sheet.write_row(i + 1, 0, row)
-    logging.info(f"Writing {len(anomalies)} anomalies to the report")
-    print(f"Writing {len(anomalies)} anomalies to the report")
-    workbook.close()
-    output.seek(0)
-
-    return send_file(output, download_name="anomaly_report.xlsx", as_attachment=True)
-
-@app.route("/get_sids")
+    if request.args.get("mode") == "baseline":
+        baselines.maybe_refresh()
+        rows = metrics.timed_execute("download_baseline_anomalies", get_db_connection(),
+                                     SQL["download_baseline_anomalies"])
+        return export_response(None, BASELINE_ANOMALY_HEADERS, "Baseline Anomalies", "baseline_anomaly_report",
+                               rows=rows)
+    anomalies.maybe_refresh()
+    rows = metrics.timed_execute("download_anomalies", get_db_connection(), SQL["download_anomalies"])
+    return export_response(None, ANOMALY_HEADERS, "Anomalies", "anomaly_report", rows=rows)
+
+@route("/get_sids")
 def get_sids():
     customer = request.args.get("customer", "")
-    print(" Selecetd Customer " + customer)
     if not customer:
         return json.dumps([])
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT sid FROM system_usage WHERE customer=?", (customer,))
-    sids = [row[0] for row in cursor.fetchall()]
-    print(f"Fetched SIDs for customer {customer}: {sids}")
-    logging.info(f"Fetched SIDs for customer {customer}: {sids}")
-    conn.close()
-    print(f"Returning SIDs: {sids}")
-    logging.info(f"Returning SIDs: {sids}")
-    return json.dumps(sids)
-
-
-@app.route("/get_backup_sids")
+    return json.dumps(dimensions.sids("system_usage", customer))
+
+
+@route("/get_backup_sids")
 def get_backup_sids():
     customer = request.args.get("customer", "")
-    print(" Selecetd Customer " + customer)
     if not customer:
         return json.dumps([])
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT SYSTEM_ID FROM backup_dashboard WHERE customer=?", (customer,))
-    sids = [row[0] for row in cursor.fetchall()]
-    print(f"Fetched SIDs for customer {customer}: {sids}")
-    logging.info(f"Fetched SIDs for customer {customer}: {sids}")
-    conn.close()
-    return jsonify(sids)
+    return jsonify(dimensions.sids("backup_dashboard", customer))
 
 
-@app.route("/get_hosts")
+@route("/get_hosts")
 def get_hosts():
     customer = request.args.get("customer", "")
     sid = request.args.get("sid", "")
     if not customer or not sid:
         return json.dumps([])
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT host FROM system_usage WHERE customer=? AND sid=?", (customer, sid))
-    hosts = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return json.dumps(hosts)
+    return json.dumps(dimensions.hosts("system_usage", customer, sid))
 
 
-@app.route('/get_customers')
+@route('/get_customers')
 def get_customers():
-    logging.info("starting dashboard route")
-    customers = [row[0] for row in fetch_query(SQL["distinct_customer_backup"])]
-    print(f"Available customers for backup_dashboard: {customers}")
-    return jsonify(customers)
-
-
-@app.route("/backup_dashboard")
-def backup():
-    page = int(request.args.get("page", 1))  # Default to page 1
-    offset = (page - 1) * PAGE_SIZE
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Count total anomalies
-    cursor.execute(SQL["SQL_BACKUP_STATUS_COUNT"])
-    total_records = cursor.fetchone()[0]
-    total_pages = math.ceil(total_records  / PAGE_SIZE)
-
-    # Fetch paginated backup
-    cursor.execute(SQL["SQL_SELECT_BACKUP_STATUS"], (PAGE_SIZE, offset))
-    backup_status = cursor.fetchall()
-    conn.close()
-    print(f"Fetched {len(backup_status)} records for backup status")
-    logging.info(f"Fetched {len(backup_status)} records for backup status") 
-    return render_template("backup_dashboard.html", 
-                           backup_status=backup_status,
-                           current_page=page,
-                           total_pages=total_pages)
-
+    return jsonify(dimensions.customers("backup_dashboard"))
 
-@app.route("/download_backup")
-def download_backup():
-    
 
-    customer = request.args.get("customer")
-    sid = request.args.get("sid")  # Optional
-    date = request.args.get("date")  # Optional single-day
-    start_date = request.args.get("start_date")
-    end_date = request.args.get("end_date")
+def backup_version():
+    # follows the backup_sla watermark, like the download_backup report
+    backup_sla.maybe_refresh()
+    return httpcache.data_version(get_db_connection(), [], [backup_sla.STATE_NAME, "partitions"])
 
-    print(f"Download request for customer: {customer}, SID: {sid}, date: {date}, start_date: {start_date}, end_date: {end_date}")
-    logging.info(f"Download request for customer: {customer}, SID: {sid}, date: {date}, start_date: {start_date}, end_date: {end_date}")
 
-    if not customer:
-        return "Customer is required", 400
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Build WHERE clause
-    conditions = ["CUSTOMER = ?"]
-    params = [customer]
-
-    if sid:
-        conditions.append("SYSTEM_ID = ?")
-        params.append(sid)
-
-    # Apply date filter regardless of SID
-    if date:
-        conditions.append("DATE(SYS_START_TIME) = DATE(?)")
-        params.append(date)
-    elif start_date and end_date:
-        conditions.append("DATE(SYS_START_TIME) BETWEEN DATE(?) AND DATE(?)")
-        params.extend([start_date, end_date])
-
-    where_clause = " AND ".join(conditions)
-    print(f"Where clause: {where_clause}, Params: {params}")
-    logging.info(f"Where clause: {where_clause}, Params: {params}")
-
-    # Fetch data
-    cursor.execute(f"""
-        SELECT CUSTOMER, SYSTEM_ID, HOST, Database_type,
-               strftime('%Y-%m-%d %H:%M:%S', SYS_START_TIME) AS SYS_START_TIME,
-               ENTRY_TYPE_NAME, STATE_NAME
-        FROM backup_dashboard
-        WHERE {where_clause}
-        ORDER BY SYS_START_TIME DESC
-    """, params)
-    records = cursor.fetchall()
-    print(f"Fetched {len(records)} rows for export")
-    conn.close()
-
-    # Prepare Excel file in memory
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    worksheet = workbook.add_worksheet("Backup Status")
+@route("/backup_dashboard")
+@httpcache.conditional(backup_version)
+def backup():
+    page = int(request.args.get("page", 1))  # display only; the token does the seeking
+    token = request.args.get("page_token")
 
-    headers = ["Customer", "SID", "Host", "Database_type", "Date", "Entry Type", "Status"]
-    for col_num, header in enumerate(headers):
-        worksheet.write(0, col_num, header)
+    conn = get_db_connection()
 
-    for row_num, row in enumerate(records, start=1):
-        for col_num, cell in enumerate(row):
-            worksheet.write(row_num, col_num, cell)
+    # Count total backups (cached)
+    total_records = pagination.cached_total(conn, SQL["SQL_BACKUP_STATUS_COUNT"])
+    total_pages = pagination.total_pages(total_records, current_app.config["PAGE_SIZE"])
 
-    workbook.close()
-    output.seek(0)
+    # Fetch one keyset page of backups
+    try:
+        backup_status, next_token, prev_token = pagination.fetch_page(
+            conn, SQL["SQL_SELECT_BACKUP_STATUS"], "", (),
+            "backup_dashboard.start_ts", "backup_dashboard.rowid", current_app.config["PAGE_SIZE"], token)
+    except ValueError as e:
+        return str(e), 400
+    logging.info("Backup status page", extra={"fields": {"rows": len(backup_status)}})
+    return render_template("backup_dashboard.html",
+                           backup_status=backup_status,
+                           current_page=page,
+                           total_pages=total_pages,
+                           next_token=next_token,
+                           prev_token=prev_token)
 
-    filename = f"{customer}_Backup_Status_Report.xlsx"
-    return send_file(output, as_attachment=True, download_name=filename,
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
+@route("/download_backup")
+@httpcache.conditional(httpcache.report("download_backup"))
+def download_backup():
+    if not request.args.get("customer"):
+        return "Customer is required", 400
+    return download_report("download_backup", request.args)
 
 
-@app.route("/get_backup_status")
+@route("/get_backup_status")
+@httpcache.conditional(backup_version)
 def get_backup_status():
-    import sqlite3
-    import math
-    from flask import request, jsonify
-
     customer = request.args.get("customer")
     sids = request.args.getlist("sid")  # Handles sid=FS1&sid=FQ1
-    page = int(request.args.get("page", 1))
+    page_token = request.args.get("page_token")
     page_size = int(request.args.get("page_size", 10))
-    offset = (page - 1) * page_size
 
     date = request.args.get("date")
     start_date = request.args.get("start_date")
@@ -401,8 +475,7 @@ def get_backup_status():
     if not customer:
         return jsonify({"error": "Customer is required"}), 400
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    conn = get_db_connection()
 
     # -- Build WHERE clause dynamically
     conditions = ["CUSTOMER = ?"]
@@ -415,34 +488,38 @@ def get_backup_status():
         conditions.append(f"SYSTEM_ID IN ({placeholders})")
         params.extend(sids)
 
+    # without a date filter only the hot months in read.db are listed
+    span = None
     if date:
-        conditions.append("DATE(SYS_START_TIME) = DATE(?)")
-        params.append(date)
+        span = epoch_range(day_range(date))
     elif start_date and end_date:
-        conditions.append("DATE(SYS_START_TIME) BETWEEN DATE(?) AND DATE(?)")
-        params.extend([start_date, end_date])
+        span = epoch_range(date_span(start_date, end_date))
+    if span:
+        conditions.append("start_ts >= ? AND start_ts < ?")
+        params.extend(span)
 
     where_clause = " AND ".join(conditions)
-
-    # -- Count records
+    select_sql = SQL["SQL_SELECT_BACKUP_STATUS"]
     count_query = f"SELECT COUNT(*) FROM backup_dashboard WHERE {where_clause}"
-    cursor.execute(count_query, params)
-    total_records = cursor.fetchone()[0]
-    total_pages = max(1, math.ceil(total_records / page_size))
-
-    # -- Fetch paginated records
-    data_query = f"""
-        SELECT CUSTOMER, SYSTEM_ID, HOST, Database_type,
-               strftime('%Y-%m-%d %H:%M:%S', SYS_START_TIME) AS SYS_START_TIME,
-               ENTRY_TYPE_NAME, STATE_NAME
-        FROM backup_dashboard
-        WHERE {where_clause}
-        ORDER BY SYS_START_TIME DESC
-        LIMIT ? OFFSET ?
-    """
-    cursor.execute(data_query, params + [page_size, offset])
-    rows = cursor.fetchall()
-    conn.close()
+    if span:
+        try:
+            select_sql = partitions.routed(conn, select_sql, *span)
+            count_query = partitions.routed(conn, count_query, *span)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    # -- Count records (cached)
+    total_records = pagination.cached_total(conn, count_query, params, "backup_status_count")
+    total_pages = pagination.total_pages(total_records, page_size)
+
+    # -- Fetch one keyset page of records
+    try:
+        rows, next_token, prev_token = pagination.fetch_page(
+            conn, select_sql, where_clause, params,
+            "backup_dashboard.start_ts", "backup_dashboard.rowid", page_size, page_token,
+            "SQL_SELECT_BACKUP_STATUS")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     return jsonify({
         "records": [
@@ -457,26 +534,20 @@ def get_backup_status():
             } for row in rows
         ],
         "total_pages": total_pages,
-        "total_records": total_records
+        "total_records": total_records,
+        "next_page_token": next_token,
+        "prev_page_token": prev_token,
     })
 
 
 ######### file system routes#########
-@app.route("/filesystem", methods=["GET", "POST"])
+@route("/filesystem", methods=["GET", "POST"])
 def filesystem():
     try:
-        logging.info("starting filesystem route")
-        customers = [row[0] for row in fetch_query(SQL["distinct_customer_filesystem"])]
-        print(f"Available filesystem customers: {customers}")
+        customers = dimensions.customers("file_system_usage")
         selected_customer = request.form.get("customer", "")
-        logging.info(f"Selected customer: {selected_customer}")
-
         selected_sid = request.form.get("sid", "")
-        logging.info(f"Selected SID: {selected_sid}")
-        print(f"Selected SID: {selected_sid}")
-
         selected_host = request.form.get("host", "")
-        print(f"Selected Host: {selected_host}")
 
         report_type = request.form.get("report_type", "day")
         date = request.form.get("date", datetime.now().strftime("%Y-%m-%d"))
@@ -484,96 +555,16 @@ def filesystem():
         end_date = request.form.get("end_date", "")
         graph_html = ""
 
-        sids = [row[0] for row in fetch_query(SQL["distinct_sids_app_filesystem"], (selected_customer,))] if selected_customer else []
-        hosts = [row[0] for row in fetch_query(SQL["distinct_hosts_app_filesystem"], (selected_customer, selected_sid))] if selected_sid else []
-        
-        logging.info(f"Selected customer: {selected_customer}, SID: {selected_sid}, Host: {selected_host}, Report type: {report_type}, Date: {date}, Start date: {start_date}, End date: {end_date}")
+        sids = dimensions.sids("file_system_usage", selected_customer) if selected_customer else []
+        hosts = dimensions.hosts("file_system_usage", selected_customer, selected_sid) if selected_sid else []
         
-        if request.method == "POST":
-            graph_html = ""
-            data = []  # Always define it
-
-            host_lower = selected_host.lower()
-            is_app_host = "ap" in host_lower
-            is_db_host = "db" in host_lower
-            is_unknown_host = not (is_app_host or is_db_host)
-
-            # Fetch data based on host type and report type
-            if is_db_host:
-                if report_type == "day":
-                    print(f"Fetching daily data for DB host: {date}")
-                    data = fetch_query(SQL["daily_db_file_system"], (selected_customer, selected_sid, selected_host, date))
-                    print(f"DB host: Daily data for {selected_host}: {data}")
-                elif report_type == "custom":
-                    data = fetch_query(SQL["custom_db_file_usage"], (selected_customer, selected_sid, selected_host, start_date, end_date))
-                    print(f"DB host: Custom data for {selected_host}: {data}")
-
-            else:
-                if report_type == "day":
-                    data = fetch_query(SQL["daily_app_file_system"], (selected_customer, selected_sid, selected_host, date))
-                    print(f"App host: Daily data for {selected_host}: {data}")
-                elif report_type == "custom":
-                    data = fetch_query(SQL["custom_app_file_usage"], (selected_customer, selected_sid, selected_host, start_date, end_date))
-                    print(f"App host: Custom data for {selected_host}: {data}")
-
-
-            # Only build graph if there's data
-                
-            if data:
-                try:
-                    # ── filter header / non-numeric rows ───────────────
-                    clean_rows = []
-                    for row in data:
-                        try:
-                            f1 = float(row[1])
-                            f2 = float(row[2])
-                            f3 = float(row[3])
-                            clean_rows.append((row[0], f1, f2, f3))
-                        except (ValueError, TypeError):
-                            continue  # skip bad row
-
-                    if not clean_rows:
-                        graph_html = "<p style='color:red;'>No valid numeric data to plot.</p>"
-                    else:
-                        # Extract values
-                        timestamps = [datetime.fromisoformat(r[0]) for r in clean_rows]
-                        fs1_vals   = [r[1] for r in clean_rows]
-                        fs2_vals   = [r[2] for r in clean_rows]
-                        fs3_vals   = [r[3] for r in clean_rows]
-
-                        if is_db_host:
-                            labels = ["/hana/data (used %)", "/hana/backup (used %)", "/hana/logs (used %)"]
-                            print("Rendering graph for DB Host")
-                        else:
-                            labels = ["/usr/sap (used %)", "/sapmnt (used %)", "/usr/sap/trans (used %)"]
-                            print("Rendering graph for App Host")
-
-                        print("###### -> " + labels[0])
-                        logging.info("###### -> " + labels[0])
-
-                        fig = go.Figure([
-                            go.Scatter(x=timestamps, y=fs1_vals, mode='lines+markers', name=labels[0]),
-                            go.Scatter(x=timestamps, y=fs2_vals, mode='lines+markers', name=labels[1]),
-                            go.Scatter(x=timestamps, y=fs3_vals, mode='lines+markers', name=labels[2])
-                        ])
-                        fig.update_layout(
-                            title="File System Usage",
-                            xaxis_title="Time",
-                            yaxis_title="Usage (%)",
-                            template="plotly_white"
-                        )
-                        graph_html = fig.to_html(
-                            full_html=False,
-                            config={
-                                "modeBarButtonsToAdd": ["zoom", "pan", "lasso2d", "hoverClosestCartesian"],
-                                "displayModeBar": False,
-                            }
-                        )
-                except Exception as e:
-                    logging.error(f"Error processing graph data: {e}")
-                    graph_html = "<p style='color:red;'>Error generating graph.</p>"
-
-            
+        logging.info("%s selection", request.path, extra={"fields": {
+            "customer": selected_customer, "sid": selected_sid, "host": selected_host,
+            "report_type": report_type, "date": date, "start_date": start_date, "end_date": end_date}})
+        if request.method == "POST" and report_type in ("day", "custom"):
+            graph_html = chart_snippet("api_filesystem", "File System Usage", "Usage (%)", selected_customer,
+                                       selected_sid, selected_host, report_type, date, start_date, end_date)
+
     except Exception as e:
         logging.exception("Error in /filesystem route")
         return "An error occurred while loading the filesystem."
@@ -584,308 +575,110 @@ def filesystem():
 
 
 
-@app.route("/download_filesystem", methods=["POST"])
+@route("/download_filesystem", methods=["POST"])
+@httpcache.conditional(httpcache.report("download_filesystem"))
 def download_filesystem():
-    customer = request.form["customer"]
-    day      = request.form["date"]                       # YYYY-MM-DD
-    host_raw = request.form.get("host", "").strip().lower()
-    is_db_host = "db" in host_raw
-
-    conn   = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    print(f"Download request -> customer={customer}, day={day}, is_db_host={is_db_host}")
-
-    # ------------------------------------------------------------------ #
-    #  DB hosts  (contains 'db')                                          #
-    # ------------------------------------------------------------------ #
-    if is_db_host:
-        headers = [
-            "Customer", "SID", "Timestamp", "Host",
-            "/hana/data (used GB)", "/hana/data (available GB)", "/hana/data (used %)",
-            "/hana/backup (used GB)", "/hana/backup (available GB)", "/hana/backup (used %)",
-            "/hana/log (used GB)", "/hana/log (available GB)", "/hana/log (used %)"
-        ]
-
-        cursor.execute("""
-            SELECT customer,
-                   sid,
-                   timestamp,
-                   host,
-                   hana_data_used,
-                   hana_data_available,
-                   "hana_data_used_percent",
-                   hana_backup_used,
-                   hana_backup_available,
-                   "hana_backup_used_percent",
-                   hana_log_used,
-                   hana_log_available,
-                   "hana_log_used_percent"
-            FROM   file_system_usage
-            WHERE  customer = ?
-              
-              AND  DATE(timestamp)  AND DATE(?)
-              AND  LOWER(host) LIKE '%db%'
-            ORDER BY timestamp ASC
-        """, (customer,  day))
-
-    # ------------------------------------------------------------------ #
-    #  APP / non-DB hosts                                                 #
-    # ------------------------------------------------------------------ #
-    else:
-        headers = ["Customer", "SID", "Timestamp", "Host",
-                   "/usr/sap (used GB)","/usr/sap (avilable GB)", "/usr/sap (used %)",
-                   "/sapmnt (used GB)", "/sapmnt (available GB)", "/sapmnt (used %)",
-                   "/usr/sap/trans (used GB)", "/usr/sap/trans (available GB)", "/usr/sap/trans (used %)"]
-
-        cursor.execute("""
-            SELECT customer,
-                   sid,
-                   timestamp,
-                   host,
-                   USR_SAP_USED,
-                   USR_SAP_AVAILABLE,
-                   "USR_SAP_used_percent",
-                   sapmnt_used,
-                   sapmnt_available,
-                   "sapmnt_used_percent",
-                   USR_SAP_TRANS_USED,
-                   USR_SAP_TRANS_AVAILABLE,
-                   "USR_SAP_TRANS_used_percent"
-    
-            FROM   file_system_usage
-            WHERE  customer = ?
-              AND  strftime('%Y-%m-%d', timestamp) = ?
-              AND  lower(host) NOT LIKE '%db%'
-            ORDER  BY timestamp ASC
-        """, (customer, day))
-
-    records = cursor.fetchall()
-    conn.close()
-
-    # --------------------------- Excel build ----------------------------
-    output   = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {"in_memory": True})
-    sheet    = workbook.add_worksheet("Daily Report")
-
-    sheet.write_row(0, 0, headers)
-    for idx, row in enumerate(records, start=1):
-        sheet.write_row(idx, 0, row)
-
-    workbook.close()
-    output.seek(0)
-
-    filename = f"{customer}_File_System_Daily_Report.xlsx"
-    return send_file(output, download_name=filename, as_attachment=True)
-
-
-
-@app.route("/download_monthly_filesystem", methods=["POST"])
+    return download_report("download_filesystem", request.form)
+
+
+@route("/download_monthly_filesystem", methods=["POST"])
+@httpcache.conditional(httpcache.report("download_monthly_filesystem"))
 def download_monthly_filesystem():
-    customer    = request.form["customer"]
-    sid_param   = request.form["sid"].strip().upper()
-    year_month  = request.form["date"][:7]               # YYYY-MM
-    host_param  = request.form.get("host", "").lower()    # "db" | "app" | real host
-
-    is_db_host  = "db" in host_param
-    conn   = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    if is_db_host:
-    # ------------ DB branch: average numeric columns -----------------
-        headers = [
-            "Customer", "SID", "Timestamp", "Host",
-            "/hana/data (Avg used GB)", "/hana/data (Avg available GB)", "/hana/data (Avg used %)",
-            "/hana/backup (Avg used GB)", "/hana/backup (Avg available GB)", "/hana/backup (used %)",
-            "/hana/log (Avg used GB)", "/hana/log (Avg available GB)", "/hana/log (Avg used %)"
-        ]
-
-        cursor.execute(
-            """
-            SELECT customer,
-                   sid,
-                   host,
-                   ROUND(AVG(hana_data_used),          2),
-                   ROUND(AVG(hana_data_available),     2),
-                   ROUND(AVG("hana_data_used_percent"),     2),
-                   ROUND(AVG(hana_backup_used),        2),
-                   ROUND(AVG(hana_backup_available),   2),
-                   ROUND(AVG("hana_backup_used_percent"),   2),
-                   ROUND(AVG(hana_log_used),           2),
-                   ROUND(AVG(hana_log_available),      2),
-                   ROUND(AVG("hana_log_used_percent"),      2)
-            FROM   file_system_usage
-            WHERE  customer = ?
-              AND  sid      = ?
-              AND  strftime('%Y-%m', timestamp) = ?
-              AND  lower(host) LIKE '%db%'
-            GROUP  BY customer, sid, host
-            ORDER  BY host
-            """,
-            (customer, sid_param, year_month)
-        )
-    else:
-        # ------------ APP / non-DB branch --------------------------------
-        headers = ["Customer", "SID", "Timestamp", "Host",
-                   "/usr/sap (Avg used GB)","/usr/sap (Avg avilable GB)", "/usr/sap (Avg used %)",
-                   "/sapmnt (Avg used GB)", "/sapmnt (Avg available GB)", "/sapmnt (Avg used %)",
-                   "/usr/sap/trans (Avg used GB)", "/usr/sap/trans (Avg available GB)", "/usr/sap/trans (Avg used %)"]
-
-        cursor.execute(
-            """
-            SELECT customer,
-                   sid,
-                   host,
-                   ROUND(AVG(usr_sap_used),            2),
-                   ROUND(AVG(usr_sap_available),        2),
-                   ROUND(AVG("usr_sap_used_percent"),        2),
-                   ROUND(AVG(sapmnt_used),             2),
-                   ROUND(AVG(sapmnt_available),         2),
-                   ROUND(AVG("sapmnt_used_percent"),         2),
-                   ROUND(AVG(usr_sap_trans_used),      2),
-                   ROUND(AVG(usr_sap_trans_available),  2),
-                   ROUND(AVG("usr_sap_trans_used_percent"),  2)
-            FROM   file_system_usage
-            WHERE  customer = ?
-              AND  sid      = ?
-              AND  strftime('%Y-%m', timestamp) = ?
-              AND  lower(host) NOT LIKE '%db%'
-            GROUP  BY customer, sid, host
-            ORDER  BY host
-            """,
-            (customer, sid_param, year_month)
-        )
-
-    rows = cursor.fetchall()
-    conn.close()
-
-    # --------------------------- build Excel ----------------------------
-    output   = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {"in_memory": True})
-    sheet    = workbook.add_worksheet("Monthly Report")
-
-    sheet.write_row(0, 0, headers)
-    for i, row in enumerate(rows, start=1):
-        sheet.write_row(i, 0, row)
-
-    workbook.close()
-    output.seek(0)
-
-    fname = f"{customer}_{sid_param}_{year_month}_filesystem_monthly.xlsx"
-    return send_file(output, download_name=fname, as_attachment=True)
-
-
-
-@app.route("/download_custom_filesystem", methods=["POST"])
+    return download_report("download_monthly_filesystem", request.form)
+
+
+@route("/download_custom_filesystem", methods=["POST"])
+@httpcache.conditional(httpcache.report("download_custom_filesystem"))
 def download_custom_filesystem():
-    customer    = request.form["customer"]
-    sid         = request.form["sid"]
-    host        = request.form["host"].strip().lower()
-    start_date  = request.form["start_date"]
-    end_date    = request.form["end_date"]
-
-    conn   = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    if "db" in host.lower():
-        # DB host: fetch full DB-related columns
-        header = [
-            "Customer", "SID", "Timestamp", "Host",
-            "/hana/data (used GB)", "/hana/data (available GB)", "/hana/data (used %)",
-            "/hana/backup (used GB)", "/hana/backup (available GB)", "/hana/backup (used %)",
-            "/hana/log (used GB)", "/hana/log (available GB)", "/hana/log (used %)"
-        ]
-
-        cursor.execute("""
-            SELECT customer,
-                   sid,
-                   timestamp,
-                   host,
-                   hana_data_used,
-                   hana_data_available,
-                   "hana_data_used_percent",
-                   hana_backup_used,
-                   hana_backup_available,
-                   "hana_backup_used_percent",
-                   hana_log_used,
-                   hana_log_available,
-                   "hana_log_used_percent"
-            FROM   file_system_usage
-            WHERE  customer = ?
-              AND  sid = ?
-              AND  DATE(timestamp) BETWEEN DATE(?) AND DATE(?)
-              AND  LOWER(host) LIKE '%db%'
-            ORDER BY timestamp ASC
-        """, (customer, sid, start_date, end_date))
+    return download_report("download_custom_filesystem", request.form)
 
-    else:
-        # Non-DB host: fallback to APP file system table
-        header = ["Customer", "SID", "Timestamp", "Host",
-                   "/usr/sap (used GB)","/usr/sap (avilable GB)", "/usr/sap (used %)",
-                   "/sapmnt (used GB)", "/sapmnt (available GB)", "/sapmnt (used %)",
-                   "/usr/sap/trans (used GB)", "/usr/sap/trans (available GB)", "/usr/sap/trans (used %)"]
-        cursor.execute("""
-            SELECT customer,
-                   sid,
-                   timestamp,
-                   host,
-                   USR_SAP_USED,
-                   USR_SAP_AVAILABLE,
-                   "USR_SAP_used_percent",
-                   sapmnt_used,
-                   sapmnt_available,
-                   "sapmnt_used_percent",
-                   USR_SAP_TRANS_USED,
-                   USR_SAP_TRANS_AVAILABLE,
-                   "USR_SAP_TRANS_used_percent"
-    
-            FROM   file_system_usage
-            WHERE  customer = ?
-              AND  sid = ?
-              AND  DATE(timestamp) BETWEEN DATE(?) AND DATE(?)
-              AND  LOWER(host) NOT LIKE '%db%'
-            ORDER BY timestamp ASC
-        """, (customer, sid, start_date, end_date))
-
-    records = cursor.fetchall()
-    conn.close()
-
-    # Build Excel
-    output   = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    sheet    = workbook.add_worksheet("Custom Report")
-
-    sheet.write_row(0, 0, header)
-    for i, row in enumerate(records, start=1):
-        sheet.write_row(i, 0, row)
-
-    workbook.close()
-    output.seek(0)
-
-    filename = f"{customer}_custom_File_System_Report.xlsx"
-    return send_file(output, download_name=filename, as_attachment=True)
-
-
-
-
-
-@app.route("/get_filesystem_sids")
+
+@route("/get_filesystem_sids")
 def get_filesystem_sids():
     customer = request.args.get("customer", "")
-    print(" Selecetd Customer " + customer)
     if not customer:
         return json.dumps([])
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(SQL["distinct_sids_app_filesystem"])
-    sids = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(sids)
+    return jsonify(dimensions.sids("file_system_usage", customer))
+
+
+@route("/ingest/<table>", methods=["POST"])
+def ingest_rows(table):
+    # body: JSON array, JSON lines or CSV with a header row
+    if table not in ingest.TABLES:
+        return jsonify({"error": f"Unknown table: {table}"}), 404
+    if request.mimetype == "application/json":
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            return jsonify({"error": "Expected a JSON array of records"}), 400
+        result = ingest.load(table, records)
+    else:
+        fmt = request.args.get("format") or ("csv" if request.mimetype == "text/csv" else "jsonl")
+        if fmt not in ingest.FORMATS:
+            return jsonify({"error": f"Unsupported format: {fmt}"}), 400
+        result = ingest.load_stream(table, request.stream, fmt)
+    if result.inserted:
+        partitions.maybe_maintain()  # on a background thread when due
+    return jsonify(result.as_dict())
+
+
+@route("/db_stats")
+def db_stats():
+    return jsonify(pool.stats())
+
+
+def warm_up(app):
+    # before the worker takes traffic: open this thread's connection, bring the
+    # derived tables up to date, fill the dropdown caches and compile templates
+    started = time.perf_counter()
+    with app.app_context():  # the app's database and thresholds
+        dimensions.refresh(get_db_connection())
+        for refresh in (rollups.maybe_refresh, anomalies.maybe_refresh, baselines.maybe_refresh,
+                        forecast.maybe_refresh, backup_sla.maybe_refresh):
+            refresh()
+        for source in ("system_usage", "file_system_usage", "backup_dashboard"):
+            dimensions.customers(source)
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    metrics.set_gauge("app_warm_up_seconds", time.perf_counter() - started)
+
+
+def create_app(config=None, **overrides):
+    global _startup_from
+    started, _startup_from = _startup_from or time.perf_counter(), None
+    logsetup.setup()
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {}, **overrides)
+    migrate(app.config["DB_PATH"])
+    if backfill_pending(app.config["DB_PATH"]):
+        logging.warning("Rows without epoch timestamps are left out of reports: run `python schema.py` once")
+    for rule, options, view in ROUTES:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.teardown_appcontext(lambda exc: pool.release(app.config["DB_PATH"]))
+    metrics.init_app(app)
+    logsetup.init_app(app)
+    startup = time.perf_counter() - started  # warm-up has its own gauge
+    metrics.set_gauge("app_startup_seconds", startup)
+    if startup > STARTUP_TARGET_SECONDS:
+        logging.warning("Startup took %.2fs (target %ss)", startup, STARTUP_TARGET_SECONDS)
+    else:
+        logging.info("Startup took %.2fs", startup)
+    if app.config["WARM_UP"]:
+        warm_up(app)
+    return app
+
 
+def __getattr__(name):
+    # `app` is built on first access, so importing the module for create_app() stays cheap
+    global app
+    if name == "app":
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
 
 
 
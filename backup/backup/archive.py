@@ -0,0 +1,194 @@
+# archive.py
+# Columnar Parquet archive of closed months, used by the raw-row reports.
+#
+# When partitions.py moves a month out of read.db it also writes
+# ARCHIVE_DIR/<table>/YYYY-MM.parquet (sorted by ts). Reports carrying a Scan
+# read those months as memory-mapped column scans: only the report's columns
+# are decoded, and customer/sid/ts filters are pushed into the Parquet reader.
+# Months without a Parquet file still come from SQLite (routed partitions).
+# Late samples for an archived month sit in read.db until the next maintenance
+# moves them; they are merged into the scan in timestamp order. Retention
+# deletes the Parquet files together with the partition files.
+#
+# pyarrow is optional: without it everything is served from SQLite. It is
+# imported on first use, so start-up does not pay for it.
+#   python archive.py        # export archived months that have no Parquet yet
+import os
+import heapq
+import logging
+from collections import namedtuple
+from constants import ARCHIVE_DIR, ARCHIVE_COMPRESSION
+from utils import data_dir, month_range, epoch_range
+import partitions
+import metrics
+
+pa = pc = pq = None  # pyarrow modules, imported by the first available() call
+_loaded = False
+
+ARCHIVE_TABLES = ("system_usage", "file_system_usage")
+BATCH_ROWS = 100_000
+SCAN_CHUNK_ROWS = 5000
+
+# Columnar form of a report: output columns of `table`, equality filters as
+# ((column, value), ...), and the db/app host split (None = all hosts).
+# The report SQL must take the span bounds as its last two parameters.
+Scan = namedtuple("Scan", ["table", "columns", "equals", "host_db"], defaults=((), None))
+
+
+def available():
+    global pa, pc, pq, _loaded
+    if not _loaded:
+        _loaded = True
+        try:
+            import pyarrow
+            import pyarrow.compute
+            import pyarrow.parquet
+            pa, pc, pq = pyarrow, pyarrow.compute, pyarrow.parquet
+        except ImportError:  # optional dependency
+            pass
+    return pq is not None
+
+
+def archive_path(table, month):
+    return os.path.join(data_dir(ARCHIVE_DIR), table, f"{month}.parquet")
+
+
+def archived(table):
+    try:
+        names = os.listdir(os.path.join(data_dir(ARCHIVE_DIR), table))
+    except FileNotFoundError:
+        return set()
+    return {name[:7] for name in names if name.endswith(".parquet")}
+
+
+def _arrow_type(declared):
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return pa.int64()
+    if any(kind in declared for kind in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return pa.string()
+
+
+def export_month(conn, table, month):
+    # the month must already be in its partition (partitions.archive_month)
+    if not available():
+        return 0
+    name = partitions.schema_name(month)
+    partitions.attach_months(conn, [month])
+    columns = [(row[1], _arrow_type(row[2])) for row in conn.execute(f"PRAGMA {name}.table_info({table})")]
+    schema = pa.schema(columns)
+    path = archive_path(table, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cursor = conn.execute(f"SELECT {', '.join(c for c, _ in columns)} FROM {name}.{table} ORDER BY ts, rowid")
+    count = 0
+    with pq.ParquetWriter(path + ".part", schema, compression=ARCHIVE_COMPRESSION) as writer:
+        while True:
+            rows = cursor.fetchmany(BATCH_ROWS)
+            if not rows:
+                break
+            arrays = [pa.array(values, type=schema.field(i).type) for i, values in enumerate(zip(*rows))]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+    os.replace(path + ".part", path)
+    logging.info("Archived %d %s rows of %s to %s", count, table, month, path)
+    return count
+
+
+def export_missing(conn):
+    exported = {}
+    for table in ARCHIVE_TABLES:
+        have = archived(table)
+        for month in partitions.archived_months():
+            if month not in have:
+                exported[(table, month)] = export_month(conn, table, month)
+    return exported
+
+
+def drop_before(month):
+    # retention (partitions.drop_expired): Parquet files of months before `month`
+    dropped = set()
+    for table in ARCHIVE_TABLES:
+        for old in sorted(m for m in archived(table) if m < month):
+            os.remove(archive_path(table, old))
+            dropped.add(old)
+            logging.info("Dropped expired archive %s", archive_path(table, old))
+    return dropped
+
+
+def _months(start_ts, end_ts):
+    # every YYYY-MM overlapping [start_ts, end_ts)
+    month, last = partitions.month_of(start_ts), partitions.month_of(end_ts - 1)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = month_range(month)[1][:7]
+    return months
+
+
+def _scan(scan, month, start_ts, end_ts):
+    filters = [("ts", ">=", start_ts), ("ts", "<", end_ts)] + [(c, "=", v) for c, v in scan.equals]
+    columns = list(scan.columns) + (["host"] if scan.host_db is not None and "host" not in scan.columns else [])
+    table = pq.read_table(archive_path(scan.table, month), columns=columns, filters=filters, memory_map=True)
+    if scan.host_db is not None:
+        is_db = pc.match_substring(pc.utf8_lower(table["host"]), "db")
+        table = table.filter(is_db if scan.host_db else pc.invert(is_db))
+    table = table.select(list(scan.columns))
+    for batch in table.to_batches(max_chunksize=SCAN_CHUNK_ROWS):
+        yield from zip(*(column.to_pylist() for column in batch.columns))
+
+
+def report_rows(conn, report):
+    # Rows for a built report, or None when no month of its span is in Parquet.
+    scan = report.scan
+    if scan is None or report.span is None:
+        return None
+    start_ts, end_ts = report.span
+    have = archived(scan.table)
+    months = _months(start_ts, end_ts)
+    if not have.intersection(months) or not available():
+        return None
+    return _report_rows(conn, report, months, have)
+
+
+def _report_rows(conn, report, months, have):
+    # The SQLite runs are routed here, before the first row is read, so a
+    # range the partitions cannot serve raises ValueError to the caller
+    # instead of in the middle of the streamed response.
+    start_ts, end_ts = report.span
+    parts, segment = [], None  # parts: (Parquet month or None, routed SQL, lo, hi)
+    for month in months + [None]:
+        if month is not None and month not in have:
+            lo, hi = epoch_range(month_range(month))
+            segment = (segment[0] if segment else max(lo, start_ts), min(hi, end_ts))
+            continue
+        if segment:
+            parts.append((None, partitions.route(report.sql, *segment), *segment))
+            segment = None
+        if month is not None:
+            lo, hi = epoch_range(month_range(month))
+            parts.append((month, None, max(lo, start_ts), min(hi, end_ts)))
+    return _stream(conn, report, parts)
+
+
+def _stream(conn, report, parts):
+    scan = report.scan
+    head = report.params[:-2]
+    order = scan.columns.index("timestamp")
+    for month, sql, lo, hi in parts:
+        if month is None:  # ATTACH only now: an earlier run may have detached its partitions
+            yield from metrics.timed_execute(report.name, conn, partitions.attach(conn, sql), (*head, lo, hi))
+            continue
+        late = metrics.fetchall(conn, report.sql, (*head, lo, hi), report.name)  # unqualified -> read.db only
+        yield from heapq.merge(_scan(scan, month, lo, hi), late, key=lambda row: row[order])
+
+
+if __name__ == "__main__":
+    import logsetup
+    logsetup.setup()
+    from schema import migrate
+    from utils import get_db_connection
+    migrate()
+    if not available():
+        raise SystemExit("pyarrow is not installed")
+    print(f"Exported {export_missing(get_db_connection()) or 'nothing'}")
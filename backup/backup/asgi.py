@@ -0,0 +1,188 @@
+# asgi.py
+# ASGI serving mode for the same Flask routes:
+#   uvicorn asgi:application --workers 4
+# Every request runs the unchanged WSGI app on a thread of one of two bounded
+# pools: paths in ASGI_HEAVY_PREFIXES (report downloads, bulk ingest) share
+# ASGI_HEAVY_WORKERS threads, everything else gets ASGI_WORKERS, so a handful
+# of large exports queue among themselves instead of starving the dropdown and
+# JSON requests. The event loop only moves bytes; the worker thread blocks on
+# each send, which gives streamed exports backpressure.
+# When the client disconnects, the statement running on the request thread's
+# pooled connection is interrupted (sqlite3 Connection.interrupt) and the
+# response iterator is closed, so temp files and cursors are released.
+import sys
+import asyncio
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from constants import ASGI_WORKERS, ASGI_HEAVY_WORKERS, ASGI_HEAVY_PREFIXES
+from db import pool
+from app import app
+
+SPOOL_BYTES = 1024 * 1024         # request bodies above this go to a temp file
+NO_INTERRUPT_PREFIXES = ("/ingest/",)  # let a started load finish its batches
+
+_light = ThreadPoolExecutor(ASGI_WORKERS, thread_name_prefix="asgi")
+_heavy = ThreadPoolExecutor(ASGI_HEAVY_WORKERS, thread_name_prefix="asgi-heavy")
+
+
+class Disconnected(Exception):
+    pass
+
+
+class _Request:
+    # lets the event loop cancel whatever the worker thread is running
+    def __init__(self, interruptible):
+        self.interruptible = interruptible
+        self.disconnected = False
+        self._ident = None
+        self._lock = threading.Lock()
+
+    def attach(self):
+        with self._lock:
+            self._ident = threading.get_ident()
+
+    def detach(self):
+        with self._lock:
+            self._ident = None
+
+    def cancel(self):
+        with self._lock:  # the thread cannot move on to another request meanwhile
+            self.disconnected = True
+            for conn in pool.connections_for(self._ident) if self._ident and self.interruptible else ():
+                conn.interrupt()
+
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin-1"), value.decode("latin-1")
+        key = {"content-type": "CONTENT_TYPE", "content-length": "CONTENT_LENGTH"}.get(
+            name.lower(), "HTTP_" + name.upper().replace("-", "_"))
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # the body has been read in full, so chunked uploads get a length too
+    environ.pop("HTTP_TRANSFER_ENCODING", None)
+    environ["CONTENT_LENGTH"] = str(body.seek(0, 2))
+    body.seek(0)
+    return environ
+
+
+def _run(environ, request, loop, send):
+    # worker thread: the whole request, body iteration included, stays on this
+    # thread and therefore on its pooled connection
+    if request.disconnected:
+        return
+    started, sent = [], []
+
+    def emit(message):
+        if request.disconnected:
+            raise Disconnected()
+        try:
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+        except Exception as e:
+            raise Disconnected() from e
+
+    def body(chunk, more):
+        if not sent:
+            status, headers = started
+            emit({"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+                  "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]})
+            sent.append(True)
+        emit({"type": "http.response.body", "body": chunk, "more_body": more})
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and sent:
+            raise exc_info[1].with_traceback(exc_info[2])
+        started[:] = [status, headers]
+        return lambda chunk: body(chunk, True)
+
+    request.attach()
+    try:
+        result = app(environ, start_response)
+        try:
+            for chunk in result:
+                if chunk:
+                    body(chunk, True)
+            body(b"", False)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+    except Exception as e:
+        if request.disconnected or isinstance(e, Disconnected):
+            logging.info("Client disconnected: %s %s", environ["REQUEST_METHOD"], environ["PATH_INFO"])
+        elif not sent:
+            logging.exception("Unhandled error in %s", environ["PATH_INFO"])
+            started[:] = ["500 Internal Server Error", [("Content-Type", "text/plain")]]
+            try:
+                body(b"Internal Server Error", False)
+            except Disconnected:
+                pass
+        else:
+            logging.exception("Response for %s failed mid-stream", environ["PATH_INFO"])
+    finally:
+        request.detach()
+
+
+async def _watch(receive, request):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    request.cancel()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _light.shutdown(wait=False)
+            _heavy.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        raise NotImplementedError(f"Unsupported ASGI scope: {scope['type']}")
+
+    body = tempfile.SpooledTemporaryFile(SPOOL_BYTES)
+    more = True
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            body.close()
+            return
+        body.write(message.get("body", b""))
+        more = message.get("more_body", False)
+
+    path = scope["path"]
+    request = _Request(interruptible=not path.startswith(NO_INTERRUPT_PREFIXES))
+    executor = _heavy if path.startswith(ASGI_HEAVY_PREFIXES) else _light
+    loop = asyncio.get_running_loop()
+    watcher = asyncio.ensure_future(_watch(receive, request))
+    try:
+        await loop.run_in_executor(executor, _run, _environ(scope, body), request, loop, send)
+    finally:
+        watcher.cancel()
+        body.close()
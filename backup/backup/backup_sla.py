@@ -0,0 +1,148 @@
+# backup_sla.py
+# Backup SLA summaries maintained from backup_dashboard.
+#
+# backup_latest keeps, per (customer, SID, host, database type, entry type), the
+# last successful and last failed backup start and the state of the newest
+# attempt; backup_daily counts attempts / successes / failures per day. Both are
+# extended from a rowid watermark in etl_state, so a refresh only reads the rows
+# added since the last one, and they outlive the raw rows that partitions.py
+# moves out or drops. Entry types are classed as "data" (complete, differential,
+# incremental, snapshot) or "log" backups; a SID breaches its SLA when its newest
+# successful backup of a class is older than the allowed hours (or missing).
+import time
+import threading
+import logging
+from datetime import date, timedelta
+from constants import BACKUP_SLA_DATA_HOURS, BACKUP_SLA_LOG_HOURS, BACKUP_SLA_DAYS
+from schema import get_state, set_state
+from utils import get_db_connection, db_path
+
+STATE_NAME = "backup_sla"
+REFRESH_INTERVAL_SECONDS = 60
+HOUR = 3600
+KINDS = ("data", "log")
+
+KEY = ("COALESCE(CUSTOMER, '')", "COALESCE(SYSTEM_ID, '')", "COALESCE(HOST, '')",
+       "COALESCE(Database_type, '')", "COALESCE(ENTRY_TYPE_NAME, '')")
+KIND_SQL = """CASE WHEN LOWER(ENTRY_TYPE_NAME) LIKE '%log%' THEN 'log'
+                   WHEN LOWER(ENTRY_TYPE_NAME) LIKE '%data%' OR LOWER(ENTRY_TYPE_NAME) LIKE '%snapshot%' THEN 'data'
+                   ELSE 'other' END"""
+SUCCESS_SQL = "IFNULL(LOWER(STATE_NAME), '') = 'successful'"
+FAILURE_SQL = "IFNULL(LOWER(STATE_NAME), '') IN ('failed', 'canceled', 'cancelled', 'error')"
+
+LATEST_SQL = f"""
+    WITH delta AS (
+        SELECT {", ".join(f"{c} AS k{i}" for i, c in enumerate(KEY))}, {KIND_SQL} AS kind, start_ts,
+               STATE_NAME, {SUCCESS_SQL} AS ok, {FAILURE_SQL} AS bad,
+               ROW_NUMBER() OVER (PARTITION BY {", ".join(KEY)} ORDER BY start_ts DESC, rowid DESC) AS newest
+        FROM main.backup_dashboard
+        WHERE rowid > ? AND rowid <= ? AND start_ts IS NOT NULL
+    )
+    INSERT INTO backup_latest (customer, sid, host, db_type, entry_type, kind,
+                               last_success_ts, last_failure_ts, last_ts, last_state)
+    SELECT k0, k1, k2, k3, k4, MAX(kind),
+           MAX(CASE WHEN ok THEN start_ts END), MAX(CASE WHEN bad THEN start_ts END),
+           MAX(start_ts), MAX(CASE WHEN newest = 1 THEN STATE_NAME END)
+    FROM delta GROUP BY k0, k1, k2, k3, k4
+    ON CONFLICT (customer, sid, host, db_type, entry_type) DO UPDATE SET
+        last_success_ts = MAX(COALESCE(last_success_ts, excluded.last_success_ts),
+                              COALESCE(excluded.last_success_ts, last_success_ts)),
+        last_failure_ts = MAX(COALESCE(last_failure_ts, excluded.last_failure_ts),
+                              COALESCE(excluded.last_failure_ts, last_failure_ts)),
+        last_state = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_state ELSE last_state END,
+        last_ts = MAX(last_ts, excluded.last_ts)"""
+
+DAILY_SQL = f"""
+    INSERT INTO backup_daily (customer, sid, host, db_type, entry_type, day, kind,
+                              attempts, succeeded, failed)
+    SELECT {", ".join(KEY)}, strftime('%Y-%m-%d', start_ts, 'unixepoch'), {KIND_SQL},
+           COUNT(*), SUM({SUCCESS_SQL}), SUM({FAILURE_SQL})
+    FROM main.backup_dashboard
+    WHERE rowid > ? AND rowid <= ? AND start_ts IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5, 6
+    ON CONFLICT (customer, sid, host, db_type, entry_type, day) DO UPDATE SET
+        attempts = attempts + excluded.attempts,
+        succeeded = succeeded + excluded.succeeded,
+        failed = failed + excluded.failed"""
+
+_lock = threading.Lock()
+_last_refresh = {}  # db path -> monotonic time
+
+
+def refresh(conn=None):
+    conn = conn or get_db_connection()
+    with _lock:
+        watermark, _ = get_state(conn, STATE_NAME)
+        high = conn.execute("SELECT MAX(rowid) FROM main.backup_dashboard").fetchone()[0] or 0
+        if high <= watermark:
+            _last_refresh[db_path()] = time.monotonic()
+            return 0
+        before = conn.total_changes
+        with conn:
+            conn.execute(LATEST_SQL, (watermark, high))
+            changed = conn.total_changes - before  # rowcount is -1 for WITH ... INSERT
+            conn.execute(DAILY_SQL, (watermark, high))
+            set_state(conn, STATE_NAME, high)
+        _last_refresh[db_path()] = time.monotonic()
+    logging.info("Backup SLA: %d latest-state rows updated from rowids %d..%d", changed, watermark, high)
+    return changed
+
+
+def maybe_refresh():
+    if time.monotonic() - _last_refresh.get(db_path(), 0.0) >= REFRESH_INTERVAL_SECONDS:
+        try:
+            refresh()
+        except Exception:
+            logging.exception("Backup SLA refresh failed; serving existing summaries")
+
+
+def _iso(ts):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts)) if ts is not None else None
+
+
+def summary(values, now=None):
+    # one row per (customer, SID): newest data/log success, its age, the
+    # success rate over the last `days` days and which classes breach their hours
+    now = int(now or time.time())
+    hours = {"data": float(values.get("data_hours", BACKUP_SLA_DATA_HOURS)),
+             "log": float(values.get("log_hours", BACKUP_SLA_LOG_HOURS))}
+    days = min(max(int(values.get("days", BACKUP_SLA_DAYS)), 1), 366)
+    since = (date(*time.gmtime(now)[:3]) - timedelta(days=days - 1)).isoformat()
+    where, params = "kind IN ('data', 'log')", []
+    if values.get("customer"):
+        where += " AND customer = ?"
+        params.append(values["customer"])
+
+    conn = get_db_connection()
+    sids = {}
+    for customer, sid, kind, success, failure, last in conn.execute(
+            f"""SELECT customer, sid, kind, MAX(last_success_ts), MAX(last_failure_ts), MAX(last_ts)
+                FROM backup_latest WHERE {where} GROUP BY customer, sid, kind""", params):
+        sids.setdefault((customer, sid), {})[kind] = {
+            "last_success": _iso(success), "last_failure": _iso(failure), "last_attempt": _iso(last),
+            "age_hours": round((now - success) / HOUR, 1) if success is not None else None,
+        }
+    rates = {}
+    for customer, sid, kind, attempts, succeeded, failed in conn.execute(
+            f"""SELECT customer, sid, kind, SUM(attempts), SUM(succeeded), SUM(failed)
+                FROM backup_daily WHERE day >= ? AND {where} GROUP BY customer, sid, kind""", [since] + params):
+        rates[(customer, sid, kind)] = (attempts, succeeded, failed)
+
+    rows = []
+    for (customer, sid), kinds in sids.items():
+        row = {"customer": customer, "sid": sid, "breaches": []}
+        for kind in KINDS:
+            entry = kinds.get(kind, {"last_success": None, "last_failure": None, "last_attempt": None,
+                                     "age_hours": None})
+            attempts, succeeded, failed = rates.get((customer, sid, kind), (0, 0, 0))
+            entry.update(attempts=attempts, failed=failed,
+                         success_rate=round(100.0 * succeeded / (succeeded + failed), 1) if succeeded + failed else None)
+            if entry["age_hours"] is None or entry["age_hours"] > hours[kind]:
+                row["breaches"].append(kind)
+            row[kind] = entry
+        rows.append(row)
+    rows.sort(key=lambda r: (not r["breaches"], r["customer"], r["sid"]))
+    if values.get("breaching"):
+        rows = [row for row in rows if row["breaches"]]
+    return {"now": _iso(now), "hours": hours, "days": days, "since": since,
+            "breaching": sum(1 for row in rows if row["breaches"]), "sids": rows}
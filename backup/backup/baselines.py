@@ -0,0 +1,174 @@
+# baselines.py
+# Per-(customer, sid, host) dynamic anomaly detection for system_usage.
+#
+# Each new sample is compared with the BASELINE_WINDOW samples that precede it
+# on the same host: it is flagged when it lies BASELINE_Z standard deviations
+# above the rolling mean *and* above the rolling BASELINE_PERCENTILE band.
+# An EWMA per host/metric is carried across runs as the "expected" value.
+# Runs incrementally from a rowid watermark; all window maths is NumPy.
+# Requests only read the results: maybe_refresh() catches up on a background
+# thread.
+import time
+import logging
+import warnings
+import threading
+from itertools import groupby
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from constants import (BASELINE_WINDOW, BASELINE_MIN_SAMPLES, BASELINE_Z,
+                       BASELINE_PERCENTILE, BASELINE_EWMA_ALPHA)
+from schema import get_state, set_state
+from utils import get_db_connection, db_path, in_background
+
+STATE_NAME = "baselines"
+METRICS = ("cpu", "memory")
+BATCH_ROWS = 200_000          # new samples handled per refresh() call
+CHUNK = 4096                  # positions per sliding-window block
+REFRESH_INTERVAL_SECONDS = 30
+
+_lock = threading.Lock()
+_last_refresh = {}  # db path -> monotonic time
+
+
+def ewma(values, alpha, state=None):
+    # Vectorised EWMA in blocks of 64: s_t = d^(t+1) s0 + a d^t sum_j x_j / d^j
+    values = np.asarray(values, dtype=float)
+    out = np.empty_like(values)
+    if not len(values):
+        return out
+    decay = 1.0 - alpha
+    state = values[0] if state is None else state
+    for start in range(0, len(values), 64):
+        block = values[start:start + 64]
+        powers = decay ** np.arange(len(block))
+        out[start:start + len(block)] = decay * powers * state + alpha * powers * np.cumsum(block / powers)
+        state = out[start + len(block) - 1]
+    return out
+
+
+def rolling_bands(values, start, window=BASELINE_WINDOW, percentile=BASELINE_PERCENTILE):
+    # For every position i >= start: count/mean/std/percentile of values[i-window:i].
+    padded = np.concatenate([np.full(window, np.nan), values[:-1]]) if len(values) else values
+    windows = sliding_window_view(padded, window)[start:]
+    count = np.empty(len(windows))
+    mean = np.empty(len(windows))
+    std = np.empty(len(windows))
+    band = np.empty(len(windows))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN windows
+        for lo in range(0, len(windows), CHUNK):
+            block = windows[lo:lo + CHUNK]
+            count[lo:lo + CHUNK] = np.sum(~np.isnan(block), axis=1)
+            mean[lo:lo + CHUNK] = np.nanmean(block, axis=1)
+            std[lo:lo + CHUNK] = np.nanstd(block, axis=1)
+            band[lo:lo + CHUNK] = np.nanpercentile(block, percentile, axis=1)
+    return count, mean, std, band
+
+
+def _ffill(values, first):
+    # forward-fill NaNs so the EWMA skips missing samples
+    valid = ~np.isnan(values)
+    index = np.where(valid, np.arange(len(values)), -1)
+    np.maximum.accumulate(index, out=index)
+    return np.where(index >= 0, values[np.maximum(index, 0)], first)
+
+
+def _history(conn, key, first_ts, first_id):
+    rows = conn.execute(
+        """SELECT cpu, memory FROM system_usage
+           WHERE customer=? AND sid=? AND host=? AND (ts, rowid) < (?, ?)
+           ORDER BY ts DESC, rowid DESC LIMIT ?""",
+        (*key, first_ts, first_id, BASELINE_WINDOW),
+    ).fetchall()
+    return rows[::-1]
+
+
+def _as_float(rows, column):
+    return np.array([np.nan if row[column] is None else row[column] for row in rows], dtype=float)
+
+
+def score_host(conn, key, new_rows):
+    # new_rows: (rowid, ts, cpu, memory, timestamp) ordered by ts, rowid;
+    # the TEXT timestamp is only carried through for display
+    history = _history(conn, key, new_rows[0][1], new_rows[0][0])
+    flagged, states = [], []
+    previous = {row[0]: row for row in conn.execute(
+        "SELECT metric, ewma FROM host_baselines WHERE customer=? AND sid=? AND host=?", key)}
+
+    for m, metric in enumerate(METRICS):
+        values = np.concatenate([_as_float(history, m), _as_float(new_rows, 2 + m)])
+        start = len(history)
+        count, mean, std, band = rolling_bands(values, start)
+        fresh = values[start:]
+        prior = previous.get(metric, (metric, None))[1]
+        smoothed = ewma(_ffill(fresh, prior if prior is not None else np.nanmean(fresh)),
+                        BASELINE_EWMA_ALPHA, prior)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(std > 0, (fresh - mean) / std, 0.0)
+        hits = np.flatnonzero((count >= BASELINE_MIN_SAMPLES) & (z >= BASELINE_Z) & (fresh > band))
+        for i in hits:
+            rowid, ts = new_rows[i][0], new_rows[i][4]
+            flagged.append((rowid, metric, ts, *key, fresh[i], smoothed[i], mean[i], band[i], z[i]))
+
+        tail = values[-BASELINE_WINDOW:]
+        tail = tail[~np.isnan(tail)]
+        if len(tail):
+            states.append((*key, metric, len(tail), float(smoothed[-1]), float(tail.mean()), float(tail.std()),
+                           float(np.percentile(tail, 100 - BASELINE_PERCENTILE)),
+                           float(np.percentile(tail, BASELINE_PERCENTILE)), new_rows[-1][4]))
+    return flagged, states
+
+
+def refresh(conn=None):
+    conn = conn or get_db_connection()
+    with _lock:
+        watermark, _ = get_state(conn, STATE_NAME)
+        high = conn.execute("SELECT MAX(rowid) FROM system_usage").fetchone()[0] or 0
+        high = min(high, watermark + BATCH_ROWS)
+        if high <= watermark:
+            _last_refresh[db_path()] = time.monotonic()
+            return 0
+        rows = conn.execute(
+            """SELECT customer, sid, host, rowid, ts, cpu, memory, timestamp FROM system_usage
+               WHERE rowid > ? AND rowid <= ? AND ts IS NOT NULL
+               ORDER BY customer, sid, host, ts, rowid""",
+            (watermark, high),
+        ).fetchall()
+
+        flagged, states = [], []
+        for key, host_rows in groupby(rows, key=lambda row: row[:3]):
+            host_flagged, host_states = score_host(conn, key, [row[3:] for row in host_rows])
+            flagged += host_flagged
+            states += host_states
+        with conn:
+            conn.executemany(
+                """INSERT OR REPLACE INTO baseline_anomalies
+                   (id, metric, timestamp, customer, sid, host, value, ewma, mean, band_high, zscore)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", flagged)
+            conn.executemany(
+                """INSERT OR REPLACE INTO host_baselines
+                   (customer, sid, host, metric, samples, ewma, mean, stddev, band_low, band_high, last_timestamp)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", states)
+            set_state(conn, STATE_NAME, high)
+        _last_refresh[db_path()] = time.monotonic()
+    logging.info("Baselines: scored %d samples, flagged %d", len(rows), len(flagged))
+    return len(rows)
+
+
+def catch_up(conn=None):
+    while refresh(conn):
+        pass
+
+
+def maybe_refresh():
+    # called on the request path: never waits for a refresh
+    path = db_path()
+    if time.monotonic() - _last_refresh.get(path, 0.0) >= REFRESH_INTERVAL_SECONDS:
+        _last_refresh[path] = time.monotonic()
+        in_background("baseline-refresh", catch_up)
+
+
+if __name__ == "__main__":
+    import logsetup
+    logsetup.setup()
+    catch_up()  # batch job: keep going until caught up with ingestion
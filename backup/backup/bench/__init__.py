@@ -0,0 +1,8 @@
+# bench
+# Reproducible benchmarks for the dashboard, anomaly, backup and export routes.
+#
+#   python -m bench.generate DIR --rows 1M        synthetic read.db in DIR
+#   python -m bench.run --scales 1M,10M --out bench_report.json
+#   python -m bench.compare old.json new.json     p50/p95 ratios between two runs
+#
+# Run from the application directory (the one holding app.py).
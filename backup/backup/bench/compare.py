@@ -0,0 +1,53 @@
+# bench/compare.py
+# Side-by-side p50/p95 of two bench.run reports. Exits with status 1 when a
+# route got slower than --threshold times the baseline at either percentile,
+# so it can gate a commit in CI.
+import sys
+import json
+import argparse
+
+MIN_MS = 1.0  # differences below this are timer noise
+
+
+def compare(base, new, threshold):
+    rows, regressions = [], []
+    for scale, result in new["scales"].items():
+        before = base["scales"].get(scale, {}).get("routes", {})
+        for name, timing in result["routes"].items():
+            old = before.get(name)
+            if old is None:
+                continue
+            ratios = [(new_ms + MIN_MS) / (old_ms + MIN_MS) for old_ms, new_ms in
+                      ((old["p50_ms"], timing["p50_ms"]), (old["p95_ms"], timing["p95_ms"]))]
+            slower = max(ratios) > threshold
+            rows.append((scale, name, old["p50_ms"], timing["p50_ms"], old["p95_ms"], timing["p95_ms"],
+                         max(ratios), slower))
+            if slower:
+                regressions.append((scale, name))
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+    with open(args.base) as fh:
+        base = json.load(fh)
+    with open(args.new) as fh:
+        new = json.load(fh)
+
+    rows, regressions = compare(base, new, args.threshold)
+    print(f"{(base.get('commit') or '?')[:10]} -> {(new.get('commit') or '?')[:10]}")
+    print(f"{'scale':>6} {'route':<28} {'p50 ms':>19} {'p95 ms':>19} {'ratio':>6}")
+    for scale, name, p50_old, p50_new, p95_old, p95_new, ratio, slower in rows:
+        print(f"{scale:>6} {name:<28} {p50_old:>8.1f} -> {p50_new:<8.1f} {p95_old:>8.1f} -> {p95_new:<8.1f} "
+              f"{ratio:>5.2f}{' !' if slower else ''}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold}x")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
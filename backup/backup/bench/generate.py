@@ -0,0 +1,198 @@
+# bench/generate.py
+# Synthetic fleet data in a read.db-compatible database.
+#
+# The fleet is `customers` x `sids` x `hosts` (the first host of every SID is
+# its database host, "<sid>db01"; the rest are "<sid>appNN" application hosts).
+# Every host reports system_usage and file_system_usage every `interval`
+# seconds for `months` calendar months up to `end`: CPU and memory follow a
+# daily cycle with noise and rare spikes, filesystems fill up slowly. Every SID
+# writes a log backup each 15 minutes and a data backup per database each
+# night; `failure_rate` of them fail. Rows are inserted in time order, as the
+# ingest path would, and the same seed always gives the same database.
+#
+# With --rows the number of customers is derived so the two sample tables hold
+# about that many rows together; the manifest (bench.json) next to read.db
+# records the parameters and row counts.
+import os
+import sys
+import json
+import math
+import time
+import sqlite3
+import argparse
+import calendar
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+from schema import FS_COLUMNS, migrate
+
+DAY = 86400
+LOG_BACKUP_SECONDS = 900
+MANIFEST = "bench.json"
+MOUNTS = ["hana_data", "hana_backup", "hana_log", "usr_sap", "sapmnt", "usr_sap_trans"]
+DEFAULTS = {"customers": 5, "sids": 4, "hosts": 4, "interval": 300, "months": 3,
+            "end": None, "seed": 42, "failure_rate": 0.02}
+
+
+def parse_count(text):
+    # "250K", "10M", "1B" or a plain integer
+    text = str(text).strip().upper()
+    scale = {"K": 10 ** 3, "M": 10 ** 6, "B": 10 ** 9}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def months_back(day, months):
+    index = day.year * 12 + day.month - 1 - months
+    year, month = index // 12, index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def span(params):
+    # [start, end) as UTC dates
+    end = date.fromisoformat(params["end"]) if params.get("end") else date.today()
+    return months_back(end, params["months"]), end
+
+
+def customers_for(rows, params):
+    start, end = span(params)
+    samples = (end - start).days * DAY // params["interval"]
+    hosts = rows / (2 * max(samples, 1))
+    return max(1, math.ceil(hosts / (params["sids"] * params["hosts"])))
+
+
+def fleet(params):
+    # [(customer, sid, host)], database host first within each SID
+    result = []
+    for c in range(params["customers"]):
+        customer = f"CUST{c + 1:03d}"
+        for s in range(params["sids"]):
+            sid = f"{chr(65 + c % 26)}{chr(65 + c // 26 % 26)}{s + 1}"
+            result.append((customer, sid, f"{sid.lower()}db01"))
+            result.extend((customer, sid, f"{sid.lower()}app{h:02d}") for h in range(1, params["hosts"]))
+    return result
+
+
+def _stamps(ts):
+    return np.char.replace(np.datetime_as_string(ts.astype("datetime64[s]")), "T", " ").tolist()
+
+
+def _usage_day(rng, profile, t0, interval):
+    hosts = len(profile["cpu_base"])
+    t = t0 + np.arange(0, DAY, interval)
+    phase = 2 * np.pi * (t % DAY) / DAY
+    shape = (hosts, len(t))
+    cpu = (profile["cpu_base"][:, None] + profile["cpu_amp"][:, None] * np.sin(phase + profile["cpu_phase"][:, None])
+           + rng.normal(0, 5, shape) + 40 * (rng.random(shape) < 0.002))
+    memory = (profile["mem_base"][:, None] + 5 * np.sin(phase)[None, :] + rng.normal(0, 2, shape))
+    return t, np.clip(cpu, 0, 100).round(2), np.clip(memory, 0, 100).round(2)
+
+
+def _fs_day(rng, profile, days, count):
+    # (hosts, samples, 18) used / available / used % per mount
+    size = profile["fs_size"][:, None, :]
+    pct = profile["fs_start"][:, None, :] + profile["fs_growth"][:, None, :] * days[None, :, None]
+    pct = np.clip(pct + rng.normal(0, 0.3, (len(size), count, len(MOUNTS))), 1, 99)
+    used = size * pct / 100
+    return np.stack([used.round(2), (size - used).round(2), pct.round(2)], axis=3).reshape(len(size), count, -1)
+
+
+def _backups_day(rng, sids, t0, failure_rate):
+    rows = []
+    logs = t0 + np.arange(0, DAY, LOG_BACKUP_SECONDS)
+    for customer, sid, host in sids:
+        for db_type, entry, starts in (
+                (sid, "log backup", logs + rng.integers(0, 60, len(logs))),
+                ("SYSTEMDB", "complete data backup", [t0 + 22 * 3600 + int(rng.integers(0, 3600))]),
+                (sid, "complete data backup", [t0 + 23 * 3600 + int(rng.integers(0, 1800))])):
+            starts = np.asarray(starts)
+            failed = rng.random(len(starts)) < failure_rate
+            for ts, stamp, bad in zip(starts.tolist(), _stamps(starts), failed.tolist()):
+                rows.append((customer, sid, host, db_type, stamp, ts, entry, "failed" if bad else "successful"))
+    return rows
+
+
+def generate(directory, **params):
+    params = {**DEFAULTS, **params}
+    path = os.path.join(directory, "read.db")
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} exists")
+    os.makedirs(directory, exist_ok=True)
+    started = time.perf_counter()
+    migrate(path)
+    rng = np.random.default_rng(params["seed"])
+    hosts = fleet(params)
+    sids = [key for key in hosts if key[2].endswith("db01")]
+    n = len(hosts)
+    profile = {
+        "cpu_base": rng.uniform(10, 45, n), "cpu_amp": rng.uniform(5, 25, n), "cpu_phase": rng.uniform(0, 2 * np.pi, n),
+        "mem_base": rng.uniform(40, 70, n),
+        "fs_size": rng.uniform(50, 2000, (n, len(MOUNTS))), "fs_start": rng.uniform(20, 60, (n, len(MOUNTS))),
+        "fs_growth": rng.exponential(0.1, (n, len(MOUNTS))),
+    }
+    start, end = span(params)
+    counts = dict.fromkeys(["system_usage", "file_system_usage", "backup_dashboard"], 0)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    fs_columns = ", ".join(FS_COLUMNS)
+    for offset in range((end - start).days):
+        t0 = int(datetime.combine(start + timedelta(days=offset), datetime.min.time(),
+                                  tzinfo=timezone.utc).timestamp())
+        t, cpu, memory = _usage_day(rng, profile, t0, params["interval"])
+        fs = _fs_day(rng, profile, offset + (t - t0) / DAY, len(t))
+        stamps = _stamps(t)
+        # time-major order: every host's sample for one instant, then the next
+        cpu, memory, fs, epochs = cpu.tolist(), memory.tolist(), fs.tolist(), t.tolist()
+        usage = [(stamps[j], epochs[j], *hosts[i], cpu[i][j], memory[i][j])
+                 for j in range(len(t)) for i in range(n)]
+        fs_rows = [(stamps[j], epochs[j], *hosts[i], *fs[i][j])
+                   for j in range(len(t)) for i in range(n)]
+        backups = sorted(_backups_day(rng, sids, t0, params["failure_rate"]), key=lambda row: row[5])
+        with conn:
+            conn.executemany("INSERT INTO system_usage (timestamp, ts, customer, sid, host, cpu, memory) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", usage)
+            conn.executemany(f"INSERT INTO file_system_usage (timestamp, ts, customer, sid, host, {fs_columns}) "
+                             f"VALUES ({', '.join('?' * (5 + len(FS_COLUMNS)))})", fs_rows)
+            conn.executemany("INSERT INTO backup_dashboard (CUSTOMER, SYSTEM_ID, HOST, Database_type, "
+                             "SYS_START_TIME, start_ts, ENTRY_TYPE_NAME, STATE_NAME) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             backups)
+        counts["system_usage"] += len(usage)
+        counts["file_system_usage"] += len(fs_rows)
+        counts["backup_dashboard"] += len(backups)
+    conn.execute("ANALYZE")
+    conn.close()
+
+    manifest = {"params": {**params, "end": end.isoformat()}, "start": start.isoformat(), "end": end.isoformat(),
+                "hosts": n, "rows": counts, "seconds": round(time.perf_counter() - started, 1),
+                "bytes": os.path.getsize(path)}
+    with open(os.path.join(directory, MANIFEST), "w") as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic read.db for benchmarks")
+    parser.add_argument("directory")
+    parser.add_argument("--rows", help="approximate sample rows (e.g. 10M); sets the number of customers")
+    parser.add_argument("--customers", type=int, default=DEFAULTS["customers"])
+    parser.add_argument("--sids", type=int, default=DEFAULTS["sids"], help="SIDs per customer")
+    parser.add_argument("--hosts", type=int, default=DEFAULTS["hosts"], help="hosts per SID")
+    parser.add_argument("--interval", type=int, default=DEFAULTS["interval"], help="seconds between samples")
+    parser.add_argument("--months", type=int, default=DEFAULTS["months"])
+    parser.add_argument("--end", help="last day (exclusive), default today")
+    parser.add_argument("--seed", type=int, default=DEFAULTS["seed"])
+    parser.add_argument("--failure-rate", type=float, default=DEFAULTS["failure_rate"])
+    parser.add_argument("--force", action="store_true", help="replace an existing read.db")
+    args = parser.parse_args(argv)
+    params = {key: getattr(args, key) for key in DEFAULTS}
+    if args.rows:
+        params["customers"] = customers_for(parse_count(args.rows), params)
+    if args.force:
+        for name in ("read.db", "read.db-wal", "read.db-shm", MANIFEST):
+            if os.path.exists(os.path.join(args.directory, name)):
+                os.remove(os.path.join(args.directory, name))
+    json.dump(generate(args.directory, **params), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
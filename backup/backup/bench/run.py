@@ -0,0 +1,225 @@
+# bench/run.py
+# Drives the routes through the Flask test client against generated databases
+# and writes a JSON report (p50/p95 latency, throughput, peak RSS per route).
+#
+# Each scale gets its own pristine database from bench.generate (reused while
+# the generation parameters match) that is copied for every run, so runs on
+# different commits start from identical data. The routes are timed in a
+# fresh worker process whose working directory is the copy: read.db, the
+# partition files and exports all live there. Importing app plus create_app()
+# is timed as "startup" and the derived-table build (rollups, anomalies,
+# partition maintenance) as "prepare". Every request draws new
+# customer/SID/host/day values from a seeded RNG and carries a unique "_"
+# parameter, so the replay cache of httpcache.py never answers for the code
+# under test.
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import platform
+import resource
+import argparse
+import subprocess
+from datetime import date, datetime, timedelta
+from bench import generate
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_WORK = os.path.join(os.environ.get("TMPDIR", "/tmp"), "bench")
+
+
+def _day(pick):
+    return pick["day"].isoformat()
+
+
+def _week(pick):
+    return {"start_date": (pick["day"] - timedelta(days=6)).isoformat(), "end_date": _day(pick)}
+
+
+def _host(pick):
+    return {"customer": pick["customer"], "sid": pick["sid"], "host": pick["host"]}
+
+
+# name -> (method, path, request values for a random pick)
+ROUTES = {
+    "dashboard": ("POST", "/dashboard", lambda p: {**_host(p), "report_type": "day", "date": _day(p)}),
+    "api_usage_day": ("GET", "/api/usage", lambda p: {**_host(p), "report_type": "day", "date": _day(p)}),
+    "api_usage_month": ("GET", "/api/usage", lambda p: {
+        **_host(p), "report_type": "custom", "start_date": (p["day"] - timedelta(days=30)).isoformat(),
+        "end_date": _day(p)}),
+    "api_filesystem_day": ("GET", "/api/filesystem", lambda p: {**_host(p), "report_type": "day", "date": _day(p)}),
+    "api_compare_day": ("GET", "/api/compare", lambda p: {
+        "customer": p["customer"], "sid": p["sid"], "report_type": "day", "date": _day(p)}),
+    "anomaly": ("GET", "/anomaly", lambda p: {}),
+    "anomaly_baseline": ("GET", "/anomaly", lambda p: {"mode": "baseline"}),
+    "get_backup_status": ("GET", "/get_backup_status", lambda p: {
+        "customer": p["customer"], "sid": p["sid"], "date": _day(p)}),
+    "get_backup_status_customer": ("GET", "/get_backup_status", lambda p: {"customer": p["customer"]}),
+    "api_fleet": ("GET", "/api/fleet", lambda p: {"date": _day(p)}),
+    "api_backup_sla": ("GET", "/api/backup_sla", lambda p: {"customer": p["customer"]}),
+    "api_fs_forecast": ("GET", "/api/fs_forecast", lambda p: {"customer": p["customer"]}),
+    "download_dashboard_xlsx": ("POST", "/download_dashboard", lambda p: {"customer": p["customer"], "date": _day(p)}),
+    "download_dashboard_csv": ("POST", "/download_dashboard", lambda p: {
+        "customer": p["customer"], "date": _day(p), "format": "csv"}),
+    "download_custom_csv": ("POST", "/download_custom", lambda p: {
+        "customer": p["customer"], **_week(p), "format": "csv"}),
+    "download_backup": ("GET", "/download_backup", lambda p: {"customer": p["customer"], **_week(p)}),
+    "download_anomalies_csv": ("GET", "/download_anomalies", lambda p: {"format": "csv"}),
+}
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * q // 100) - 1)]
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KiB elsewhere
+
+
+def time_route(client, method, path, values, picks, repeat):
+    # one warm-up request, then `repeat` timed ones
+    latencies, statuses, size = [], {}, 0
+    started = time.perf_counter()
+    for i in range(repeat + 1):
+        data = {**values(picks[i % len(picks)]), "_": str(i)}
+        begin = time.perf_counter()
+        if method == "POST":
+            response = client.post(path, data=data)
+        else:
+            response = client.get(path, query_string=data)
+        body = response.get_data()
+        elapsed = time.perf_counter() - begin
+        if i == 0:
+            started = time.perf_counter()
+            continue
+        latencies.append(elapsed)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        size += len(body)
+    total = time.perf_counter() - started
+    return {
+        "requests": repeat,
+        "p50_ms": round(1000 * _percentile(latencies, 50), 2),
+        "p95_ms": round(1000 * _percentile(latencies, 95), 2),
+        "mean_ms": round(1000 * sum(latencies) / len(latencies), 2),
+        "throughput_rps": round(repeat / total, 2) if total else None,
+        "bytes_per_request": size // repeat,
+        "status": statuses,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def worker(directory, repeat, seed, names):
+    # runs inside the copied data directory
+    with open(generate.MANIFEST) as fh:
+        manifest = json.load(fh)
+    started = time.perf_counter()
+    import app
+    application = app.create_app()
+    startup = time.perf_counter() - started
+    import dimensions
+    import partitions
+    dimensions.refresh()
+    # archive and retention relative to the generated span, not the wall clock,
+    # so a fixed --end benchmarks the same data on any day
+    partitions.maintain(today=date.fromisoformat(manifest["end"]) - timedelta(days=1))
+    result = {"startup_seconds": round(startup, 3),
+              "prepare_seconds": round(time.perf_counter() - started - startup, 2), "routes": {}}
+
+    rng = random.Random(seed)
+    hosts = generate.fleet(manifest["params"])
+    first, last = date.fromisoformat(manifest["start"]), date.fromisoformat(manifest["end"])
+    days = [first + timedelta(days=d) for d in range(7, (last - first).days)] or [first]
+    picks = [dict(zip(("customer", "sid", "host"), rng.choice(hosts)), day=rng.choice(days))
+             for _ in range(repeat + 1)]
+    client = application.test_client()
+    for name in names:
+        method, path, values = ROUTES[name]
+        result["routes"][name] = time_route(client, method, path, values, picks, repeat)
+        print(f"{name}: {result['routes'][name]}", file=sys.stderr)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def prepare_data(work, scale, seed, end):
+    # pristine generated database for a scale, regenerated when its parameters change
+    directory = os.path.join(work, scale)
+    params = {**generate.DEFAULTS, "seed": seed, "end": end}
+    params["customers"] = generate.customers_for(generate.parse_count(scale), params)
+    manifest_path = os.path.join(directory, generate.MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as fh:
+            manifest = json.load(fh)
+        wanted = {**params, "end": generate.span(params)[1].isoformat()}
+        if manifest["params"] == wanted:
+            return directory, manifest
+        shutil.rmtree(directory)
+    print(f"Generating {scale} rows in {directory} ...", file=sys.stderr)
+    return directory, generate.generate(directory, **params)
+
+
+def run_scale(work, scale, args):
+    directory, manifest = prepare_data(work, scale, args.seed, args.end)
+    run_dir = os.path.join(work, f"{scale}-run")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(run_dir)
+    for name in ("read.db", generate.MANIFEST):
+        shutil.copy2(os.path.join(directory, name), run_dir)
+    command = [sys.executable, "-m", "bench.run", "--worker", run_dir, "--repeat", str(args.repeat),
+               "--seed", str(args.seed), "--routes", ",".join(args.routes)]
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [SOURCE_DIR, os.environ.get("PYTHONPATH")]))}
+    output = subprocess.run(command, cwd=run_dir, env=env, stdout=subprocess.PIPE, check=True).stdout
+    if not args.keep:
+        shutil.rmtree(run_dir)
+    return {"data": manifest, **json.loads(output)}
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=SOURCE_DIR, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the routes on generated data")
+    parser.add_argument("--scales", default="1M", help="comma-separated row counts, e.g. 1M,10M,100M")
+    parser.add_argument("--repeat", type=int, default=20, help="timed requests per route")
+    parser.add_argument("--routes", default=",".join(ROUTES), help="comma-separated subset of routes")
+    parser.add_argument("--seed", type=int, default=generate.DEFAULTS["seed"])
+    parser.add_argument("--end", help="last generated day (exclusive); fix it to compare runs on different days")
+    parser.add_argument("--work", default=DEFAULT_WORK, help="generated databases and run copies")
+    parser.add_argument("--out", default="bench_report.json")
+    parser.add_argument("--keep", action="store_true", help="keep the run copies")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    args.routes = [name for name in args.routes.split(",") if name]
+    unknown = set(args.routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    if args.worker:
+        json.dump(worker(args.worker, args.repeat, args.seed, args.routes), sys.stdout)
+        return
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "scales": {},
+    }
+    for scale in args.scales.split(","):
+        report["scales"][scale] = run_scale(args.work, scale, args)
+    with open(args.out, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,54 +2,196 @@
 DB_PATH = "read.db"
 CPU_THRESHOLD = 60.0
 MEM_THRESHOLD = 70.0
+FS_THRESHOLD = 85.0  # filesystem used %
 PAGE_SIZE = 10  # Number of records per page
 
+# Per-host dynamic baselines (baselines.py)
+BASELINE_WINDOW = 288        # samples in the rolling window (1 day at 5 min)
+BASELINE_MIN_SAMPLES = 30    # don't judge a host before it has this much history
+BASELINE_Z = 3.0             # flag samples this many stddevs above the rolling mean ...
+BASELINE_PERCENTILE = 95     # ... that also exceed this rolling percentile
+BASELINE_EWMA_ALPHA = 0.05
+
+# Charts (downsample.py): max points per trace and reduction method
+CHART_POINT_BUDGET = 2000
+CHART_DOWNSAMPLE = "minmax"  # "minmax" keeps every peak; "lttb" keeps the line shape
+
+# Fleet view (/fleet, fleet.py): hosts per ranking, default and widest window in days
+FLEET_TOP_N = 10
+FLEET_DAYS = 7
+FLEET_MAX_DAYS = 31
+
+# Filesystem "days until full" (forecast.py): daily points fitted, minimum to trust a
+# trend, farthest full date reported, robust refits, and the warning horizon
+FORECAST_LOOKBACK_DAYS = 30
+FORECAST_MIN_DAYS = 7
+FORECAST_HORIZON_DAYS = 730
+FORECAST_ROBUST_PASSES = 2
+FORECAST_WARN_DAYS = 30
+
+# Backup SLA (/backup_sla, backup_sla.py): hours allowed since the last successful
+# data / log backup of a SID, and days in the success-rate window
+BACKUP_SLA_DATA_HOURS = 26
+BACKUP_SLA_LOG_HOURS = 2
+BACKUP_SLA_DAYS = 7
+
+# App start-up (app.create_app): seconds from importing app.py to a ready app,
+# warm-up excluded; slower starts are logged as warnings
+STARTUP_TARGET_SECONDS = 0.5
+
+# Logging (logsetup.py): JSON lines written by a background thread (rotate the
+# file with logrotate; it is reopened when moved). Records beyond the queue size
+# are dropped rather than waited for; INFO records on the routes below are kept
+# for that fraction of requests.
+LOG_FILE = "/opt/myapp/app.log"
+LOG_LEVEL = "INFO"
+LOG_QUEUE_SIZE = 10_000
+LOG_MAX_MESSAGE_CHARS = 2000
+LOG_MAX_FIELD_CHARS = 200
+LOG_SAMPLE_RATES = {
+    "/dashboard": 0.1,
+    "/filesystem": 0.1,
+    "/api/usage": 0.1,
+    "/api/filesystem": 0.1,
+    "/api/compare": 0.25,
+    "/get_backup_status": 0.25,
+}
+
+# Instrumentation (metrics.py): log EXPLAIN QUERY PLAN for named queries slower
+# than this many seconds; None turns the slow-query log off
+SLOW_QUERY_SECONDS = None
+
+# Multi-host comparison (/compare): hosts per view, points per host trace, heatmap columns
+COMPARE_MAX_HOSTS = 24
+COMPARE_POINT_BUDGET = 500
+COMPARE_HEATMAP_BUCKETS = 96
+
+# Bulk ingest (ingest.py): rows per transaction, rejected-record details kept
+INGEST_BATCH_ROWS = 50_000
+INGEST_MAX_ERRORS = 100
+
+# Monthly partitions (partitions.py): months kept in read.db, months of raw
+# samples kept at all, and how often the ingest path runs maintenance
+PARTITION_DIR = "partitions"
+PARTITION_HOT_MONTHS = 2
+RETENTION_RAW_MONTHS = 13
+PARTITION_MAINTAIN_INTERVAL_SECONDS = 6 * 3600
+
+# Parquet archive of closed months (archive.py, needs pyarrow)
+ARCHIVE_DIR = "archive"
+ARCHIVE_COMPRESSION = "zstd"
+
+# Background export jobs (jobs.py)
+EXPORT_DIR = "exports"
+EXPORT_WORKERS = 2
+EXPORT_TTL_SECONDS = 24 * 3600
+
+# Conditional GET / replay of report, backup and anomaly responses (httpcache.py)
+HTTP_CACHE_TTL_SECONDS = 300
+HTTP_CACHE_MAX_ENTRIES = 64
+HTTP_CACHE_MAX_BODY = 4 * 1024 * 1024
+
+# ASGI serving mode (asgi.py): thread pools for light requests and heavy reports/ingest
+ASGI_WORKERS = 32
+ASGI_HEAVY_WORKERS = 4
+ASGI_HEAVY_PREFIXES = ("/download", "/ingest/")
+
+# Customer/SID/host dropdown lookups (dimensions.py)
+DIMENSION_TTL_SECONDS = 300
+
+# All time filters are half-open ranges: start <= x < end.
+# Raw tables are filtered and sorted on their INTEGER epoch column (ts / start_ts):
+# wrap utils.day_range / utils.date_span / utils.month_range in utils.epoch_range.
+# Rollup buckets and the anomaly tables keep ISO TEXT bounds.
 SQL = {
-    "distinct_customers": "SELECT DISTINCT customer FROM system_usage",
-    "distinct_sids": "SELECT DISTINCT sid FROM system_usage WHERE customer=?",
-    "distinct_hosts": "SELECT DISTINCT host FROM system_usage WHERE customer=? AND sid=?",
     "daily_usage": """
-        SELECT timestamp, cpu, memory FROM system_usage
-        WHERE customer=? AND sid=? AND host=? AND DATE(timestamp)=DATE(?)
-        ORDER BY timestamp ASC
+        SELECT ts, cpu, memory FROM system_usage
+        WHERE customer=? AND sid=? AND host=? AND ts >= ? AND ts < ?
+        ORDER BY ts ASC
     """,
     "custom_usage": """
-        SELECT timestamp, cpu, memory FROM system_usage
-        WHERE customer=? AND sid=? AND host=? AND DATE(timestamp) BETWEEN DATE(?) AND DATE(?)
-        ORDER BY timestamp ASC
+        SELECT ts, cpu, memory FROM system_usage
+        WHERE customer=? AND sid=? AND host=? AND ts >= ? AND ts < ?
+        ORDER BY ts ASC
     """,
     "download_daily": """
         SELECT customer, sid, timestamp, host, cpu, memory FROM system_usage
-        WHERE customer=? AND DATE(timestamp)=DATE(?)
-        ORDER BY timestamp ASC
+        WHERE customer=? AND ts >= ? AND ts < ?
+        ORDER BY ts ASC
     """,
+    # served from the daily rollup maintained by rollups.py
     "download_monthly": """
-        SELECT customer, sid, DATE(timestamp), host,
-               ROUND(AVG(cpu), 2), ROUND(AVG(memory), 2)
-        FROM system_usage
-        WHERE customer=? AND strftime('%Y-%m', timestamp)=?
-        GROUP BY customer, sid, DATE(timestamp), host
+        SELECT customer, sid, bucket, host,
+               ROUND(cpu_avg, 2), ROUND(memory_avg, 2)
+        FROM system_usage_daily
+        WHERE customer=? AND bucket >= ? AND bucket < ?
+        ORDER BY bucket, sid, host
     """,
     "download_custom": """
         SELECT customer, sid, timestamp, host, cpu, memory FROM system_usage
-        WHERE customer=? AND DATE(timestamp) BETWEEN DATE(?) AND DATE(?)
-        ORDER BY timestamp ASC
+        WHERE customer=? AND ts >= ? AND ts < ?
+        ORDER BY ts ASC
     """,
-    "fetch_anomalies": """
+    # anomalies is maintained by anomalies.py from CPU_THRESHOLD / MEM_THRESHOLD
+    "download_anomalies": """
         SELECT timestamp, customer, sid, host, cpu, memory
-        FROM system_usage ORDER BY timestamp DESC LIMIT 1000
+        FROM anomalies ORDER BY timestamp DESC, id DESC
     """,
-    
-    "SQL_COUNT_ANOMALIES": """
-    SELECT COUNT(*) FROM system_usage
-    WHERE cpu >= ? OR memory >= ?
+
+    "SQL_COUNT_ANOMALIES": "SELECT COUNT(*) FROM anomalies",
+
+    # baseline_anomalies is maintained by baselines.py (per-host rolling baselines)
+    "download_baseline_anomalies": """
+        SELECT timestamp, customer, sid, host, metric, ROUND(value, 2), ROUND(ewma, 2),
+               ROUND(mean, 2), ROUND(band_high, 2), ROUND(zscore, 2)
+        FROM baseline_anomalies ORDER BY timestamp DESC, rowid DESC
+    """,
+    "SQL_COUNT_BASELINE_ANOMALIES": "SELECT COUNT(*) FROM baseline_anomalies",
+    "SQL_SELECT_BASELINE_ANOMALIES": """
+    SELECT timestamp, customer, sid, host, metric, ROUND(value, 2), ROUND(ewma, 2),
+           ROUND(mean, 2), ROUND(band_high, 2), ROUND(zscore, 2)
+    FROM baseline_anomalies
     """,
 
+    # keyset-paginated via pagination.fetch_page (adds WHERE / ORDER BY / LIMIT)
     "SQL_SELECT_ANOMALIES": """
-    SELECT timestamp, customer, sid, host, cpu, memory 
-    FROM system_usage
-    WHERE cpu >= ? OR memory >= ?
-    ORDER BY timestamp DESC
-    LIMIT ? OFFSET ?
+    SELECT timestamp, customer, sid, host, cpu, memory
+    FROM anomalies
+    """,
+
+    "SQL_BACKUP_STATUS_COUNT": "SELECT COUNT(*) FROM backup_dashboard",
+
+    # keyset-paginated via pagination.fetch_page (adds WHERE / ORDER BY / LIMIT)
+    "SQL_SELECT_BACKUP_STATUS": """
+    SELECT CUSTOMER, SYSTEM_ID, HOST, Database_type,
+           strftime('%Y-%m-%d %H:%M:%S', start_ts, 'unixepoch') AS SYS_START_TIME,
+           ENTRY_TYPE_NAME, STATE_NAME
+    FROM backup_dashboard
+    """,
+
+    # file system charts: (epoch ts, fs1 %, fs2 %, fs3 %)
+    "daily_db_file_system": """
+        SELECT ts, hana_data_used_percent, hana_backup_used_percent, hana_log_used_percent
+        FROM file_system_usage
+        WHERE customer=? AND sid=? AND host=? AND ts >= ? AND ts < ?
+        ORDER BY ts ASC
+    """,
+    "custom_db_file_usage": """
+        SELECT ts, hana_data_used_percent, hana_backup_used_percent, hana_log_used_percent
+        FROM file_system_usage
+        WHERE customer=? AND sid=? AND host=? AND ts >= ? AND ts < ?
+        ORDER BY ts ASC
+    """,
+    "daily_app_file_system": """
+        SELECT ts, usr_sap_used_percent, sapmnt_used_percent, usr_sap_trans_used_percent
+        FROM file_system_usage
+        WHERE customer=? AND sid=? AND host=? AND ts >= ? AND ts < ?
+        ORDER BY ts ASC
+    """,
+    "custom_app_file_usage": """
+        SELECT ts, usr_sap_used_percent, sapmnt_used_percent, usr_sap_trans_used_percent
+        FROM file_system_usage
+        WHERE customer=? AND sid=? AND host=? AND ts >= ? AND ts < ?
+        ORDER BY ts ASC
     """,
 }
@@ -0,0 +1,151 @@
+# db.py
+# Thread-local pooled SQLite connections with tuned PRAGMAs.
+# Each worker thread keeps one open connection per database file and reuses it
+# across requests; at app-context teardown release() rolls back whatever a
+# failed request left open, so no write lock outlives it. MAX_CONNECTIONS is a hard cap: at the cap, connections of
+# finished threads are reaped, and a thread that still finds no slot waits up
+# to POOL_TIMEOUT_SECONDS for one before PoolExhausted is raised.
+import os
+import sqlite3
+import threading
+import time
+import logging
+from constants import DB_PATH
+import metrics
+
+BUSY_TIMEOUT_MS = 5000
+MAX_CONNECTIONS = 64
+POOL_TIMEOUT_SECONDS = BUSY_TIMEOUT_MS / 1000
+CACHED_STATEMENTS = 256
+
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA mmap_size=268435456",   # 256 MB
+    "PRAGMA cache_size=-65536",     # 64 MB
+    "PRAGMA temp_store=MEMORY",
+]
+
+
+class PoolExhausted(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, db_path=DB_PATH, max_connections=MAX_CONNECTIONS,
+                 cached_statements=CACHED_STATEMENTS):
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self.cached_statements = cached_statements
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._connections = {}  # (thread ident, db path) -> connection
+        self._opening = 0  # slots reserved by connections being opened
+        self._stats = {
+            "opened": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "reused": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def _reserve(self):
+        deadline = time.monotonic() + POOL_TIMEOUT_SECONDS
+        with self._lock:
+            while len(self._connections) + self._opening >= self.max_connections:
+                self._reap()
+                if len(self._connections) + self._opening < self.max_connections:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(f"All {self.max_connections} pooled connections are in use")
+                self._slot_freed.wait(min(remaining, 0.1))  # threads may finish meanwhile
+            self._opening += 1
+
+    def _open(self, db_path):
+        started = time.perf_counter()
+        self._reserve()
+        try:
+            conn = sqlite3.connect(
+                db_path,
+                timeout=BUSY_TIMEOUT_MS / 1000,
+                check_same_thread=False,
+                cached_statements=self.cached_statements,
+            )
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+        except Exception:
+            with self._lock:
+                self._opening -= 1
+                self._slot_freed.notify()
+            raise
+        with self._lock:
+            self._opening -= 1
+            self._connections[(threading.get_ident(), db_path)] = conn
+            self._stats["opened"] += 1
+            self._stats["wait_seconds"] += time.perf_counter() - started
+        return conn
+
+    def _reap(self):
+        # caller holds self._lock
+        alive = {t.ident for t in threading.enumerate()}
+        dead = [key for key in self._connections if key[0] not in alive]
+        for key in dead:
+            self._close(self._connections.pop(key))
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            logging.exception("Error closing pooled connection")
+        self._stats["closed"] += 1
+
+    def connection(self, db_path=None):
+        started = time.perf_counter()
+        db_path = db_path or self.db_path
+        if os.getpid() != self._pid:
+            # forked worker (gunicorn --preload): never share the parent's handles
+            self._reset()
+        with self._lock:
+            conn = self._connections.get((threading.get_ident(), db_path))
+            self._stats["checkouts"] += 1
+            if conn is not None:
+                self._stats["reused"] += 1
+        if conn is None:
+            conn = self._open(db_path)
+        metrics.observe("db_connection_wait_seconds", time.perf_counter() - started)
+        return conn
+
+    def release(self, db_path=None):
+        # end of a request: the connection stays pooled, any open transaction does not
+        with self._lock:
+            conn = self._connections.get((threading.get_ident(), db_path or self.db_path))
+        if conn is not None and conn.in_transaction:
+            logging.warning("Rolling back a transaction left open by the request")
+            conn.rollback()
+
+    def connections_for(self, ident):
+        with self._lock:
+            return [conn for key, conn in self._connections.items() if key[0] == ident]
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections.values():
+                self._close(conn)
+            self._connections.clear()
+            self._slot_freed.notify_all()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open"] = len(self._connections)
+            stats["max_connections"] = self.max_connections
+        return stats
+
+
+pool = ConnectionPool()
@@ -0,0 +1,101 @@
+# dimensions.py
+# Customer / SID / host lookups for the dropdowns.
+# The dimensions table holds one row per (source table, customer, sid, host)
+# with the first/last sample time; it is extended from a rowid watermark per
+# source, so a refresh only groups the rows added since the last one. Lookups
+# are answered from an in-process LRU+TTL cache that the ingest path clears
+# after every load; other workers pick the change up within the TTL. Rows whose
+# samples have all passed retention are pruned by partitions.drop_expired.
+import time
+import logging
+import threading
+from cache import TTLCache
+from constants import DIMENSION_TTL_SECONDS
+from schema import DIMENSION_COLUMNS, EPOCH_COLUMNS, get_state, set_state
+from utils import get_db_connection, db_path
+
+REFRESH_INTERVAL_SECONDS = 60  # catches writers that bypass ingest.py
+
+_cache = TTLCache(DIMENSION_TTL_SECONDS, maxsize=1024)
+_lock = threading.Lock()
+_last_refresh = {}  # db path -> monotonic time
+
+
+def refresh(conn=None):
+    conn = conn or get_db_connection()
+    changed = 0
+    with _lock:
+        for source, (customer, sid, host) in DIMENSION_COLUMNS.items():
+            name = f"dimensions:{source}"
+            epoch = EPOCH_COLUMNS[source][1]
+            watermark, _ = get_state(conn, name)
+            high = conn.execute(f"SELECT MAX(rowid) FROM main.{source}").fetchone()[0] or 0
+            if high <= watermark:
+                continue
+            with conn:
+                changed += conn.execute(
+                    f"""INSERT INTO dimensions (source, customer, sid, host, first_ts, last_ts)
+                        SELECT ?, COALESCE({customer}, ''), COALESCE({sid}, ''), COALESCE({host}, ''),
+                               MIN({epoch}), MAX({epoch})
+                        FROM main.{source} WHERE rowid > ? AND rowid <= ? GROUP BY 2, 3, 4
+                        ON CONFLICT (source, customer, sid, host) DO UPDATE SET
+                            first_ts = MIN(COALESCE(first_ts, excluded.first_ts), COALESCE(excluded.first_ts, first_ts)),
+                            last_ts = MAX(COALESCE(last_ts, excluded.last_ts), COALESCE(excluded.last_ts, last_ts))""",
+                    (source, watermark, high),
+                ).rowcount
+                set_state(conn, name, high)
+        _last_refresh[db_path()] = time.monotonic()
+    if changed:
+        invalidate()
+        logging.info("Dimensions: %d customer/sid/host rows added or extended", changed)
+    return changed
+
+
+def prune(conn, before_ts):
+    # retention deleted every sample before before_ts: drop the rows whose
+    # samples all went with it and move the first sample time of the others
+    with _lock, conn:
+        removed = conn.execute("DELETE FROM dimensions WHERE last_ts < ?", (before_ts,)).rowcount
+        conn.execute("UPDATE dimensions SET first_ts = ? WHERE first_ts < ?", (before_ts, before_ts))
+    if removed:
+        invalidate()
+        logging.info("Dimensions: %d customer/sid/host rows pruned", removed)
+    return removed
+
+
+def maybe_refresh():
+    if time.monotonic() - _last_refresh.get(db_path(), 0.0) >= REFRESH_INTERVAL_SECONDS:
+        try:
+            refresh()
+        except Exception:
+            logging.exception("Dimension refresh failed; serving cached lookups")
+
+
+def invalidate():
+    _cache.clear()
+
+
+def _lookup(key, sql, params):
+    maybe_refresh()
+    return _cache.get_or_set((db_path(), *key), lambda: [row[0] for row in get_db_connection().execute(sql, params)])
+
+
+def customers(source):
+    return _lookup(("customers", source),
+                   "SELECT DISTINCT customer FROM dimensions WHERE source=? ORDER BY customer", (source,))
+
+
+def sids(source, customer):
+    return _lookup(("sids", source, customer),
+                   "SELECT DISTINCT sid FROM dimensions WHERE source=? AND customer=? ORDER BY sid",
+                   (source, customer))
+
+
+def hosts(source, customer, sid):
+    return _lookup(("hosts", source, customer, sid),
+                   "SELECT host FROM dimensions WHERE source=? AND customer=? AND sid=? ORDER BY host",
+                   (source, customer, sid))
+
+
+def stats():
+    return {"hits": _cache.hits, "misses": _cache.misses}
@@ -0,0 +1,102 @@
+# downsample.py
+# Server-side downsampling for the dashboard and filesystem charts.
+# Query rows are turned into NumPy columns once, then every trace is reduced
+# to at most CHART_POINT_BUDGET points before the figure is built:
+#   "minmax" keeps the min and max sample of each bucket (peaks always survive)
+#   "lttb"   Largest-Triangle-Three-Buckets (visually faithful line shape)
+import numpy as np
+from constants import CHART_POINT_BUDGET, CHART_DOWNSAMPLE
+
+
+def _floats(column):
+    try:
+        return np.array(column, dtype=float)  # None -> nan
+    except (TypeError, ValueError):
+        values = np.empty(len(column))
+        for i, value in enumerate(column):
+            try:
+                values[i] = float(value)
+            except (TypeError, ValueError):
+                values[i] = np.nan
+        return values
+
+
+def _times(column):
+    if isinstance(column[0], int):
+        return np.array(column, dtype=np.int64).astype("datetime64[s]").astype("datetime64[ms]")
+    return np.array(column, dtype="datetime64[ms]")
+
+
+def columns(rows, width):
+    # rows are (ts, v1, ..., v{width}) with ts in epoch seconds (raw tables) or
+    # an ISO bucket string (rollups); returns datetime64 x and float ys
+    if not rows:
+        return np.array([], dtype="datetime64[ms]"), [np.array([]) for _ in range(width)]
+    data = list(zip(*rows))
+    return _times(data[0]), [_floats(data[i]) for i in range(1, width + 1)]
+
+
+def keyed_columns(rows, width):
+    # rows are (key, ts, v1, ..., v{width}) ordered by key; returns the key
+    # column as an object array plus columns() of the rest
+    if not rows:
+        return np.array([], dtype=object), *columns(rows, width)
+    data = list(zip(*rows))
+    return np.array(data[0], dtype=object), _times(data[1]), [_floats(data[i]) for i in range(2, width + 2)]
+
+
+def split_by_key(keys, x, ys):
+    # one pass over key-ordered columns -> [(key, x, ys)] per run of equal keys
+    if not len(keys):
+        return []
+    edges = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    xs = np.split(x, edges)
+    per_metric = [np.split(y, edges) for y in ys]
+    starts = np.concatenate([[0], edges])
+    return [(keys[s], xs[i], [parts[i] for parts in per_metric]) for i, s in enumerate(starts)]
+
+
+def drop_incomplete(x, ys):
+    # keep only samples where every series has a numeric value
+    mask = np.logical_and.reduce([np.isfinite(y) for y in ys])
+    return x[mask], [y[mask] for y in ys]
+
+
+def minmax(x, y, budget):
+    n = len(y)
+    if n <= budget:
+        return x, y
+    buckets = max(1, budget // 2)
+    size = -(-n // buckets)
+    pad = buckets * size - n
+    low = np.concatenate([np.where(np.isnan(y), np.inf, y), np.full(pad, np.inf)]).reshape(buckets, size)
+    high = np.concatenate([np.where(np.isnan(y), -np.inf, y), np.full(pad, -np.inf)]).reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    keep = np.unique(np.concatenate([offsets + low.argmin(axis=1), offsets + high.argmax(axis=1)]))
+    keep = keep[keep < n]
+    return x[keep], y[keep]
+
+
+def lttb(x, y, budget):
+    n = len(y)
+    if n <= budget or budget < 3:
+        return x, y
+    xs = x.astype("datetime64[ms]").astype(np.float64) if np.issubdtype(x.dtype, np.datetime64) else x.astype(float)
+    ys = np.where(np.isnan(y), 0.0, y)
+    edges = np.linspace(1, n - 1, budget - 1).astype(int)
+    keep = np.empty(budget, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(budget - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xs[nxt_lo:nxt_hi].mean() if nxt_hi > nxt_lo else xs[-1]
+        avg_y = ys[nxt_lo:nxt_hi].mean() if nxt_hi > nxt_lo else ys[-1]
+        area = np.abs((xs[a] - avg_x) * (ys[lo:hi] - ys[a]) - (xs[a] - xs[lo:hi]) * (avg_y - ys[a]))
+        a = lo + int(area.argmax()) if hi > lo else lo
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+def reduce(x, y, budget=CHART_POINT_BUDGET, method=CHART_DOWNSAMPLE):
+    return (lttb if method == "lttb" else minmax)(x, y, budget)
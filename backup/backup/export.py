@@ -0,0 +1,120 @@
+# export.py
+# Shared streaming export pipeline for the /download_* routes.
+# Rows are pulled from the cursor in chunks; Excel files are written with
+# xlsxwriter's constant_memory mode to a temp file that is streamed back and
+# removed afterwards, and CSV (optionally gzip) is produced on the fly.
+# xlsxwriter is imported on first use, so processes that never export skip it.
+import csv
+import io
+import os
+import zlib
+import tempfile
+import logging
+import time
+from flask import Response, request, stream_with_context
+import metrics
+
+CHUNK_ROWS = 5000
+CHUNK_BYTES = 64 * 1024
+FORMATS = ("xlsx", "csv", "csv.gz")
+MIMETYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+}
+
+
+def iter_rows(cursor, chunk_rows=CHUNK_ROWS):
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            return
+        yield from rows
+
+
+def write_xlsx(rows, headers, sheet_name, path):
+    import xlsxwriter  # loaded by the first Excel export, not at start-up
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    sheet = workbook.add_worksheet(sheet_name)
+    sheet.write_row(0, 0, headers)
+    count = 0
+    for count, row in enumerate(rows, start=1):
+        sheet.write_row(count, 0, row)
+    workbook.close()
+    return count
+
+
+def iter_csv(rows, headers, compress=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 -> gzip container
+
+    def drain():
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_BYTES:
+            chunk = drain()
+            if chunk:
+                yield chunk
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def iter_file(path, remove=True):
+    try:
+        with open(path, "rb") as fh:
+            while True:
+                chunk = fh.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            os.remove(path)
+
+
+def requested_format():
+    fmt = request.values.get("format", "xlsx").lower()
+    return fmt if fmt in FORMATS else "xlsx"
+
+
+def attachment(filename):
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+
+def export_response(cursor, headers, sheet_name, filename, fmt=None, rows=None):
+    # `filename` is given without extension; the format decides it.
+    fmt = fmt or requested_format()
+    rows = iter_rows(cursor) if rows is None else rows
+    download_name = f"{filename}.{fmt}"
+
+    if fmt in ("csv", "csv.gz"):
+        body = metrics.counted(iter_csv(rows, headers, compress=(fmt == "csv.gz")), fmt, sheet_name)
+        return Response(stream_with_context(body), mimetype=MIMETYPES[fmt],
+                        headers=attachment(download_name))
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    started = time.perf_counter()
+    try:
+        count = write_xlsx(rows, headers, sheet_name, path)
+    except Exception:
+        os.remove(path)
+        raise
+    size = os.path.getsize(path)
+    metrics.observe("export_build_seconds", time.perf_counter() - started, format=fmt, report=sheet_name)
+    metrics.inc("export_bytes_total", size, format=fmt, report=sheet_name)
+    metrics.inc("export_rows_total", count, format=fmt, report=sheet_name)
+    logging.info("Exported %d rows to %s", count, download_name)
+    headers = attachment(download_name)
+    headers["Content-Length"] = str(size)
+    return Response(iter_file(path), mimetype=MIMETYPES[fmt], headers=headers)
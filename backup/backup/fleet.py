@@ -0,0 +1,130 @@
+# fleet.py
+# Fleet-wide capacity view from the hourly rollups (rollups.py): top-N hosts by
+# p95 CPU, memory and filesystem used %, and a (customer, host) x hour heatmap.
+# Each source is read with one range scan on its bucket index; grouping and
+# ranking are done with NumPy, so the cost grows with hosts x hours in the
+# window, not with raw samples. A host's p95 over the window is the 95th
+# percentile of its hourly p95 values, as for the monthly rollup.
+import logging
+from datetime import date, timedelta
+import numpy as np
+from constants import CPU_THRESHOLD, MEM_THRESHOLD, FS_THRESHOLD, FLEET_TOP_N, FLEET_DAYS, FLEET_MAX_DAYS
+from schema import FS_COLUMNS
+from utils import fetch_query, setting
+import rollups
+
+HOUR = 3600
+FS_USED = [c for c in FS_COLUMNS if c.endswith("_used_percent")]
+
+# metric -> (rollup source, hourly p95 columns, label, threshold setting, default);
+# several columns are reduced to their maximum (the fullest filesystem of the host)
+METRICS = {
+    "cpu": ("system_usage", ["cpu_p95"], "CPU %", "CPU_THRESHOLD", CPU_THRESHOLD),
+    "memory": ("system_usage", ["memory_p95"], "Memory %", "MEM_THRESHOLD", MEM_THRESHOLD),
+    "filesystem": ("file_system_usage", [f"{c}_p95" for c in FS_USED], "Filesystem used %",
+                   "FS_THRESHOLD", FS_THRESHOLD),
+}
+
+
+def threshold_of(metric):
+    # the serving app's setting (app.create_app), else the constants.py default
+    return setting(*METRICS[metric][3:])
+
+
+def window(values):
+    # [start, end) ISO days covering `days` days up to `date` (default: newest rollup day)
+    days = min(max(int(values.get("days", FLEET_DAYS)), 1), FLEET_MAX_DAYS)
+    day = values.get("date")
+    if not day:
+        newest = fetch_query("SELECT MAX(bucket) FROM system_usage_hourly")
+        day = newest[0][0] if newest and newest[0][0] else date.today().isoformat()
+    last = date.fromisoformat(day[:10])
+    end = last + timedelta(days=1)
+    return (end - timedelta(days=days)).isoformat(), end.isoformat(), last.isoformat(), days
+
+
+def _hourly(source, start, end):
+    # (keys, group per row, hour offset per row, {metric: values}) for one source
+    metrics = [m for m, spec in METRICS.items() if spec[0] == source]
+    columns = [c for m in metrics for c in METRICS[m][1]]
+    rows = fetch_query(
+        f"""SELECT customer, sid, host, bucket, {', '.join(columns)} FROM {source}_hourly
+            WHERE bucket >= ? AND bucket < ?""", (start, end), f"fleet_{source}")
+    if not rows:
+        return [], np.array([], dtype=int), np.array([], dtype=int), {m: np.array([]) for m in metrics}
+    data = list(zip(*rows))
+    index = {}
+    groups = np.fromiter((index.setdefault(key, len(index)) for key in zip(data[0], data[1], data[2])),
+                         dtype=np.int64, count=len(rows))
+    stamps = np.array(data[3], dtype="datetime64[s]").astype(np.int64)
+    hours = (stamps - np.datetime64(start, "s").astype(np.int64)) // HOUR
+    values, at = {}, 4
+    for metric in metrics:
+        width = len(METRICS[metric][1])
+        block = np.array(data[at:at + width], dtype=float)  # None -> nan
+        values[metric] = np.fmax.reduce(block, axis=0) if width > 1 else block[0]
+        at += width
+    return list(index), groups, hours, values
+
+
+def group_p95(groups, values, count):
+    # per-group 95th percentile in one sort: order by (group, value), then pick
+    # the ceil(0.95 * n)-th value of every group run
+    ok = np.isfinite(values)
+    groups, values = groups[ok], values[ok]
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    sizes = np.bincount(groups, minlength=count)
+    starts = np.cumsum(sizes) - sizes
+    pick = starts + np.maximum(np.ceil(0.95 * sizes).astype(np.int64) - 1, 0)
+    result = np.full(count, np.nan)
+    result[sizes > 0] = values[pick[sizes > 0]]
+    return result
+
+
+def _ranking(keys, groups, values, threshold, top):
+    count = len(keys)
+    p95 = group_p95(groups, values, count)
+    over = np.bincount(groups, weights=np.nan_to_num(values, nan=-np.inf) > threshold, minlength=count)
+    order = np.argsort(-np.where(np.isfinite(p95), p95, -np.inf), kind="stable")[:top]
+    return [
+        {"customer": keys[i][0], "sid": keys[i][1], "host": keys[i][2],
+         "p95": round(float(p95[i]), 2), "hours_over": int(over[i]), "hot": bool(p95[i] > threshold)}
+        for i in order if np.isfinite(p95[i])
+    ]
+
+
+def _heatmap(keys, groups, hours, values, columns):
+    rows = sorted(range(len(keys)), key=lambda i: (keys[i][0], keys[i][2], keys[i][1]))
+    position = np.empty(len(keys), dtype=np.int64)
+    position[rows] = np.arange(len(rows))
+    z = np.full((len(keys), columns), np.nan)
+    ok = (hours >= 0) & (hours < columns)
+    z[position[groups[ok]], hours[ok]] = values[ok]
+    z = np.round(z, 1)
+    return {
+        "rows": [f"{keys[i][0]} / {keys[i][2]}" for i in rows],
+        "z": [[None if v != v else v for v in line] for line in z.tolist()],
+    }
+
+
+def summary(values):
+    start, end, last, days = window(values)
+    top = min(max(int(values.get("top", FLEET_TOP_N)), 1), 100)
+    metric = values.get("metric", "cpu")
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    rollups.maybe_refresh()
+    sources = {source: _hourly(source, start, end) for source in {spec[0] for spec in METRICS.values()}}
+    rankings = {}
+    for name, (source, _, label, *_) in METRICS.items():
+        keys, groups, _, series = sources[source]
+        limit = threshold_of(name)
+        rankings[name] = {"label": label, "threshold": limit,
+                          "hosts": _ranking(keys, groups, series[name], limit, top)}
+    keys, groups, hours, series = sources[METRICS[metric][0]]
+    heatmap = _heatmap(keys, groups, hours, series[metric], days * 24)
+    heatmap.update(metric=METRICS[metric][2], threshold=threshold_of(metric),
+                   t0=int(np.datetime64(start, "s").astype(np.int64)), step=HOUR)
+    logging.info("Fleet summary %s..%s: %d hosts", start, end, len(sources["system_usage"][0]))
+    return {"start": start, "end": end, "date": last, "days": days, "top": top, "rankings": rankings, "heatmap": heatmap}
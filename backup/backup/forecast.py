@@ -0,0 +1,213 @@
+# forecast.py
+# "Days until full" per host and mount, fitted in batch from the daily
+# filesystem rollups (file_system_usage_daily) and kept in fs_forecast.
+#
+# For every (host, mount) the last FORECAST_LOOKBACK_DAYS daily average used %
+# are fitted with a robust line: least squares, then FORECAST_ROBUST_PASSES
+# Huber-reweighted refits so a one-off cleanup or spike does not flip the
+# trend. All series are fitted at once -- the sums of the normal equations are
+# np.bincount over a flat (host, mount) index -- so the whole fleet costs a few
+# array passes. Only hosts with new samples since the last run (rowid
+# watermark in etl_state) are refitted. The stored full_date is absolute, so
+# "days left" is derived at read time and never goes stale.
+import time
+import threading
+import logging
+from datetime import date, timedelta
+import numpy as np
+from constants import (FORECAST_LOOKBACK_DAYS, FORECAST_MIN_DAYS, FORECAST_HORIZON_DAYS,
+                       FORECAST_ROBUST_PASSES, FORECAST_WARN_DAYS)
+from schema import get_state, set_state
+from utils import get_db_connection, db_path
+
+STATE_NAME = "forecast"
+REFRESH_INTERVAL_SECONDS = 60
+HUBER_K = 1.345
+MIN_SLOPE = 0.01  # used % per day; flatter series never fill up
+
+# mount shown on the filesystem page -> column prefix in file_system_usage
+MOUNTS = {
+    "/hana/data": "hana_data",
+    "/hana/log": "hana_log",
+    "/hana/backup": "hana_backup",
+    "/usr/sap": "usr_sap",
+    "/sapmnt": "sapmnt",
+    "/usr/sap/trans": "usr_sap_trans",
+}
+
+_lock = threading.Lock()
+_last_refresh = {}  # db path -> monotonic time
+
+
+def _day(bucket):
+    return date.fromisoformat(bucket[:10]).toordinal()
+
+
+def fit(groups, x, y, count, passes=FORECAST_ROBUST_PASSES):
+    # Per-group weighted least squares y = a + b*x from bincount sums, followed by
+    # Huber reweighting (scale = weighted RMS of the residuals of each group).
+    # Returns (n, a, b, rmse) arrays of length `count`; b is nan below 2 distinct x.
+    w = np.ones(len(y))
+    n = np.bincount(groups, minlength=count)
+    for step in range(passes + 1):
+        sw = np.bincount(groups, w, count)
+        sx = np.bincount(groups, w * x, count)
+        sy = np.bincount(groups, w * y, count)
+        sxx = np.bincount(groups, w * x * x, count)
+        sxy = np.bincount(groups, w * x * y, count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            b = (sw * sxy - sx * sy) / (sw * sxx - sx * sx)
+            a = (sy - b * sx) / sw
+        b[~np.isfinite(b)] = np.nan
+        residual = y - (a[groups] + b[groups] * x)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rmse = np.sqrt(np.bincount(groups, w * residual ** 2, count) / np.maximum(sw, 1))
+        if step == passes:
+            break
+        limit = HUBER_K * np.maximum(rmse[groups], 1e-6)
+        w = np.where(np.abs(residual) <= limit, 1.0, limit / np.maximum(np.abs(residual), 1e-12))
+        w[~np.isfinite(w)] = 1.0
+    return n, a, b, rmse
+
+
+def _touched(conn, watermark, high):
+    # hosts with new samples -> earliest daily bucket any of their windows can need
+    rows = conn.execute(
+        """SELECT customer, sid, host, MIN(ts) FROM file_system_usage
+           WHERE rowid > ? AND rowid <= ? AND ts IS NOT NULL
+           GROUP BY customer, sid, host""", (watermark, high)).fetchall()
+    if not rows:
+        return set(), None
+    first = date(*time.gmtime(min(row[3] for row in rows))[:3]) - timedelta(days=FORECAST_LOOKBACK_DAYS)
+    return {row[:3] for row in rows}, first.isoformat()
+
+
+def forecast_rows(rows):
+    # rows: (customer, sid, host, bucket, <mount>_used_percent_avg ...) daily rollups
+    # -> fs_forecast rows, one per (host, mount) with data
+    if not rows:
+        return []
+    data = list(zip(*rows))
+    index = {}
+    hosts = np.fromiter((index.setdefault(key, len(index)) for key in zip(data[0], data[1], data[2])),
+                        dtype=np.int64, count=len(rows))
+    days = np.fromiter((_day(b) for b in data[3]), dtype=np.int64, count=len(rows))
+    used = np.array(data[4:], dtype=float)  # mounts x rows, None -> nan
+
+    # long format over (host, mount): flat group = host * mounts + mount
+    mounts = len(MOUNTS)
+    groups = (hosts[None, :] * mounts + np.arange(mounts)[:, None]).ravel()
+    x = np.broadcast_to(days, used.shape).ravel()
+    y = used.ravel()
+    ok = np.isfinite(y)
+    groups, x, y = groups[ok], x[ok], y[ok]
+    count = len(index) * mounts
+    last = np.full(count, np.iinfo(np.int64).min)
+    np.maximum.at(last, groups, x)
+    recent = x > last[groups] - FORECAST_LOOKBACK_DAYS
+    groups, x, y = groups[recent], x[recent], y[recent]
+
+    # x relative to each series' last day: the intercept is today's fitted level
+    n, level, slope, rmse = fit(groups, (x - last[groups]).astype(float), y, count)
+    latest = np.full(count, np.nan)
+    latest[groups[x == last[groups]]] = y[x == last[groups]]
+
+    keys = list(index)
+    fitted_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    result = []
+    for g in np.flatnonzero(n):
+        key, mount = keys[g // mounts], list(MOUNTS)[g % mounts]
+        enough = n[g] >= FORECAST_MIN_DAYS and np.isfinite(slope[g])
+        growth = float(slope[g]) if enough else None
+        full_date = None
+        if enough and slope[g] >= MIN_SLOPE:
+            days_left = max(0.0, (100.0 - level[g]) / slope[g])
+            if days_left <= FORECAST_HORIZON_DAYS:
+                full_date = date.fromordinal(int(last[g]) + int(days_left)).isoformat()
+        result.append((*key, mount, int(n[g]), date.fromordinal(int(last[g])).isoformat(),
+                       round(float(latest[g]), 2) if np.isfinite(latest[g]) else None,
+                       round(growth, 4) if growth is not None else None,
+                       round(float(rmse[g]), 3) if enough else None, full_date, fitted_at))
+    return result
+
+
+def refresh(conn=None, full=False):
+    # run after rollups.refresh(): reads the daily rollups of hosts with new samples
+    conn = conn or get_db_connection()
+    with _lock:
+        watermark, _ = get_state(conn, STATE_NAME)
+        rolled, _ = get_state(conn, "rollup:file_system_usage")
+        if full:
+            watermark = 0
+        if rolled <= watermark:
+            _last_refresh[db_path()] = time.monotonic()
+            return 0
+        started = time.perf_counter()
+        touched, since = (None, "") if full else _touched(conn, watermark, rolled)
+        columns = ", ".join(f"{prefix}_used_percent_avg" for prefix in MOUNTS.values())
+        # one range read for all hosts; each series is cut to its own window in forecast_rows
+        rows = conn.execute(
+            f"""SELECT customer, sid, host, bucket, {columns} FROM file_system_usage_daily
+                WHERE bucket >= ?""", (since,)).fetchall() if since is not None else []
+        if touched is not None:
+            rows = [row for row in rows if row[:3] in touched]
+        results = forecast_rows(rows)
+        with conn:
+            if full:
+                conn.execute("DELETE FROM fs_forecast")
+            conn.executemany(
+                """INSERT OR REPLACE INTO fs_forecast
+                   (customer, sid, host, mount, samples, last_day, used_percent, growth_per_day,
+                    rmse, full_date, fitted_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", results)
+            set_state(conn, STATE_NAME, rolled)
+        _last_refresh[db_path()] = time.monotonic()
+    logging.info("Forecast: fitted %d host/mount series from %d daily rows in %.2fs",
+                 len(results), len(rows), time.perf_counter() - started)
+    return len(results)
+
+
+def maybe_refresh():
+    if time.monotonic() - _last_refresh.get(db_path(), 0.0) >= REFRESH_INTERVAL_SECONDS:
+        try:
+            refresh()
+        except Exception:
+            logging.exception("Forecast refresh failed; serving existing forecasts")
+
+
+def listing(values, today=None):
+    # fs_forecast rows soonest-full first, with days left counted from today
+    today = today or date.today()
+    conditions, params = [], []
+    if values.get("customer"):
+        conditions.append("customer = ?")
+        params.append(values["customer"])
+    if values.get("sid"):
+        conditions.append("sid = ?")
+        params.append(values["sid"])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = get_db_connection().execute(
+        f"""SELECT customer, sid, host, mount, samples, last_day, used_percent, growth_per_day,
+                   rmse, full_date, fitted_at
+            FROM fs_forecast {where}
+            ORDER BY full_date IS NULL, full_date, used_percent DESC""", params).fetchall()
+    listing = []
+    for row in rows:
+        days_left = (date.fromisoformat(row[9]) - today).days if row[9] else None
+        listing.append({
+            "customer": row[0], "sid": row[1], "host": row[2], "mount": row[3], "samples": row[4],
+            "last_day": row[5], "used_percent": row[6], "growth_per_day": row[7], "rmse": row[8],
+            "full_date": row[9], "days_left": days_left,
+            "warn": days_left is not None and days_left <= FORECAST_WARN_DAYS,
+        })
+    return listing
+
+
+if __name__ == "__main__":
+    import logsetup
+    logsetup.setup()
+    from schema import migrate
+    import rollups
+    migrate()
+    rollups.catch_up()
+    print(f"Fitted {refresh(full=True)} host/mount series")
@@ -0,0 +1,135 @@
+# httpcache.py
+# Conditional responses for the report, backup and anomaly routes.
+# A response is identified by its route, the normalized request parameters and
+# the version of the data it reads: MAX(rowid) of its tables plus the etl_state
+# rows of the derived tables (reports use only the latter, see reports.py). The
+# ETag is therefore known before the view runs, and Last-Modified is the newest
+# updated_at of those etl_state rows, so every worker sends the same
+# validators. A matching If-None-Match or If-Modified-Since is answered with
+# 304 without touching the data. Bodies up
+# to HTTP_CACHE_MAX_BODY bytes are also kept for HTTP_CACHE_TTL_SECONDS, so
+# repeated POST downloads (which browsers never revalidate) are replayed.
+#
+# Raw rows are only appended (ingest) or moved out of read.db by
+# partitions.maintain, which bumps the "partitions" state, so a version
+# changes whenever the data behind a response does.
+import json
+import time
+import calendar
+import hashlib
+import logging
+import functools
+from email.utils import formatdate
+from flask import Response, g, make_response, request
+from cache import TTLCache
+from constants import HTTP_CACHE_TTL_SECONDS, HTTP_CACHE_MAX_ENTRIES, HTTP_CACHE_MAX_BODY
+from utils import get_db_connection, db_path
+import reports
+
+KEPT_HEADERS = ("Content-Type", "Content-Disposition", "Content-Encoding")
+
+_bodies = TTLCache(HTTP_CACHE_TTL_SECONDS, maxsize=HTTP_CACHE_MAX_ENTRIES)
+
+
+def modified_since(timestamp):
+    # the data of this request changed at `timestamp` (epoch seconds) at the latest
+    g.data_modified = max(g.get("data_modified") or 0, int(timestamp))
+
+
+def data_version(conn, tables, states=()):
+    version = [conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] for table in tables]
+    for name in states:
+        row = conn.execute("SELECT watermark, meta, updated_at FROM etl_state WHERE name=?", (name,)).fetchone()
+        version.append(tuple(row[:2]) if row else None)
+        if row and row[2]:
+            modified_since(calendar.timegm(time.strptime(row[2], "%Y-%m-%d %H:%M:%S")))
+    return version
+
+
+def report(name):
+    # version of a reports.REPORTS entry built from the request values
+    def version():
+        report_ = reports.build(name, request.values)
+        return data_version(get_db_connection(), (), reports.version_states(report_))
+    return version
+
+
+def normalized_params():
+    # blank values dropped, keys and repeated values (sid=A&sid=B) sorted
+    params = []
+    for key in sorted(request.values):
+        values = sorted(v.strip() for v in request.values.getlist(key) if v.strip())
+        if values:
+            params.append([key, values])
+    return params
+
+
+def _not_modified(etag, modified):
+    if request.if_none_match:
+        return etag in request.if_none_match
+    since = request.if_modified_since
+    return since is not None and modified is not None and modified <= since.timestamp()
+
+
+def _keep(etag, headers, chunks):
+    # pass a streamed body through, keeping a copy if it is small enough
+    kept, size = [], 0
+    try:
+        for chunk in chunks:
+            if kept is not None:
+                chunk = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                size += len(chunk)
+                if size <= HTTP_CACHE_MAX_BODY:
+                    kept.append(chunk)
+                else:
+                    kept = None
+            yield chunk
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    if kept is not None:
+        _bodies.set(etag, (b"".join(kept), headers))
+
+
+def conditional(version):
+    # version() -> JSON-able data version of what the view reads
+    def decorate(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            g.pop("data_modified", None)
+            try:
+                current = version()
+            except (KeyError, ValueError):
+                return view(*args, **kwargs)  # the view reports bad parameters
+            modified = g.pop("data_modified", None)  # None until a refresh has recorded a state
+            gzip = "gzip" in request.headers.get("Accept-Encoding", "")  # api.json_response compresses
+            key = json.dumps([db_path(), request.method, request.path, normalized_params(), gzip, current],
+                             default=str)
+            etag = hashlib.sha1(key.encode("utf-8")).hexdigest()
+            validators = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+            if modified is not None:
+                validators["Last-Modified"] = formatdate(modified, usegmt=True)
+            if request.method in ("GET", "HEAD") and _not_modified(etag, modified):
+                return Response(status=304, headers=validators)
+            cached = _bodies.get(etag)
+            if cached is not None:
+                body, headers = cached
+                return Response(body, headers={**headers, **validators})
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+            response.headers.update(validators)
+            if response.is_streamed:
+                response.response = _keep(etag, headers, response.response)
+            elif response.content_length is not None and response.content_length <= HTTP_CACHE_MAX_BODY:
+                _bodies.set(etag, (response.get_data(), headers))
+            logging.info("Rendered %s for ETag %.12s", request.path, etag)
+            return response
+        return wrapper
+    return decorate
+
+
+def stats():
+    return {"hits": _bodies.hits, "misses": _bodies.misses}
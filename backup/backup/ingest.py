@@ -0,0 +1,233 @@
+# ingest.py
+# Bulk loader for system_usage, file_system_usage and backup_dashboard.
+# Records (CSV or JSON lines) are validated once on the way in -- numeric
+# columns must parse as finite floats, timestamps as ISO datetimes -- and
+# written with executemany in INGEST_BATCH_ROWS-sized transactions. Under WAL
+# readers keep serving the last committed snapshot while a batch is written.
+#
+#   python ingest.py system_usage samples.csv
+#   python ingest.py file_system_usage fs.jsonl --format jsonl
+import io
+import csv
+import json
+import math
+import calendar
+import time
+import logging
+from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from constants import INGEST_BATCH_ROWS, INGEST_MAX_ERRORS
+from schema import FS_COLUMNS, EPOCH_COLUMNS, migrate
+from utils import get_db_connection
+import dimensions
+
+# table -> (columns in insert order, numeric columns, timestamp column, required columns);
+# the epoch column (schema.EPOCH_COLUMNS) is derived from the timestamp column
+TABLES = {
+    "system_usage": (
+        ["timestamp", "ts", "customer", "sid", "host", "cpu", "memory"],
+        {"cpu", "memory"}, "timestamp", ("timestamp", "customer", "host"),
+    ),
+    "file_system_usage": (
+        ["timestamp", "ts", "customer", "sid", "host", *FS_COLUMNS],
+        set(FS_COLUMNS), "timestamp", ("timestamp", "customer", "host"),
+    ),
+    "backup_dashboard": (
+        ["CUSTOMER", "SYSTEM_ID", "HOST", "Database_type", "SYS_START_TIME", "start_ts",
+         "ENTRY_TYPE_NAME", "STATE_NAME"],
+        set(), "SYS_START_TIME", ("CUSTOMER", "SYS_START_TIME"),
+    ),
+}
+FORMATS = ("csv", "jsonl")
+
+
+class IngestResult:
+    def __init__(self, table):
+        self.table = table
+        self.inserted = 0
+        self.rejected = 0
+        self.errors = []   # (record number, message), first INGEST_MAX_ERRORS only
+        self.seconds = 0.0
+
+    def reject(self, number, message):
+        self.rejected += 1
+        if len(self.errors) < INGEST_MAX_ERRORS:
+            self.errors.append((number, message))
+
+    def as_dict(self):
+        return {
+            "table": self.table,
+            "inserted": self.inserted,
+            "rejected": self.rejected,
+            "errors": [{"record": n, "error": e} for n, e in self.errors],
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": int(self.inserted / self.seconds) if self.seconds else None,
+        }
+
+
+def _number(value):
+    if value is None or value == "":
+        return None
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"not a finite number: {value!r}")
+    return number
+
+
+@lru_cache(maxsize=4096)  # samples from many hosts share a timestamp
+def _parse(value):
+    # the source text is stored as sent (fractional seconds included); only the
+    # epoch column is derived from it
+    return value, calendar.timegm(datetime.fromisoformat(value).utctimetuple())  # naive = UTC
+
+
+def _timestamp(value):
+    return _parse(value if isinstance(value, str) else str(value))[0]
+
+
+def _epoch(value):
+    return _parse(value if isinstance(value, str) else str(value))[1]
+
+
+def _text(value):
+    # dimension columns are never NULL: rollup/baseline keys are WITHOUT ROWID primary keys
+    return "" if value is None else value if isinstance(value, str) else str(value)
+
+
+def converters(table):
+    # (record key, converter) per insert column
+    columns, numeric, ts_column, _ = TABLES[table]
+    epoch_column = EPOCH_COLUMNS[table][1]
+    fields = []
+    for column in columns:
+        if column == epoch_column:
+            fields.append((ts_column, _epoch))
+        elif column == ts_column:
+            fields.append((column, _timestamp))
+        else:
+            fields.append((column, _number if column in numeric else _text))
+    return fields
+
+
+def validate(record, fields, required):
+    for column in required:
+        if not record.get(column):
+            raise ValueError(f"missing {column}")
+    values = []
+    for column, convert in fields:
+        try:
+            values.append(convert(record.get(column)))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{column}: {e}")
+    return tuple(values)
+
+
+def read_records(stream, fmt):
+    # stream: text file object; yields dicts
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "jsonl":
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield e  # rejected by load(), the rest of the stream still loads
+    else:
+        raise ValueError(f"Unsupported ingest format: {fmt}")
+
+
+def load(table, records, conn=None, batch_rows=INGEST_BATCH_ROWS):
+    # Validation of the next batch overlaps with executemany of the previous one:
+    # sqlite3 releases the GIL while stepping, so a single writer thread keeps
+    # the database busy while this thread parses.
+    if table not in TABLES:
+        raise ValueError(f"Unknown ingest table: {table}")
+    columns, _, _, required = TABLES[table]
+    fields = converters(table)
+    conn = conn or get_db_connection()
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    result = IngestResult(table)
+    started = time.perf_counter()
+
+    def write(rows):
+        with conn:
+            conn.executemany(sql, rows)
+        return len(rows)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest") as writer:
+        pending = None
+        batch = []
+        number = 0
+        try:
+            for number, record in enumerate(records, 1):
+                if isinstance(record, Exception):
+                    result.reject(number, f"unreadable record: {record}")
+                    continue
+                try:
+                    batch.append(validate(record, fields, required))
+                except (AttributeError, TypeError, ValueError) as e:
+                    result.reject(number, str(e))
+                    continue
+                if len(batch) >= batch_rows:
+                    if pending:
+                        result.inserted += pending.result()
+                    pending, batch = writer.submit(write, batch), []
+        except (csv.Error, UnicodeDecodeError) as e:
+            result.reject(number + 1, f"unreadable input: {e}")
+        if pending:
+            result.inserted += pending.result()
+        if batch:
+            result.inserted += writer.submit(write, batch).result()
+    result.seconds = time.perf_counter() - started
+    if result.inserted:
+        dimensions.refresh(conn)  # new customers/SIDs/hosts show up in the dropdowns at once
+    logging.info("Ingest %s: %d inserted, %d rejected in %.2fs",
+                 table, result.inserted, result.rejected, result.seconds)
+    return result
+
+
+def load_stream(table, stream, fmt, conn=None):
+    if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)) or not hasattr(stream, "encoding"):
+        stream = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    return load(table, read_records(stream, fmt), conn)
+
+
+def refresh_derived(conn=None):
+    # bring rollups and anomaly tables up to date with what was just loaded
+    import rollups
+    import forecast
+    import backup_sla
+    import anomalies
+    import baselines
+    rollups.catch_up(conn)
+    forecast.refresh(conn)
+    backup_sla.refresh(conn)
+    anomalies.catch_up(conn)
+    baselines.catch_up(conn)
+
+
+if __name__ == "__main__":
+    import logsetup
+    logsetup.setup()
+    import argparse
+    parser = argparse.ArgumentParser(description="Bulk-load monitoring samples")
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("path", help="input file, or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    parser.add_argument("--no-refresh", action="store_true", help="skip rollup/anomaly refresh")
+    args = parser.parse_args()
+    migrate()
+
+    fmt = args.format or ("jsonl" if args.path.endswith((".jsonl", ".ndjson", ".json")) else "csv")
+    if args.path == "-":
+        import sys
+        result = load_stream(args.table, sys.stdin, fmt)
+    else:
+        with open(args.path, newline="", encoding="utf-8") as f:
+            result = load_stream(args.table, f, fmt)
+    if result.inserted and not args.no_refresh:
+        refresh_derived()
+    print(json.dumps(result.as_dict(), indent=2))
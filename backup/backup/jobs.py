@@ -0,0 +1,166 @@
+# jobs.py
+# Background export jobs run on a local process pool.
+#
+# A job id is the hash of the report (route, SQL parameters, format) and the
+# report's data version (reports.version_states), so identical requests share
+# one artifact until new rows of its source have been refreshed. Everything lives in EXPORT_DIR (next to the database)
+# as files:
+#   <id>.json        manifest (report name, download file name, format)
+#   <id>.<fmt>.part  claimed / in-progress output
+#   <id>.<fmt>       finished artifact
+#   <id>.error       failure message
+# Keeping the state on disk makes it visible to every gunicorn worker, and a
+# job whose worker died is simply restarted once its .part file goes stale.
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from constants import EXPORT_DIR, EXPORT_WORKERS, EXPORT_TTL_SECONDS
+from export import iter_csv, write_xlsx
+from utils import get_db_connection, db_path, data_dir, use_db
+from schema import get_state
+import reports
+import metrics
+
+STALE_PART_SECONDS = 3600
+
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=EXPORT_WORKERS)
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _path(job_id, suffix):
+    return os.path.join(data_dir(EXPORT_DIR), f"{job_id}.{suffix}")
+
+
+def make_job_id(report, fmt, version):
+    key = json.dumps([report.name, report.sql, list(report.params), fmt, list(version)], default=str)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def run_export(database, report, fmt, artifact, error_path):
+    # Executed in a pool process: uses its own connection, never the pool's,
+    # and pins the database so partitions and Parquet files are found next to it.
+    part = artifact + ".part"
+    use_db(database)
+    conn = sqlite3.connect(database)
+    try:
+        rows = reports.rows(conn, report)
+        if fmt == "xlsx":
+            write_xlsx(rows, report.headers, report.sheet, part)
+        else:
+            with open(part, "wb") as fh:
+                for chunk in iter_csv(rows, report.headers, compress=(fmt == "csv.gz")):
+                    fh.write(chunk)
+        os.replace(part, artifact)
+    except Exception as e:
+        with open(error_path, "w") as fh:
+            fh.write(str(e))
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    finally:
+        conn.close()
+
+
+def _record(future, fmt, report, artifact, started):
+    # runs in the submitting process: the pool process keeps no metrics
+    if future.exception() is None and os.path.exists(artifact):
+        metrics.observe("export_build_seconds", time.perf_counter() - started, format=fmt, report=report.sheet)
+        metrics.inc("export_bytes_total", os.path.getsize(artifact), format=fmt, report=report.sheet)
+
+
+def read_manifest(job_id):
+    try:
+        with open(_path(job_id, "json")) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def job_status(job_id):
+    manifest = read_manifest(job_id)
+    if manifest is None:
+        return None
+    artifact = _path(job_id, manifest["format"])
+    status = {"job_id": job_id, "report": manifest["report"]}
+    if os.path.exists(artifact):
+        status["status"] = "done"
+        status["download_url"] = f"/exports/jobs/{job_id}/download"
+    elif os.path.exists(_path(job_id, "error")):
+        status["status"] = "failed"
+        with open(_path(job_id, "error")) as fh:
+            status["error"] = fh.read()
+    elif os.path.exists(artifact + ".part") and \
+            time.time() - os.path.getmtime(artifact + ".part") < STALE_PART_SECONDS:
+        status["status"] = "running"
+    else:
+        status["status"] = "stale"
+    return status
+
+
+def sweep():
+    now = time.time()
+    directory = data_dir(EXPORT_DIR)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > EXPORT_TTL_SECONDS:
+                os.remove(path)
+        except OSError:
+            continue
+
+
+def submit(report_name, values, fmt):
+    report = reports.build(report_name, values)
+    conn = get_db_connection()
+    version = [get_state(conn, name) for name in reports.version_states(report)]
+    job_id = make_job_id(report, fmt, version)
+
+    status = job_status(job_id)
+    if status and status["status"] in ("done", "running"):
+        return status
+
+    os.makedirs(data_dir(EXPORT_DIR), exist_ok=True)
+    sweep()
+    artifact = _path(job_id, fmt)
+    part = artifact + ".part"
+    if os.path.exists(part) and time.time() - os.path.getmtime(part) >= STALE_PART_SECONDS:
+        os.remove(part)  # leftover from a dead worker
+    if os.path.exists(_path(job_id, "error")):
+        os.remove(_path(job_id, "error"))
+    # the manifest goes first, so whoever loses the claim below can read the status
+    manifest = _path(job_id, f"json.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(manifest, "w") as fh:
+        json.dump({"report": report.name, "filename": f"{report.filename}.{fmt}",
+                   "format": fmt, "created": time.time()}, fh)
+    os.replace(manifest, _path(job_id, "json"))
+    try:
+        # O_EXCL claims the job so concurrent clicks don't start it twice
+        os.close(os.open(part, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return job_status(job_id)
+
+    started = time.perf_counter()
+    future = _get_executor().submit(run_export, db_path(), report, fmt, artifact, _path(job_id, "error"))
+    future.add_done_callback(lambda done: _record(done, fmt, report, artifact, started))
+    logging.info("Submitted export job %s for %s", job_id, report.name)
+    return job_status(job_id)
+
+
+def artifact_path(job_id):
+    manifest = read_manifest(job_id)
+    return _path(job_id, manifest["format"]), manifest
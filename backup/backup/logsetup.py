@@ -0,0 +1,139 @@
+# logsetup.py
+# Logging off the request path: records are put on a bounded queue as they
+# are (message arguments unformatted) and a background QueueListener thread
+# formats them as JSON lines and writes them to LOG_FILE. A full queue drops
+# the record instead of blocking the caller.
+#
+# Structured values go in extra={"fields": {...}} -- row counts and timings,
+# never result sets; messages and field values are cut at LOG_MAX_*_CHARS.
+# INFO and DEBUG records logged while serving a route in LOG_SAMPLE_RATES are
+# kept for that fraction of requests (decided once per request); warnings and
+# errors are always kept. setup() is called by app.py and the batch scripts.
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+import logging.handlers
+from flask import g, has_request_context, request
+from constants import (LOG_FILE, LOG_LEVEL, LOG_QUEUE_SIZE, LOG_MAX_MESSAGE_CHARS, LOG_MAX_FIELD_CHARS,
+                       LOG_SAMPLE_RATES)
+import metrics
+
+_lock = threading.Lock()
+_listener = None
+
+
+def _cut(text, limit):
+    return text if len(text) <= limit else f"{text[:limit]}... (+{len(text) - limit} chars)"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": _cut(record.getMessage(), LOG_MAX_MESSAGE_CHARS),
+        }
+        route = getattr(record, "route", None)
+        if route:
+            entry["route"] = route
+        for key, value in (getattr(record, "fields", None) or {}).items():
+            if not isinstance(value, (int, float, bool, type(None))):
+                value = _cut(str(value), LOG_MAX_FIELD_CHARS)
+            entry[key] = value
+        if record.exc_info:
+            entry["exc"] = _cut(self.formatException(record.exc_info), 4 * LOG_MAX_MESSAGE_CHARS)
+        return json.dumps(entry, default=str)
+
+
+class SampleFilter(logging.Filter):
+    # runs in the calling thread, so it only does a dict lookup and one random()
+    def filter(self, record):
+        if not has_request_context():
+            return True
+        route = request.url_rule.rule if request.url_rule else None
+        record.route = route
+        if record.levelno >= logging.WARNING:
+            return True
+        keep = g.get("_log_keep")
+        if keep is None:
+            keep = g._log_keep = random.random() < LOG_SAMPLE_RATES.get(route, 1.0)
+        if not keep:
+            metrics.inc("log_records_dropped_total", reason="sampled")
+        return keep
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    # QueueHandler.prepare() formats in the caller; here the listener does it
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("log_records_dropped_total", reason="queue_full")
+
+
+def _file_handler():
+    try:
+        directory = os.path.dirname(LOG_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # several worker processes append to one file, so rotation is left to logrotate
+        return logging.handlers.WatchedFileHandler(LOG_FILE)
+    except OSError as e:
+        print(f"Cannot open {LOG_FILE} ({e}); logging to stderr", file=sys.stderr)
+        return logging.StreamHandler(sys.stderr)
+
+
+def setup():
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        target = _file_handler()
+        target.setFormatter(JsonFormatter())
+        handler = LazyQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        handler.addFilter(SampleFilter())
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(handler)
+        _listener = logging.handlers.QueueListener(handler.queue, target, respect_handler_level=True)
+        _listener.start()
+        atexit.register(lambda: _listener.stop())  # drains the queue on shutdown
+        os.register_at_fork(after_in_child=_restart)
+
+
+def _restart():
+    # a forked worker (gunicorn --preload, export pool) inherits the queue but not the thread
+    global _listener
+    if _listener is not None:
+        _listener = logging.handlers.QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def init_app(app):
+    # one structured record per request; the sample filter thins it out on hot routes
+    log = logging.getLogger("access")
+
+    @app.before_request
+    def _start():
+        g._log_started = time.perf_counter()
+
+    @app.after_request
+    def _access(response):
+        started = g.pop("_log_started", None)
+        if started is not None and log.isEnabledFor(logging.INFO):
+            log.info("%s %s", request.method, request.path, extra={"fields": {
+                "status": response.status_code,
+                "duration_ms": round(1000 * (time.perf_counter() - started), 2),
+                "bytes": response.calculate_content_length(),
+            }})
+        return response
@@ -0,0 +1,198 @@
+# metrics.py
+# In-process counters and histograms exposed in the Prometheus text format at
+# /metrics: request latency per route, timing and row counts per named SQL
+# query (the constants.SQL keys), export build times and sizes, and pooled
+# connection checkout time. Values are per process; with several gunicorn
+# workers each one answers with its own numbers.
+#
+# The slow-query log is opt-in (SLOW_QUERY_SECONDS): any named query over the
+# threshold is logged with its EXPLAIN QUERY PLAN. Streamed queries
+# (timed_execute) are recorded once their cursor is exhausted.
+import time
+import threading
+import logging
+from flask import g, request
+from constants import SQL, SLOW_QUERY_SECONDS
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FETCH_ROWS = 5000  # rows per fetchmany() of a streamed query, as export.CHUNK_ROWS
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "http_request_duration_seconds": ("histogram", "Time to build the response headers, by route", LATENCY_BUCKETS),
+    "sql_query_duration_seconds": ("histogram", "Execute and fetch time of named SQL queries", LATENCY_BUCKETS),
+    "sql_rows_total": ("counter", "Rows returned by named SQL queries", None),
+    "sql_errors_total": ("counter", "Named SQL queries that raised", None),
+    "export_build_seconds": ("histogram", "Time to build an export file or stream", LATENCY_BUCKETS),
+    "export_bytes_total": ("counter", "Bytes of export files and streams", None),
+    "export_rows_total": ("counter", "Rows written to xlsx exports", None),
+    "db_connection_wait_seconds": ("histogram", "Time to check out a pooled connection", WAIT_BUCKETS),
+    "log_records_dropped_total": ("counter", "Log records sampled out or dropped on a full queue", None),
+    "app_startup_seconds": ("gauge", "Seconds from importing app.py to a ready app, warm-up excluded", None),
+    "app_warm_up_seconds": ("gauge", "Seconds spent in the optional warm-up", None),
+}
+
+_names = {sql: key for key, sql in SQL.items()}  # SQL text -> constants.SQL key
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_counters = {}    # (name, labels) -> value
+_gauges = {}      # (name, labels) -> value
+
+
+def observe(name, seconds, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    buckets = METRICS[name][2]
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if seconds <= bound:
+                entry[i] += 1
+        entry[-2] += seconds
+        entry[-1] += 1
+
+
+def inc(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+def query_name(sql):
+    return _names.get(sql, "adhoc")
+
+
+def _explain(conn, sql, params):
+    try:
+        return "; ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+    except Exception as e:
+        return f"unavailable ({e})"
+
+
+def record_query(conn, name, sql, params, seconds, rows):
+    observe("sql_query_duration_seconds", seconds, query=name)
+    inc("sql_rows_total", rows, query=name)
+    if SLOW_QUERY_SECONDS is not None and seconds >= SLOW_QUERY_SECONDS:
+        logging.warning("Slow query %s: %.3fs, %d rows; plan: %s", name, seconds, rows, _explain(conn, sql, params))
+
+
+def fetchall(conn, sql, params=(), name=None):
+    # conn.execute(sql, params).fetchall(), timed under `name` (default: its SQL key)
+    name = name or query_name(sql)
+    started = time.perf_counter()
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    except Exception:
+        inc("sql_errors_total", query=name)
+        raise
+    record_query(conn, name, sql, params, time.perf_counter() - started, len(rows))
+    return rows
+
+
+def timed_execute(name, conn, sql, params=()):
+    # conn.execute(sql, params) as a row iterator: the statement runs now, so
+    # its errors reach the caller before anything is streamed, and the time
+    # spent in execute and fetchmany (not in the consumer) is recorded under
+    # `name` when the last row has been read
+    started = time.perf_counter()
+    try:
+        cursor = conn.execute(sql, params)
+    except Exception:
+        inc("sql_errors_total", query=name)
+        raise
+    return _timed_rows(name, conn, sql, params, cursor, time.perf_counter() - started)
+
+
+def _timed_rows(name, conn, sql, params, cursor, seconds):
+    count = 0
+    while True:
+        started = time.perf_counter()
+        try:
+            rows = cursor.fetchmany(FETCH_ROWS)
+        except Exception:
+            inc("sql_errors_total", query=name)
+            raise
+        seconds += time.perf_counter() - started
+        if not rows:
+            break
+        count += len(rows)
+        yield from rows
+    record_query(conn, name, sql, params, seconds, count)
+
+
+def counted(chunks, fmt, report):
+    # pass a streamed export through, recording its bytes and build time at the end
+    started = time.perf_counter()
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        yield chunk
+    observe("export_build_seconds", time.perf_counter() - started, format=fmt, report=report)
+    inc("export_bytes_total", size, format=fmt, report=report)
+
+
+def init_app(app):
+    # time every request up to its response headers; streamed bodies are
+    # covered by the export metrics instead
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            observe("http_request_duration_seconds", time.perf_counter() - started,
+                    route=route, method=request.method, status=str(response.status_code))
+        return response
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render():
+    # Prometheus text exposition format 0.0.4
+    from db import pool
+    with _lock:
+        histograms = {key: list(value) for key, value in _histograms.items()}
+        counters = dict(_counters)
+        counters.update(_gauges)
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "histogram":
+            for (metric, labels), entry in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(buckets, entry):
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {entry[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {entry[-2]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {entry[-1]}")
+        else:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+    stats = pool.stats()
+    for key in ("opened", "closed", "checkouts", "reused"):
+        lines.append(f"# TYPE db_pool_{key}_total counter")
+        lines.append(f"db_pool_{key}_total {stats[key]}")
+    lines.append("# TYPE db_pool_open_seconds_total counter")
+    lines.append(f"db_pool_open_seconds_total {stats['wait_seconds']}")
+    lines.append("# TYPE db_pool_open_connections gauge")
+    lines.append(f"db_pool_open_connections {stats['open']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,70 @@
+# pagination.py
+# Keyset (seek) pagination ordered by (timestamp, rowid) DESC with opaque page
+# tokens, so page N costs the same index seek as page 1. Totals for the pager
+# are counted once and cached for TOTALS_TTL_SECONDS.
+import json
+import math
+import base64
+from cache import TTLCache
+from utils import db_path
+import metrics
+
+TOTALS_TTL_SECONDS = 60
+
+_totals = TTLCache(TOTALS_TTL_SECONDS, maxsize=256)
+
+
+def encode_token(direction, key):
+    raw = json.dumps([direction, *key], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_token(token):
+    # Returns (direction, (timestamp, rowid)); raises ValueError on tampered tokens.
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        direction, ts, rowid = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid page token")
+    if direction not in ("next", "prev") or not isinstance(rowid, int):
+        raise ValueError("Invalid page token")
+    return direction, (ts, rowid)
+
+
+def cached_total(conn, count_sql, params=(), name=None):
+    key = (db_path(), count_sql, tuple(params))
+    return _totals.get_or_set(key, lambda: metrics.fetchall(conn, count_sql, params, name)[0][0])
+
+
+def fetch_page(conn, select_sql, where, params, ts_column, rowid_column, page_size, token=None, name=None):
+    # select_sql is "SELECT <columns> FROM <table>"; where may be empty.
+    # The key columns are appended to every row and stripped before returning.
+    # `name` labels the query in /metrics; defaults to the SQL key of select_sql.
+    direction, key = decode_token(token) if token else ("next", None)
+    conditions = [where] if where else []
+    params = list(params)
+    if key is not None:
+        op = "<" if direction == "next" else ">"
+        conditions.append(f"({ts_column}, {rowid_column}) {op} (?, ?)")
+        params.extend(key)
+    order = "DESC" if direction == "next" else "ASC"
+    sql = select_sql.replace("SELECT", f"SELECT {ts_column}, {rowid_column},", 1)
+    if conditions:
+        sql += " WHERE " + " AND ".join(f"({c})" for c in conditions)
+    sql += f" ORDER BY {ts_column} {order}, {rowid_column} {order} LIMIT ?"
+    rows = metrics.fetchall(conn, sql, params + [page_size + 1], name or metrics.query_name(select_sql))
+
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == "prev":
+        rows.reverse()
+
+    has_older = more if direction == "next" else True
+    has_newer = key is not None if direction == "next" else more
+    next_token = encode_token("next", rows[-1][:2]) if rows and has_older else None
+    prev_token = encode_token("prev", rows[0][:2]) if rows and has_newer else None
+    return [row[2:] for row in rows], next_token, prev_token
+
+
+def total_pages(total, page_size):
+    return max(1, math.ceil(total / page_size))
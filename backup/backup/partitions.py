@@ -0,0 +1,250 @@
+# partitions.py
+# Monthly partitions for the raw tables (schema.EPOCH_COLUMNS).
+#
+# read.db keeps the hot window: the current month and the PARTITION_HOT_MONTHS-1
+# before it. Older months are moved, all three tables together, into
+# PARTITION_DIR/YYYY-MM.db (next to the database). Queries over a time range go through route(), which
+# rewrites "FROM <raw table>" into a UNION ALL of main and only the archived
+# months the range overlaps; attach() then ATTACHes those files (as p_YYYY_MM)
+# on the connection that will run the SQL. SQLite pushes the range predicate
+# into every arm, so each partition is an index seek.
+#
+# Retention: partitions older than RETENTION_RAW_MONTHS are deleted, with their
+# Parquet files (archive.py). Their daily/monthly rollups stay in read.db as
+# the compacted history; hourly rollups and anomaly rows of those months are
+# pruned with them, and so are the dropdown dimensions of customers, SIDs and
+# hosts that have no samples left.
+#
+# The ingest route calls maybe_maintain(), which starts maintain() on a
+# background thread once PARTITION_MAINTAIN_INTERVAL_SECONDS have passed since
+# the last run recorded in etl_state, so neither a request nor a restart pays
+# for it.
+#
+#   python partitions.py        # archive + retention, e.g. from cron
+import os
+import re
+import time
+import logging
+import threading
+from datetime import date, datetime, timezone
+from constants import (PARTITION_DIR, PARTITION_HOT_MONTHS, RETENTION_RAW_MONTHS,
+                       PARTITION_MAINTAIN_INTERVAL_SECONDS)
+from schema import EPOCH_COLUMNS, get_state, set_state
+from utils import get_db_connection, in_background, data_dir, epoch, month_range, epoch_range
+import dimensions
+
+MAX_ATTACHED = 8  # SQLite allows 10 attached databases per connection
+FILE_RE = re.compile(r"^(\d{4}-\d{2})\.db$")
+SCHEMA_RE = re.compile(r"\bp_(\d{4})_(\d{2})\.")
+TABLE_RES = {table: re.compile(rf"\bFROM\s+{table}\b") for table in EPOCH_COLUMNS}
+
+MAINTAINED_STATE = "partitions:maintained"  # epoch seconds of the last maintain()
+
+_lock = threading.Lock()
+
+
+def schema_name(month):
+    return "p_" + month.replace("-", "_")
+
+
+def partition_dir():
+    return data_dir(PARTITION_DIR)
+
+
+def partition_path(month):
+    return os.path.join(partition_dir(), f"{month}.db")
+
+
+def archived_months():
+    try:
+        names = os.listdir(partition_dir())
+    except FileNotFoundError:
+        return []
+    return sorted(m.group(1) for m in map(FILE_RE.match, names) if m)
+
+
+def months_in(start_ts, end_ts):
+    # archived months overlapping [start_ts, end_ts)
+    first = month_of(start_ts)
+    last = month_of(end_ts - 1)
+    return [m for m in archived_months() if first <= m <= last]
+
+
+def month_of(ts):
+    return datetime.fromtimestamp(max(ts, 0), timezone.utc).strftime("%Y-%m")
+
+
+def route(sql, start_ts, end_ts):
+    months = months_in(start_ts, end_ts)
+    if not months:
+        return sql
+    if len(months) > MAX_ATTACHED:
+        raise ValueError(f"Range spans {len(months)} archived months; at most {MAX_ATTACHED} "
+                         f"can be read at once -- narrow the range or use the monthly report")
+    for table, pattern in TABLE_RES.items():
+        arms = [f"SELECT rowid AS rowid, * FROM main.{table}"] + [
+            f"SELECT rowid AS rowid, * FROM {schema_name(m)}.{table}" for m in months
+        ]
+        sql = pattern.sub(f"FROM ({' UNION ALL '.join(arms)}) AS {table}", sql)
+    return sql
+
+
+def attach(conn, sql):
+    # ATTACH every partition the (routed) SQL refers to; returns the SQL
+    needed = {f"{y}-{m}" for y, m in SCHEMA_RE.findall(sql)}
+    if needed:
+        _ensure_attached(conn, needed)
+    return sql
+
+
+def routed(conn, sql, start_ts, end_ts):
+    return attach(conn, route(sql, start_ts, end_ts))
+
+
+def prepare(conn, start_ts, end_ts):
+    # ATTACH up front for callers that route SQL inside a transaction
+    # (ATTACH is not allowed once one is open)
+    _ensure_attached(conn, months_in(start_ts, end_ts))
+
+
+def attach_months(conn, months):
+    _ensure_attached(conn, months)
+
+
+def _ensure_attached(conn, months, create=False):
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    wanted = {schema_name(m): m for m in months}
+    missing = [name for name in wanted if name not in attached]
+    if not missing:
+        return
+    surplus = sorted(name for name in attached if name.startswith("p_") and name not in wanted)
+    while surplus and len(attached) - 2 + len(missing) > MAX_ATTACHED:  # main, temp
+        name = surplus.pop()
+        conn.execute(f"DETACH DATABASE {name}")
+        attached.discard(name)
+    for name in missing:
+        path = partition_path(wanted[name])
+        if not create and not os.path.exists(path):
+            raise ValueError(f"Partition {wanted[name]} is no longer available")
+        conn.execute("ATTACH DATABASE ? AS " + name, (path,))
+
+
+def _create_partition(conn, month):
+    os.makedirs(partition_dir(), exist_ok=True)
+    _ensure_attached(conn, [month], create=True)
+    name = schema_name(month)
+    conn.execute(f"PRAGMA {name}.journal_mode=WAL")
+    for table in EPOCH_COLUMNS:
+        for kind, sql in conn.execute(
+                "SELECT type, sql FROM main.sqlite_master WHERE tbl_name=? AND type IN ('table', 'index') "
+                "AND sql IS NOT NULL ORDER BY type DESC", (table,)):
+            if kind == "table":
+                sql = re.sub(r"^CREATE TABLE\s+\"?\w+\"?", f"CREATE TABLE IF NOT EXISTS {name}.{table}", sql)
+            else:
+                sql = re.sub(r"^CREATE INDEX\s+(\w+)", rf"CREATE INDEX IF NOT EXISTS {name}.\1", sql)
+            conn.execute(sql)
+
+
+def archive_month(conn, month):
+    # Copy then delete; INSERT OR IGNORE keeps a re-run after a crash idempotent.
+    start_ts, end_ts = epoch_range(month_range(month))
+    _create_partition(conn, month)
+    name = schema_name(month)
+    moved = 0
+    for table, (_, epoch_column) in EPOCH_COLUMNS.items():
+        with conn:
+            conn.execute(f"""INSERT OR IGNORE INTO {name}.{table} SELECT * FROM main.{table}
+                             WHERE {epoch_column} >= ? AND {epoch_column} < ?""", (start_ts, end_ts))
+            moved += conn.execute(f"DELETE FROM main.{table} WHERE {epoch_column} >= ? AND {epoch_column} < ?",
+                                  (start_ts, end_ts)).rowcount
+    logging.info("Archived %d rows of %s to %s", moved, month, partition_path(month))
+    if moved:
+        import archive  # (re)write the month's Parquet now that it is closed
+        for table in archive.ARCHIVE_TABLES:
+            archive.export_month(conn, table, month)
+    return moved
+
+
+def _months_back(today, months):
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def drop_expired(conn, today=None):
+    import archive
+    cutoff = _months_back(today or date.today(), RETENTION_RAW_MONTHS).isoformat()
+    expired = [m for m in archived_months() if m < cutoff[:7]]
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    for month in expired:
+        if schema_name(month) in attached:
+            conn.execute(f"DETACH DATABASE {schema_name(month)}")
+        os.remove(partition_path(month))
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(partition_path(month) + suffix):
+                os.remove(partition_path(month) + suffix)
+        logging.info("Dropped expired partition %s", month)
+    expired = sorted(archive.drop_before(cutoff[:7]).union(expired))
+    with conn:
+        for table in ("system_usage_hourly", "file_system_usage_hourly"):
+            conn.execute(f"DELETE FROM {table} WHERE bucket < ?", (cutoff,))
+        conn.execute("DELETE FROM anomalies WHERE timestamp < ?", (cutoff,))
+        conn.execute("DELETE FROM baseline_anomalies WHERE timestamp < ?", (cutoff,))
+    if expired:
+        dimensions.prune(conn, epoch(cutoff))
+    return expired
+
+
+def maintain(conn=None, today=None):
+    # derived tables read new rows from main, so bring them up to date before moving anything
+    import rollups
+    import forecast
+    import backup_sla
+    import anomalies
+    import baselines
+    conn = conn or get_db_connection()
+    with _lock:
+        rollups.catch_up(conn)
+        forecast.refresh(conn)
+        backup_sla.refresh(conn)
+        anomalies.catch_up(conn)
+        baselines.catch_up(conn)
+        hot_start = epoch(_months_back(today or date.today(), PARTITION_HOT_MONTHS - 1).isoformat())
+        months = set()
+        for table, (_, epoch_column) in EPOCH_COLUMNS.items():
+            months.update(row[0] for row in conn.execute(
+                f"SELECT DISTINCT strftime('%Y-%m', {epoch_column}, 'unixepoch') FROM main.{table} "
+                f"WHERE {epoch_column} < ?", (hot_start,)))
+        archived = {month: archive_month(conn, month) for month in sorted(months)}
+        dropped = drop_expired(conn, today)
+        with conn:
+            if any(archived.values()) or dropped:  # rows left read.db: lets httpcache see the change
+                set_state(conn, "partitions", int(time.time()))
+            set_state(conn, MAINTAINED_STATE, int(time.time()))
+    return archived, dropped
+
+
+def maybe_maintain():
+    # returns the started thread, or None when maintenance is not due or running
+    last, _ = get_state(get_db_connection(), MAINTAINED_STATE)
+    if time.time() - last < PARTITION_MAINTAIN_INTERVAL_SECONDS:
+        return None
+    return in_background("partition-maintenance", _maintain_in_background)
+
+
+def _maintain_in_background():
+    try:
+        maintain()
+    except Exception:
+        logging.exception("Partition maintenance failed; will retry next interval")
+        conn = get_db_connection()
+        with conn:
+            set_state(conn, MAINTAINED_STATE, int(time.time()))
+
+
+if __name__ == "__main__":
+    import logsetup
+    logsetup.setup()
+    from schema import migrate
+    migrate()
+    archived, dropped = maintain()
+    print(f"Archived {archived or 'nothing'}; dropped {dropped or 'nothing'}")
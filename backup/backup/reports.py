@@ -0,0 +1,245 @@
+# reports.py
+# Report definitions shared by the /download_* routes and the background
+# export jobs. Each builder turns the request values into a Report holding the
+# SQL, headers and file name, plus the raw table it reads (its "source").
+#
+# A report is versioned by the etl_state rows of its source: the rowid
+# watermark of the derived table refreshed from it and the partition layout.
+# That is two primary key lookups whatever the range, the same in every worker,
+# and it lags new rows only until the background refresh commits.
+import logging
+from collections import namedtuple
+from constants import SQL
+from utils import day_range, date_span, month_range, epoch_range
+import partitions
+import archive
+import rollups
+import backup_sla
+import metrics
+from archive import Scan
+
+# span: (start_ts, end_ts) of raw-table reads, routed to the monthly partitions
+# scan: archive.Scan, lets closed months be read from the Parquet archive
+Report = namedtuple("Report", [
+    "name", "sql", "params", "headers", "sheet", "filename",
+    "source", "uses_rollups", "span", "scan",
+], defaults=(None, None))
+
+USAGE_HEADERS = ["Customer", "SID", "Date", "Host", "CPU (%)", "Memory (%)"]
+USAGE_COLUMNS = ["customer", "sid", "timestamp", "host", "cpu", "memory"]
+# source -> (etl_state watermark that follows it, refresh that advances it)
+WATERMARKS = {
+    "system_usage": ("rollup:system_usage", rollups.maybe_refresh),
+    "file_system_usage": ("rollup:file_system_usage", rollups.maybe_refresh),
+    "backup_dashboard": (backup_sla.STATE_NAME, backup_sla.maybe_refresh),
+}
+
+BACKUP_HEADERS = ["Customer", "SID", "Host", "Database_type", "Date", "Entry Type", "Status"]
+
+FS_DB_COLUMNS = [
+    "hana_data_used", "hana_data_available", "hana_data_used_percent",
+    "hana_backup_used", "hana_backup_available", "hana_backup_used_percent",
+    "hana_log_used", "hana_log_available", "hana_log_used_percent",
+]
+FS_APP_COLUMNS = [
+    "usr_sap_used", "usr_sap_available", "usr_sap_used_percent",
+    "sapmnt_used", "sapmnt_available", "sapmnt_used_percent",
+    "usr_sap_trans_used", "usr_sap_trans_available", "usr_sap_trans_used_percent",
+]
+FS_DB_HEADERS = [
+    "Customer", "SID", "Timestamp", "Host",
+    "/hana/data (used GB)", "/hana/data (available GB)", "/hana/data (used %)",
+    "/hana/backup (used GB)", "/hana/backup (available GB)", "/hana/backup (used %)",
+    "/hana/log (used GB)", "/hana/log (available GB)", "/hana/log (used %)"
+]
+FS_APP_HEADERS = [
+    "Customer", "SID", "Timestamp", "Host",
+    "/usr/sap (used GB)", "/usr/sap (avilable GB)", "/usr/sap (used %)",
+    "/sapmnt (used GB)", "/sapmnt (available GB)", "/sapmnt (used %)",
+    "/usr/sap/trans (used GB)", "/usr/sap/trans (available GB)", "/usr/sap/trans (used %)"
+]
+
+REPORTS = {}
+
+
+def report(name):
+    def register(builder):
+        REPORTS[name] = builder
+        return builder
+    return register
+
+
+def build(name, values):
+    report_ = REPORTS[name](values)
+    logging.info("Built report %s with params %s", name, report_.params)
+    return report_
+
+
+def rows(conn, report):
+    # Row iterator for a built report: Parquet column scans for archived months
+    # when possible, otherwise the SQL routed over the monthly partitions.
+    columnar = archive.report_rows(conn, report)
+    if columnar is not None:
+        return columnar
+    sql = partitions.routed(conn, report.sql, *report.span) if report.span else report.sql
+    return metrics.timed_execute(report.name, conn, sql, report.params)
+
+
+def version_states(report):
+    # etl_state names the report is versioned by; starts the refresh that
+    # advances its watermark (throttled, and in the background for rollups)
+    state, maybe_refresh = WATERMARKS[report.source]
+    maybe_refresh()
+    return [state, "partitions"]
+
+
+def _host_filter(is_db_host):
+    return "LOWER(host) LIKE '%db%'" if is_db_host else "LOWER(host) NOT LIKE '%db%'"
+
+
+def _fs_scan(is_db_host, customer, sid=None):
+    equals = (("customer", customer),) + ((("sid", sid),) if sid is not None else ())
+    columns = ["customer", "sid", "timestamp", "host", *(FS_DB_COLUMNS if is_db_host else FS_APP_COLUMNS)]
+    return Scan("file_system_usage", columns, equals, is_db_host)
+
+
+def _fs_raw_sql(is_db_host, with_sid):
+    columns = ",\n                   ".join(FS_DB_COLUMNS if is_db_host else FS_APP_COLUMNS)
+    sid_filter = "AND  sid = ?" if with_sid else ""
+    return f"""
+            SELECT customer,
+                   sid,
+                   timestamp,
+                   host,
+                   {columns}
+            FROM   file_system_usage
+            WHERE  customer = ?
+              {sid_filter}
+              AND  ts >= ? AND ts < ?
+              AND  {_host_filter(is_db_host)}
+            ORDER BY ts ASC
+        """
+
+
+@report("download_dashboard")
+def _download_dashboard(values):
+    customer = values["customer"]
+    start, end = epoch_range(day_range(values["date"]))
+    return Report("download_dashboard", SQL["download_daily"], (customer, start, end),
+                  USAGE_HEADERS, "Daily Report", f"{customer}_Daily_Report",
+                  "system_usage", False,
+                  span=(start, end), scan=Scan("system_usage", USAGE_COLUMNS, (("customer", customer),)))
+
+
+@report("download_monthly")
+def _download_monthly(values):
+    customer = values["customer"]
+    start, end = month_range(values["date"][:7])
+    span = epoch_range((start, end))
+    headers = ["Customer", "SID", "Date", "Host", "Avg CPU (%)", "Avg Memory (%)"]
+    return Report("download_monthly", SQL["download_monthly"], (customer, start, end),
+                  headers, "Monthly Report", f"{customer}_Monthly_Report",
+                  "system_usage", True, span=span)
+
+
+@report("download_custom")
+def _download_custom(values):
+    customer = values["customer"]
+    start, end = epoch_range(date_span(values["start_date"], values["end_date"]))
+    return Report("download_custom", SQL["download_custom"], (customer, start, end),
+                  USAGE_HEADERS, "Custom Report", f"{customer}_Custom_Report",
+                  "system_usage", False,
+                  span=(start, end), scan=Scan("system_usage", USAGE_COLUMNS, (("customer", customer),)))
+
+
+@report("download_backup")
+def _download_backup(values):
+    customer = values["customer"]
+    sid = values.get("sid")  # Optional
+    date = values.get("date")  # Optional single-day
+    start_date = values.get("start_date")
+    end_date = values.get("end_date")
+
+    conditions = ["CUSTOMER = ?"]
+    params = [customer]
+    if sid:
+        conditions.append("SYSTEM_ID = ?")
+        params.append(sid)
+
+    # Apply date filter regardless of SID; without one only the hot months are listed
+    span = None
+    if date:
+        span = epoch_range(day_range(date))
+    elif start_date and end_date:
+        span = epoch_range(date_span(start_date, end_date))
+    if span:
+        conditions.append("start_ts >= ? AND start_ts < ?")
+        params.extend(span)
+
+    sql = f"""
+        SELECT CUSTOMER, SYSTEM_ID, HOST, Database_type,
+               strftime('%Y-%m-%d %H:%M:%S', start_ts, 'unixepoch') AS SYS_START_TIME,
+               ENTRY_TYPE_NAME, STATE_NAME
+        FROM backup_dashboard
+        WHERE {" AND ".join(conditions)}
+        ORDER BY start_ts DESC
+    """
+    return Report("download_backup", sql, tuple(params), BACKUP_HEADERS, "Backup Status",
+                  f"{customer}_Backup_Status_Report",
+                  "backup_dashboard", False, span=span)
+
+
+@report("download_filesystem")
+def _download_filesystem(values):
+    customer = values["customer"]
+    start, end = epoch_range(day_range(values["date"]))
+    is_db_host = "db" in values.get("host", "").strip().lower()
+    return Report("download_filesystem", _fs_raw_sql(is_db_host, with_sid=False), (customer, start, end),
+                  FS_DB_HEADERS if is_db_host else FS_APP_HEADERS, "Daily Report",
+                  f"{customer}_File_System_Daily_Report",
+                  "file_system_usage", False,
+                  span=(start, end), scan=_fs_scan(is_db_host, customer))
+
+
+@report("download_monthly_filesystem")
+def _download_monthly_filesystem(values):
+    customer = values["customer"]
+    sid = values["sid"].strip().upper()
+    year_month = values["date"][:7]               # YYYY-MM
+    is_db_host = "db" in values.get("host", "").lower()    # "db" | "app" | real host
+    start, end = month_range(year_month)
+    span = epoch_range((start, end))
+
+    columns = FS_DB_COLUMNS if is_db_host else FS_APP_COLUMNS
+    averages = ",\n                   ".join(f"ROUND({c}_avg, 2)" for c in columns)
+    sql = f"""
+            SELECT customer,
+                   sid,
+                   bucket,
+                   host,
+                   {averages}
+            FROM   file_system_usage_monthly
+            WHERE  customer = ?
+              AND  sid      = ?
+              AND  bucket   = ?
+              AND  {_host_filter(is_db_host)}
+            ORDER  BY host
+            """
+    headers = [h.replace("(used", "(Avg used").replace("(avail", "(Avg avail")
+               for h in (FS_DB_HEADERS if is_db_host else FS_APP_HEADERS)]
+    return Report("download_monthly_filesystem", sql, (customer, sid, start), headers, "Monthly Report",
+                  f"{customer}_{sid}_{year_month}_filesystem_monthly",
+                  "file_system_usage", True, span=span)
+
+
+@report("download_custom_filesystem")
+def _download_custom_filesystem(values):
+    customer = values["customer"]
+    sid = values["sid"]
+    is_db_host = "db" in values["host"].strip().lower()
+    start, end = epoch_range(date_span(values["start_date"], values["end_date"]))
+    return Report("download_custom_filesystem", _fs_raw_sql(is_db_host, with_sid=True),
+                  (customer, sid, start, end),
+                  FS_DB_HEADERS if is_db_host else FS_APP_HEADERS, "Custom Report",
+                  f"{customer}_custom_File_System_Report",
+                  "file_system_usage", False, span=(start, end), scan=_fs_scan(is_db_host, customer, sid))
@@ -0,0 +1,226 @@
+# rollups.py
+# Incremental hourly/daily/monthly min/avg/max/p95 rollups of system_usage and
+# file_system_usage, kept in the {source}_{grain} tables created by schema.py.
+#
+# New rows are found through a rowid watermark in etl_state and handled
+# BATCH_ROWS at a time. Hourly and daily buckets are recomputed from raw rows
+# for every host/day touched by new samples, one day's rows at a time; monthly
+# buckets are derived from the hourly rollup (their p95 is the 95th percentile
+# of the hourly p95 values).
+#
+# Requests never refresh inline: maybe_refresh() starts a background catch-up
+# and the request reads the rollups as they are.
+import math
+import time
+import threading
+import logging
+from datetime import date, timedelta
+from itertools import groupby
+from schema import ROLLUP_METRICS, get_state, set_state
+from utils import get_db_connection, db_path, fetch_query, in_background
+import partitions
+
+REFRESH_INTERVAL_SECONDS = 5
+BATCH_ROWS = 200_000  # new raw rows handled per refresh() call
+# widest range (in days) served by each grain; None means raw samples
+GRAIN_LIMITS = [(None, 2), ("hourly", 62), ("daily", 731)]
+STATS = ("min", "avg", "max", "p95")
+HOUR = 3600
+DAY = 86400
+
+_lock = threading.Lock()
+_last_refresh = {}  # db path -> monotonic time
+
+
+def _numeric(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _p95(values):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+def _summarise(rows, width):
+    # rows are (ts, metric1, metric2, ...) tuples
+    summary = [len(rows)]
+    for i in range(1, width + 1):
+        values = [v for v in (_numeric(row[i]) for row in rows) if v is not None]
+        if values:
+            summary += [min(values), sum(values) / len(values), max(values), _p95(values)]
+        else:
+            summary += [None] * len(STATS)
+    return summary
+
+
+def _merge(rows, width):
+    # rows are (samples, m1_min, m1_avg, m1_max, m1_p95, m2_min, ...) rollup rows
+    total = sum(row[0] for row in rows)
+    summary = [total]
+    for i in range(width):
+        base = 1 + i * len(STATS)
+        parts = [row for row in rows if row[base + 1] is not None]
+        if not parts:
+            summary += [None] * len(STATS)
+            continue
+        weight = sum(row[0] for row in parts)
+        summary += [
+            min(row[base] for row in parts),
+            sum(row[base + 1] * row[0] for row in parts) / weight,
+            max(row[base + 2] for row in parts),
+            _p95([row[base + 3] for row in parts]),
+        ]
+    return summary
+
+
+def _upsert_sql(source, grain):
+    metrics = ROLLUP_METRICS[source]
+    columns = ["customer", "sid", "host", "bucket", "samples"] + [
+        f"{m}_{stat}" for m in metrics for stat in STATS
+    ]
+    return (f"INSERT OR REPLACE INTO {source}_{grain} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})")
+
+
+def _bucket(ts, fmt):
+    return time.strftime(fmt, time.gmtime(ts))
+
+
+def _rebuild_day(conn, source, key, day):
+    # buckets are UTC days/hours of the INTEGER ts column
+    metrics = ROLLUP_METRICS[source]
+    width = len(metrics)
+    start_ts = day * DAY
+    # late samples may land in an archived month: read the whole day back
+    rows = conn.execute(partitions.route(
+        f"""SELECT ts, {', '.join(metrics)} FROM {source}
+            WHERE customer=? AND sid=? AND host=? AND ts >= ? AND ts < ?
+            ORDER BY ts""", start_ts, start_ts + DAY),
+        (*key, start_ts, start_ts + DAY),
+    ).fetchall()
+    if not rows:
+        return
+    hourly = [(*key, _bucket(hour * HOUR, "%Y-%m-%d %H:00:00"), *_summarise(list(hour_rows), width))
+              for hour, hour_rows in groupby(rows, key=lambda row: row[0] // HOUR)]
+    conn.executemany(_upsert_sql(source, "hourly"), hourly)
+    conn.execute(_upsert_sql(source, "daily"), (*key, _bucket(start_ts, "%Y-%m-%d"), *_summarise(rows, width)))
+
+
+def _rebuild_month(conn, source, key, month):
+    width = len(ROLLUP_METRICS[source])
+    stat_columns = ", ".join(f"{m}_{stat}" for m in ROLLUP_METRICS[source] for stat in STATS)
+    next_month = (month + timedelta(days=32)).replace(day=1)
+    parts = conn.execute(
+        f"""SELECT samples, {stat_columns} FROM {source}_hourly
+            WHERE customer=? AND sid=? AND host=? AND bucket >= ? AND bucket < ?""",
+        (*key, month.isoformat(), next_month.isoformat()),
+    ).fetchall()
+    if parts:
+        conn.execute(_upsert_sql(source, "monthly"), (*key, month.isoformat(), *_merge(parts, width)))
+
+
+def refresh_source(conn, source, batch_rows=BATCH_ROWS):
+    # one batch of new rows; returns how many rowids it consumed (0: caught up)
+    name = f"rollup:{source}"
+    watermark, _ = get_state(conn, name)
+    high = conn.execute(f"SELECT MAX(rowid) FROM main.{source}").fetchone()[0] or 0
+    high = min(high, watermark + batch_rows)
+    if high <= watermark:
+        return 0
+
+    touched = conn.execute(
+        f"""SELECT DISTINCT customer, sid, host, ts / {DAY}
+            FROM main.{source} WHERE rowid > ? AND rowid <= ? AND ts IS NOT NULL
+            ORDER BY 1, 2, 3, 4""",
+        (watermark, high),
+    ).fetchall()
+    if touched:
+        partitions.prepare(conn, min(row[3] for row in touched) * DAY, (max(row[3] for row in touched) + 1) * DAY)
+    with conn:
+        months = set()
+        for customer, sid, host, day in touched:
+            _rebuild_day(conn, source, (customer, sid, host), day)
+            months.add(((customer, sid, host), date.fromisoformat(_bucket(day * DAY, "%Y-%m-01"))))
+        for key, month in sorted(months):
+            _rebuild_month(conn, source, key, month)
+        set_state(conn, name, high)
+    logging.info("Rolled up %s rows %d..%d: %d host-days", source, watermark + 1, high, len(touched))
+    return high - watermark
+
+
+def refresh(conn=None):
+    # one batch per source; {source: rowids consumed}, all 0 once caught up
+    conn = conn or get_db_connection()
+    with _lock:
+        done = {source: refresh_source(conn, source) for source in ROLLUP_METRICS}
+        _last_refresh[db_path()] = time.monotonic()
+    return done
+
+
+def catch_up(conn=None):
+    while any(refresh(conn).values()):
+        pass
+
+
+def maybe_refresh():
+    # called on the request path: never waits for a refresh
+    path = db_path()
+    if time.monotonic() - _last_refresh.get(path, 0.0) >= REFRESH_INTERVAL_SECONDS:
+        _last_refresh[path] = time.monotonic()
+        in_background("rollup-refresh", catch_up)
+
+
+def choose_grain(start, end):
+    days = (date.fromisoformat(end[:10]) - date.fromisoformat(start[:10])).days
+    for grain, limit in GRAIN_LIMITS:
+        if days <= limit:
+            return grain
+    return "monthly"
+
+
+def series(source, metrics, customer, sid, host, start, end, stat="avg"):
+    # Returns (bucket, metric...) rows from the coarsest rollup that fits the
+    # [start, end) range, or None when the range is short enough for raw rows.
+    grain = choose_grain(start, end)
+    if grain is None:
+        return None
+    if grain == "monthly":
+        start = start[:7] + "-01"
+    maybe_refresh()
+    columns = ", ".join(f"{m}_{stat}" for m in metrics)
+    return fetch_query(
+        f"""SELECT bucket, {columns} FROM {source}_{grain}
+            WHERE customer=? AND sid=? AND host=? AND bucket >= ? AND bucket < ?
+            ORDER BY bucket""",
+        (customer, sid, host, start, end),
+        f"{source}_{grain}",
+    )
+
+
+def series_by_host(source, metrics, customer, sid, hosts, start, end, stat="avg"):
+    # series() for several hosts in one statement: (host, bucket, metric...)
+    # rows ordered by host, or None when the range is short enough for raw rows
+    grain = choose_grain(start, end)
+    if grain is None:
+        return None
+    if grain == "monthly":
+        start = start[:7] + "-01"
+    maybe_refresh()
+    columns = ", ".join(f"{m}_{stat}" for m in metrics)
+    return fetch_query(
+        f"""SELECT host, bucket, {columns} FROM {source}_{grain}
+            WHERE customer=? AND sid=? AND host IN ({', '.join('?' * len(hosts))})
+              AND bucket >= ? AND bucket < ?
+            ORDER BY host, bucket""",
+        (customer, sid, *hosts, start, end),
+        f"{source}_{grain}_by_host",
+    )
+
+
+if __name__ == "__main__":
+    import logsetup
+    logsetup.setup()
+    catch_up()
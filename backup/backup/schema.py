@@ -0,0 +1,361 @@
+# schema.py
+# Versioned schema migrations tracked with PRAGMA user_version.
+# app.py applies pending migrations at start-up: each one runs in its own
+# BEGIN IMMEDIATE transaction that re-reads user_version under the write lock
+# and bumps it on commit, so workers starting together apply a step once and a
+# failed step leaves nothing behind. Full-table data backfills are not
+# migrations; run them once with `python schema.py`.
+import sqlite3
+import logging
+from constants import DB_PATH
+
+LOCK_TIMEOUT_SECONDS = 300  # another worker may be applying a migration
+BACKFILL_BATCH_ROWS = 50_000
+BACKFILL_STATE = "schema:epoch_backfill"  # watermark 1 once backfill_epochs() has run
+
+FS_COLUMNS = [
+    "hana_data_used", "hana_data_available", "hana_data_used_percent",
+    "hana_backup_used", "hana_backup_available", "hana_backup_used_percent",
+    "hana_log_used", "hana_log_available", "hana_log_used_percent",
+    "usr_sap_used", "usr_sap_available", "usr_sap_used_percent",
+    "sapmnt_used", "sapmnt_available", "sapmnt_used_percent",
+    "usr_sap_trans_used", "usr_sap_trans_available", "usr_sap_trans_used_percent",
+]
+
+# source table -> numeric columns kept in the {source}_{grain} rollup tables
+ROLLUP_METRICS = {
+    "system_usage": ["cpu", "memory"],
+    "file_system_usage": FS_COLUMNS,
+}
+ROLLUP_GRAINS = ["hourly", "daily", "monthly"]
+
+
+def _create_rollup_tables(conn):
+    for source, metrics in ROLLUP_METRICS.items():
+        stats = ",\n".join(
+            f"{m}_{agg} REAL" for m in metrics for agg in ("min", "avg", "max", "p95")
+        )
+        for grain in ROLLUP_GRAINS:
+            table = f"{source}_{grain}"
+            conn.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+                customer TEXT,
+                sid TEXT,
+                host TEXT,
+                bucket TEXT,
+                samples INTEGER,
+                {stats},
+                PRIMARY KEY (customer, sid, host, bucket)
+            ) WITHOUT ROWID""")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_cust_bucket ON {table}(customer, bucket)")
+
+
+# raw table -> (TEXT timestamp column, INTEGER epoch-seconds column)
+EPOCH_COLUMNS = {
+    "system_usage": ("timestamp", "ts"),
+    "file_system_usage": ("timestamp", "ts"),
+    "backup_dashboard": ("SYS_START_TIME", "start_ts"),
+}
+
+# raw table -> its (customer, sid, host) columns, for the dimensions table
+DIMENSION_COLUMNS = {
+    "system_usage": ("customer", "sid", "host"),
+    "file_system_usage": ("customer", "sid", "host"),
+    "backup_dashboard": ("CUSTOMER", "SYSTEM_ID", "HOST"),
+}
+
+
+def _epoch_sql(text_column):
+    # timestamps without an offset are taken as UTC, as strftime('%s') does
+    return f"CAST(strftime('%s', {text_column}) AS INTEGER)"
+
+
+def _add_epoch_columns(conn):
+    # rows already in the table get their epochs from backfill_epochs()
+    pending = False
+    for table, (text_column, epoch_column) in EPOCH_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if epoch_column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {epoch_column} INTEGER")
+        pending = pending or conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is not None
+        # writers that only know the TEXT column (older loader scripts) still get an epoch
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_{epoch_column}
+            AFTER INSERT ON {table} WHEN NEW.{epoch_column} IS NULL
+            BEGIN
+                UPDATE {table} SET {epoch_column} = {_epoch_sql("NEW." + text_column)}
+                WHERE rowid = NEW.rowid;
+            END""")
+    set_state(conn, BACKFILL_STATE, 0 if pending else 1)
+
+
+MIGRATIONS = [
+    (1, "base tables", [
+        """CREATE TABLE IF NOT EXISTS system_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            host TEXT,
+            cpu REAL,
+            memory REAL,
+            customer TEXT,
+            sid TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS file_system_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            customer TEXT,
+            sid TEXT,
+            host TEXT,
+            """ + ",\n            ".join(f"{c} REAL" for c in FS_COLUMNS) + """
+        )""",
+        """CREATE TABLE IF NOT EXISTS backup_dashboard (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            CUSTOMER TEXT,
+            SYSTEM_ID TEXT,
+            HOST TEXT,
+            Database_type TEXT,
+            SYS_START_TIME TEXT,
+            ENTRY_TYPE_NAME TEXT,
+            STATE_NAME TEXT
+        )""",
+    ]),
+    (2, "timestamp range indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_system_usage_cust_sid_host_ts ON system_usage(customer, sid, host, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_system_usage_cust_ts ON system_usage(customer, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_fs_usage_cust_sid_host_ts ON file_system_usage(customer, sid, host, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_fs_usage_cust_ts ON file_system_usage(customer, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_backup_cust_sid_start ON backup_dashboard(CUSTOMER, SYSTEM_ID, SYS_START_TIME)",
+        "CREATE INDEX IF NOT EXISTS idx_backup_cust_start ON backup_dashboard(CUSTOMER, SYS_START_TIME)",
+        "ANALYZE",
+    ]),
+    (3, "rollup tables", [
+        """CREATE TABLE IF NOT EXISTS etl_state (
+            name TEXT PRIMARY KEY,
+            watermark INTEGER NOT NULL DEFAULT 0,
+            meta TEXT,
+            updated_at TEXT
+        )""",
+        _create_rollup_tables,
+    ]),
+    (4, "keyset pagination indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_system_usage_ts ON system_usage(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_backup_start ON backup_dashboard(SYS_START_TIME)",
+    ]),
+    (5, "materialized anomalies", [
+        """CREATE TABLE IF NOT EXISTS anomalies (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT,
+            customer TEXT,
+            sid TEXT,
+            host TEXT,
+            cpu REAL,
+            memory REAL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_anomalies_ts ON anomalies(timestamp, id)",
+    ]),
+    (6, "per-host baselines", [
+        """CREATE TABLE IF NOT EXISTS host_baselines (
+            customer TEXT,
+            sid TEXT,
+            host TEXT,
+            metric TEXT,
+            samples INTEGER,
+            ewma REAL,
+            mean REAL,
+            stddev REAL,
+            band_low REAL,
+            band_high REAL,
+            last_timestamp TEXT,
+            PRIMARY KEY (customer, sid, host, metric)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS baseline_anomalies (
+            id INTEGER,
+            metric TEXT,
+            timestamp TEXT,
+            customer TEXT,
+            sid TEXT,
+            host TEXT,
+            value REAL,
+            ewma REAL,
+            mean REAL,
+            band_high REAL,
+            zscore REAL,
+            PRIMARY KEY (id, metric)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_baseline_anomalies_ts ON baseline_anomalies(timestamp)",
+    ]),
+    (7, "integer epoch timestamps", [
+        _add_epoch_columns,
+        "DROP INDEX IF EXISTS idx_system_usage_cust_sid_host_ts",
+        "DROP INDEX IF EXISTS idx_system_usage_cust_ts",
+        "DROP INDEX IF EXISTS idx_system_usage_ts",
+        "DROP INDEX IF EXISTS idx_fs_usage_cust_sid_host_ts",
+        "DROP INDEX IF EXISTS idx_fs_usage_cust_ts",
+        "DROP INDEX IF EXISTS idx_backup_cust_sid_start",
+        "DROP INDEX IF EXISTS idx_backup_cust_start",
+        "DROP INDEX IF EXISTS idx_backup_start",
+        "CREATE INDEX IF NOT EXISTS idx_system_usage_cust_sid_host_epoch ON system_usage(customer, sid, host, ts)",
+        "CREATE INDEX IF NOT EXISTS idx_system_usage_cust_epoch ON system_usage(customer, ts)",
+        "CREATE INDEX IF NOT EXISTS idx_system_usage_epoch ON system_usage(ts)",
+        "CREATE INDEX IF NOT EXISTS idx_fs_usage_cust_sid_host_epoch ON file_system_usage(customer, sid, host, ts)",
+        "CREATE INDEX IF NOT EXISTS idx_fs_usage_cust_epoch ON file_system_usage(customer, ts)",
+        "CREATE INDEX IF NOT EXISTS idx_backup_cust_sid_epoch ON backup_dashboard(CUSTOMER, SYSTEM_ID, start_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_backup_cust_epoch ON backup_dashboard(CUSTOMER, start_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_backup_epoch ON backup_dashboard(start_ts)",
+        "ANALYZE",
+    ]),
+    (8, "dimension lookup table", [
+        """CREATE TABLE IF NOT EXISTS dimensions (
+            source TEXT,
+            customer TEXT,
+            sid TEXT,
+            host TEXT,
+            first_ts INTEGER,
+            last_ts INTEGER,
+            PRIMARY KEY (source, customer, sid, host)
+        ) WITHOUT ROWID""",
+    ]),
+    (9, "fleet-wide hourly rollup reads", [
+        "CREATE INDEX IF NOT EXISTS idx_system_usage_hourly_bucket ON system_usage_hourly(bucket)",
+        "CREATE INDEX IF NOT EXISTS idx_file_system_usage_hourly_bucket ON file_system_usage_hourly(bucket)",
+    ]),
+    (10, "filesystem forecasts", [
+        """CREATE TABLE IF NOT EXISTS fs_forecast (
+            customer TEXT,
+            sid TEXT,
+            host TEXT,
+            mount TEXT,
+            samples INTEGER,
+            last_day TEXT,
+            used_percent REAL,
+            growth_per_day REAL,
+            rmse REAL,
+            full_date TEXT,
+            fitted_at TEXT,
+            PRIMARY KEY (customer, sid, host, mount)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_fs_forecast_full_date ON fs_forecast(full_date)",
+        "CREATE INDEX IF NOT EXISTS idx_file_system_usage_daily_bucket ON file_system_usage_daily(bucket)",
+    ]),
+    (11, "backup SLA summaries", [
+        """CREATE TABLE IF NOT EXISTS backup_latest (
+            customer TEXT,
+            sid TEXT,
+            host TEXT,
+            db_type TEXT,
+            entry_type TEXT,
+            kind TEXT,
+            last_success_ts INTEGER,
+            last_failure_ts INTEGER,
+            last_ts INTEGER,
+            last_state TEXT,
+            PRIMARY KEY (customer, sid, host, db_type, entry_type)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS backup_daily (
+            customer TEXT,
+            sid TEXT,
+            host TEXT,
+            db_type TEXT,
+            entry_type TEXT,
+            day TEXT,
+            kind TEXT,
+            attempts INTEGER,
+            succeeded INTEGER,
+            failed INTEGER,
+            PRIMARY KEY (customer, sid, host, db_type, entry_type, day)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_backup_daily_day ON backup_daily(day)",
+    ]),
+]
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def get_state(conn, name):
+    row = conn.execute("SELECT watermark, meta FROM etl_state WHERE name=?", (name,)).fetchone()
+    return (row[0], row[1]) if row else (0, None)
+
+
+def set_state(conn, name, watermark, meta=None):
+    conn.execute(
+        "INSERT OR REPLACE INTO etl_state (name, watermark, meta, updated_at) VALUES (?, ?, ?, datetime('now'))",
+        (name, watermark, meta),
+    )
+
+
+def migrate(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path, timeout=LOCK_TIMEOUT_SECONDS, isolation_level=None)
+    try:
+        version = current_version(conn)
+        for target, name, steps in MIGRATIONS:
+            if target <= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = current_version(conn)  # another worker may have got here first
+                if target <= version:
+                    conn.execute("COMMIT")
+                    continue
+                logging.info("Applying migration %d: %s", target, name)
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f"PRAGMA user_version = {target}")
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            version = target
+        return version
+    finally:
+        conn.close()
+
+
+def backfill_epochs(db_path=DB_PATH, batch_rows=BACKFILL_BATCH_ROWS):
+    # Epoch columns for rows written before migration 7, in rowid batches so
+    # each write transaction stays short while the app keeps serving.
+    conn = sqlite3.connect(db_path, timeout=LOCK_TIMEOUT_SECONDS)
+    try:
+        filled = 0
+        for table, (text_column, epoch_column) in EPOCH_COLUMNS.items():
+            last = 0
+            while True:
+                upper = conn.execute(
+                    f"SELECT max(rowid) FROM (SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?)",
+                    (last, batch_rows)).fetchone()[0]
+                if upper is None:
+                    break
+                with conn:
+                    filled += conn.execute(
+                        f"""UPDATE {table} SET {epoch_column} = {_epoch_sql(text_column)}
+                            WHERE rowid > ? AND rowid <= ? AND {epoch_column} IS NULL""",
+                        (last, upper)).rowcount
+                last = upper
+        with conn:
+            set_state(conn, BACKFILL_STATE, 1)
+        logging.info("Backfilled %d epoch timestamps", filled)
+        return filled
+    finally:
+        conn.close()
+
+
+def backfill_pending(db_path=DB_PATH):
+    # only databases that had rows when migration 7 ran need the backfill
+    conn = sqlite3.connect(db_path, timeout=LOCK_TIMEOUT_SECONDS)
+    try:
+        row = conn.execute("SELECT watermark FROM etl_state WHERE name=?", (BACKFILL_STATE,)).fetchone()
+        return row is not None and row[0] == 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    # the one-shot migration command: schema changes, then data backfills
+    import logsetup
+    logsetup.setup()
+    version = migrate()
+    filled = backfill_epochs()
+    print(f"Schema at version {version}; {filled} epoch timestamps backfilled")
@@ -0,0 +1,46 @@
+# tests/conftest.py
+# The modules import each other by bare name, as when run from backup/backup,
+# so that directory goes on sys.path. Every test app gets its own database
+# (and partition/archive/export directories) under tmp_path.
+import os
+import sys
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logsetup  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def log_file(tmp_path_factory):
+    # before the first create_app(): keep the JSON log out of /opt/myapp
+    logsetup.LOG_FILE = str(tmp_path_factory.mktemp("logs") / "app.log")
+
+
+@pytest.fixture
+def app(tmp_path):
+    import app as application
+    return application.create_app(DB_PATH=str(tmp_path / "read.db"))
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def conn(app):
+    from utils import get_db_connection
+    with app.app_context():
+        yield get_db_connection()
+
+
+@pytest.fixture
+def settle():
+    # waits for the refreshes requests start on background threads (utils.in_background)
+    def wait():
+        for thread in threading.enumerate():
+            if thread.daemon and thread.name.endswith(("-refresh", "-maintenance")):
+                thread.join(timeout=10)
+    return wait
@@ -0,0 +1,63 @@
+import pytest
+import anomalies
+import partitions
+from schema import set_state
+
+JAN = 1735689600  # 2025-01-01 00:00:00 UTC, archived below
+MAR = 1772323200  # 2026-03-01 00:00:00 UTC, stays in read.db
+
+
+@pytest.fixture
+def usage(app, conn):
+    # 40 samples a month; cpu and memory walk 0..97 so each threshold keeps a different share
+    rows = [(start + 600 * i, f"h{i % 2}", float(i * 5 % 98), float(i * 7 % 98))
+            for start in (JAN, MAR) for i in range(40)]
+    with conn:
+        conn.executemany(
+            "INSERT INTO system_usage (timestamp, ts, customer, sid, host, cpu, memory) "
+            "VALUES (strftime('%Y-%m-%d %H:%M:%S', ?, 'unixepoch'), ?, 'C', 'S', ?, ?, ?)",
+            [(ts, ts, host, cpu, memory) for ts, host, cpu, memory in rows])
+    with app.app_context():
+        yield rows
+
+
+def _expected(rows, cpu, memory):
+    return sorted(i for i, (_, _, c, m) in enumerate(rows, 1) if c >= cpu or m >= memory)
+
+
+def _ids(conn):
+    return [row[0] for row in conn.execute("SELECT id FROM anomalies ORDER BY id")]
+
+
+def test_new_rows_are_scanned_in_batches(usage, conn, monkeypatch):
+    monkeypatch.setattr(anomalies, "BATCH_ROWS", 30)
+    with conn:
+        set_state(conn, "anomalies", 0, "cpu>=60;memory>=70")  # built with these, nothing scanned yet
+    assert [anomalies.refresh(conn, 60, 70) for _ in range(4)] == [30, 30, 20, 0]
+    assert _ids(conn) == _expected(usage, 60, 70)
+    with conn:
+        conn.execute("INSERT INTO system_usage (timestamp, ts, customer, sid, host, cpu, memory) "
+                     "VALUES ('2026-03-02 00:00:00', ?, 'C', 'S', 'h0', 99, 0)", (MAR + 86400,))
+    assert anomalies.refresh(conn, 60, 70) == 1
+    assert _ids(conn)[-1] == 81
+
+
+def test_threshold_change_rebuilds_archived_months_too(usage, conn, monkeypatch):
+    anomalies.catch_up(conn, 60, 70)
+    assert partitions.archive_month(conn, "2025-01") == 40
+    monkeypatch.setattr(anomalies, "BATCH_ROWS", 7)  # several transactions per database
+    anomalies.catch_up(conn, 90, 30)
+    assert _ids(conn) == _expected(usage, 90, 30)
+    assert conn.execute("SELECT meta FROM etl_state WHERE name='anomalies'").fetchone() == ("cpu>=90;memory>=30",)
+
+
+def test_app_thresholds_reach_the_background_refresh(app, conn, settle):
+    app.config.update(CPU_THRESHOLD=95.0, MEM_THRESHOLD=95.0)
+    with conn:
+        conn.execute("INSERT INTO system_usage (timestamp, ts, customer, sid, host, cpu, memory) "
+                     "VALUES ('2026-03-01 00:00:00', ?, 'C', 'S', 'h', 90, 90)", (MAR,))
+    with app.test_request_context():
+        anomalies.maybe_refresh()
+    settle()
+    assert _ids(conn) == []
+    assert conn.execute("SELECT meta FROM etl_state WHERE name='anomalies'").fetchone() == ("cpu>=95.0;memory>=95.0",)
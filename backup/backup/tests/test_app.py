@@ -0,0 +1,18 @@
+import pytest
+import app as app_module
+
+pytestmark = pytest.mark.skipif(not app_module.plotly_bundle(), reason="plotly is not installed")
+
+
+def test_plotly_is_served_locally(client):
+    response = client.get("/static/plotly.min.js")
+    assert response.status_code == 200
+    assert response.mimetype == "text/javascript"
+    assert response.cache_control.max_age == app_module.PLOTLY_JS_MAX_AGE
+    assert client.get("/static/plotly.min.js", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    response.close()
+
+
+def test_chart_pages_use_the_local_bundle(client):
+    page = client.get("/fleet").data
+    assert b'src="/static/plotly.min.js"' in page and b"cdn.plot.ly" not in page
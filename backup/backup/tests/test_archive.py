@@ -0,0 +1,59 @@
+import os
+from datetime import date
+import pytest
+import archive
+import ingest
+import partitions
+from test_partitions import DAY, FORM, load_months, responses
+
+CUSTOM = {"customer": "C1", "start_date": "2026-01-01", "end_date": "2026-03-31", "format": "csv"}
+
+pytestmark = pytest.mark.skipif(not archive.available(), reason="pyarrow is not installed")
+
+
+@pytest.fixture
+def loaded(app, conn):
+    load_months(app, conn)
+
+
+def _rotate(app, conn, today=date(2026, 3, 10)):
+    with app.app_context():
+        return partitions.maintain(conn, today=today)
+
+
+def test_rotation_to_parquet_keeps_every_response(app, client, conn, loaded):
+    before = responses(client), client.post("/download_custom", data=CUSTOM).data
+    assert before[1].count(b"\n") == 1 + 96  # January and March
+    _rotate(app, conn)
+    with app.app_context():
+        assert archive.archived("system_usage") == {"2026-01"}
+    assert (responses(client), client.post("/download_custom", data=CUSTOM).data) == before
+
+
+def test_late_samples_are_merged_into_the_scan(app, client, conn, loaded):
+    _rotate(app, conn)
+    late = {"timestamp": f"{DAY} 12:15:00", "customer": "C1", "sid": "S1", "host": "s1db01", "cpu": 1, "memory": 2}
+    ingest.load("system_usage", [late], conn)  # lands in read.db, inside an archived month
+    rows = client.post("/download_dashboard", data=FORM).data.decode().splitlines()[1:]
+    assert len(rows) == 33 and f"C1,S1,{DAY} 12:15:00,s1db01,1.0,2.0" in rows
+    assert [row.split(",")[2] for row in rows] == sorted(row.split(",")[2] for row in rows)
+
+
+def test_retention_deletes_the_parquet_files(app, client, conn, loaded):
+    _rotate(app, conn)
+    _, dropped = _rotate(app, conn, today=date(2027, 3, 10))
+    assert dropped == ["2026-01"]
+    with app.app_context():
+        assert "2026-01" not in archive.archived("system_usage")
+        assert not os.path.exists(archive.archive_path("system_usage", "2026-01"))
+    assert client.post("/download_dashboard", data=FORM).data.count(b"\n") == 1  # headers only
+
+
+def test_unservable_range_is_refused_before_streaming(app, client, conn, loaded):
+    _rotate(app, conn)
+    with app.app_context():
+        for month in range(1, 10):  # SQLite-only months, more than can be attached at once
+            open(partitions.partition_path(f"2025-{month:02d}"), "w").close()
+    response = client.post("/download_custom", data={**CUSTOM, "start_date": "2025-01-01"})
+    assert response.status_code == 400
+    assert b"archived months" in response.data
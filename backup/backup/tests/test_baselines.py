@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import baselines
+
+T0 = 1772323200  # 2026-03-01 00:00:00 UTC
+
+
+def _naive_ewma(values, alpha, state=None):
+    out = []
+    for value in values:
+        state = value if state is None else alpha * value + (1 - alpha) * state
+        out.append(state)
+    return out
+
+
+@pytest.mark.parametrize("state", [None, 40.0])
+def test_ewma_matches_the_recurrence(state):
+    values = np.random.default_rng(3).normal(50, 10, 300)  # several 64-value blocks
+    assert baselines.ewma(values, 0.05, state) == pytest.approx(_naive_ewma(values, 0.05, state))
+
+
+def test_rolling_bands_describe_the_preceding_window():
+    values = np.arange(20, dtype=float)
+    values[7] = np.nan
+    count, mean, std, band = baselines.rolling_bands(values, 10, window=5, percentile=50)
+    window = values[10:15]  # what position 15 looks back on
+    assert count[5] == 5
+    assert mean[5] == pytest.approx(window.mean())
+    assert std[5] == pytest.approx(window.std())
+    assert band[5] == pytest.approx(np.median(window))
+    assert count[0] == 4 and mean[0] == pytest.approx(np.nanmean(values[5:10]))  # NaN skipped
+
+
+def _samples(conn, cpu):
+    with conn:
+        conn.executemany(
+            "INSERT INTO system_usage (timestamp, ts, customer, sid, host, cpu, memory) "
+            "VALUES (strftime('%Y-%m-%d %H:%M:%S', ?, 'unixepoch'), ?, 'C', 'S', 'h', ?, 50)",
+            [(T0 + 300 * i, T0 + 300 * i, value) for i, value in enumerate(cpu)])
+
+
+def test_spike_is_flagged_once_the_host_has_history(conn):
+    cpu = list(20 + np.random.default_rng(5).normal(0, 1, 100))
+    cpu[10] = cpu[80] = 95.0  # the first comes before BASELINE_MIN_SAMPLES of history
+    _samples(conn, cpu)
+    baselines.catch_up(conn)
+    assert conn.execute("SELECT id, metric, value FROM baseline_anomalies").fetchall() == [(81, "cpu", 95.0)]
+
+
+def test_ewma_is_carried_across_batches(conn, monkeypatch):
+    cpu = list(np.random.default_rng(7).normal(30, 5, 120))
+    _samples(conn, cpu)
+    monkeypatch.setattr(baselines, "BATCH_ROWS", 50)
+    assert [baselines.refresh(conn) for _ in range(4)] == [50, 50, 20, 0]
+    ewma, samples = conn.execute(
+        "SELECT ewma, samples FROM host_baselines WHERE host='h' AND metric='cpu'").fetchone()
+    assert ewma == pytest.approx(_naive_ewma(cpu, baselines.BASELINE_EWMA_ALPHA)[-1])
+    assert samples == 120
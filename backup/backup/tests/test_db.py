@@ -0,0 +1,91 @@
+import sqlite3
+import threading
+import pytest
+import db
+from db import ConnectionPool, PoolExhausted, pool
+
+
+def _hold(pool_, path, count):
+    # `count` threads that each check out a connection and keep it until released
+    ready, release = threading.Barrier(count + 1), threading.Event()
+
+    def worker():
+        pool_.connection(path)
+        ready.wait()
+        release.wait()
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    return threads, release
+
+
+def test_cap_is_enforced_until_a_thread_finishes(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "POOL_TIMEOUT_SECONDS", 0.2)
+    path = str(tmp_path / "pool.db")
+    capped = ConnectionPool(path, max_connections=2)
+    threads, release = _hold(capped, path, 2)
+    with pytest.raises(PoolExhausted):
+        capped.connection()
+    assert capped.stats()["open"] == 2
+    release.set()
+    for thread in threads:
+        thread.join()
+    capped.connection()  # the finished threads' connections are reaped
+    assert capped.stats()["open"] == 1
+    capped.close_all()
+
+
+def test_waiting_thread_gets_the_freed_slot(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "POOL_TIMEOUT_SECONDS", 5)
+    path = str(tmp_path / "pool.db")
+    capped = ConnectionPool(path, max_connections=1)
+    threads, release = _hold(capped, path, 1)
+    threading.Timer(0.1, release.set).start()
+    capped.connection()  # waits for the holder to finish instead of failing
+    assert capped.stats()["opened"] == 2
+    capped.close_all()
+
+
+def test_one_connection_per_thread_and_database(tmp_path):
+    shared = ConnectionPool(str(tmp_path / "a.db"))
+    first = shared.connection()
+    assert shared.connection() is first
+    assert shared.connection(str(tmp_path / "b.db")) is not first
+    other = []
+    thread = threading.Thread(target=lambda: other.append(shared.connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+    assert shared.stats()["reused"] == 1
+    shared.close_all()
+
+
+def test_requests_on_a_thread_reuse_its_connection(client, settle):
+    client.get("/get_sids?customer=C0")
+    settle()  # nothing else opens connections meanwhile
+    before = pool.stats()
+    for i in range(1, 4):
+        client.get(f"/get_sids?customer=C{i}")  # a dropdown cache miss each time
+    after = pool.stats()
+    assert after["opened"] == before["opened"]
+    assert after["reused"] > before["reused"]
+
+
+def test_teardown_rolls_back_a_transaction_left_open(app, tmp_path):
+    @app.route("/half_written")
+    def half_written():
+        from utils import get_db_connection
+        get_db_connection().execute("INSERT INTO etl_state (name) VALUES ('half')")  # never committed
+        raise RuntimeError("request failed mid-transaction")
+
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+    assert app.test_client().get("/half_written").status_code == 500
+    other = sqlite3.connect(app.config["DB_PATH"], timeout=0.1)
+    with other:  # the write lock was released with the request
+        other.execute("INSERT INTO etl_state (name) VALUES ('other')")
+    assert other.execute("SELECT name FROM etl_state WHERE name IN ('half', 'other')").fetchall() == [("other",)]
+    with app.app_context():
+        from utils import get_db_connection
+        assert not get_db_connection().in_transaction
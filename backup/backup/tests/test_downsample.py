@@ -0,0 +1,54 @@
+import numpy as np
+import downsample
+
+
+def _series(n, seed=1):
+    rng = np.random.default_rng(seed)
+    x = np.arange(n, dtype=np.int64).astype("datetime64[s]").astype("datetime64[ms]")
+    return x, rng.normal(50, 10, n)
+
+
+def test_short_series_pass_through():
+    x, y = _series(50)
+    for method in ("minmax", "lttb"):
+        kept_x, kept_y = downsample.reduce(x, y, budget=100, method=method)
+        assert np.array_equal(kept_x, x) and np.array_equal(kept_y, y)
+
+
+def test_minmax_keeps_peaks_within_budget():
+    x, y = _series(10_000)
+    y[1234], y[8765] = 500.0, -500.0
+    kept_x, kept_y = downsample.minmax(x, y, 200)
+    assert len(kept_y) <= 200
+    assert 500.0 in kept_y and -500.0 in kept_y
+    assert np.all(np.diff(kept_x.astype(np.int64)) > 0)
+
+
+def test_minmax_ignores_nan_when_picking_extremes():
+    x, y = _series(1000)
+    y[::7] = np.nan
+    _, kept_y = downsample.minmax(x, y, 100)
+    assert np.isfinite(kept_y).all()
+
+
+def test_lttb_keeps_endpoints_and_budget():
+    x, y = _series(10_000)
+    kept_x, kept_y = downsample.lttb(x, y, 300)
+    assert len(kept_y) == 300
+    assert kept_x[0] == x[0] and kept_x[-1] == x[-1]
+    assert np.all(np.diff(kept_x.astype(np.int64)) > 0)
+
+
+def test_lttb_follows_a_spike():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[500] = 100.0
+    _, kept_y = downsample.lttb(x, y, 20)
+    assert 100.0 in kept_y
+
+
+def test_drop_incomplete_keeps_rows_with_every_value():
+    rows = [(1, 1.0, 2.0), (2, None, 2.0), (3, 3.0, "n/a"), (4, 4.0, 5.0)]
+    x, (a, b) = downsample.drop_incomplete(*downsample.columns(rows, 2))
+    assert x.astype("datetime64[s]").astype(np.int64).tolist() == [1, 4]
+    assert a.tolist() == [1.0, 4.0] and b.tolist() == [2.0, 5.0]
@@ -0,0 +1,139 @@
+import time
+import calendar
+from datetime import date
+import pytest
+from email.utils import formatdate
+from flask import Flask, request
+import httpcache
+import anomalies
+import rollups
+
+
+@pytest.fixture
+def cached():
+    # a bare app with one conditional route; `state` drives its data version
+    httpcache._bodies.clear()
+    state = {"version": 1, "modified": time.time() - 60, "calls": 0, "status": 200}
+    app = Flask(__name__)
+
+    def version():
+        if request.values.get("bad"):
+            raise ValueError("bad parameter")
+        httpcache.modified_since(state["modified"])
+        return [state["version"]]
+
+    @app.route("/data", methods=["GET", "POST"])
+    @httpcache.conditional(version)
+    def data():
+        state["calls"] += 1
+        return f"v{state['version']} {sorted(request.values.items())}", state["status"]
+
+    return app.test_client(), state
+
+
+def test_validators_are_sent(cached):
+    client, _ = cached
+    response = client.get("/data")
+    assert response.status_code == 200
+    assert response.headers["ETag"].startswith('"')
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert "Last-Modified" in response.headers
+
+
+def test_matching_etag_is_answered_without_the_view(cached):
+    client, state = cached
+    etag = client.get("/data").headers["ETag"]
+    response = client.get("/data", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.data == b""
+    assert state["calls"] == 1
+
+
+def test_if_modified_since(cached):
+    client, state = cached
+    modified = client.get("/data").headers["Last-Modified"]
+    assert client.get("/data", headers={"If-Modified-Since": modified}).status_code == 304
+    earlier = formatdate(time.time() - 3600, usegmt=True)
+    assert client.get("/data", headers={"If-Modified-Since": earlier}).status_code == 200
+
+
+def test_new_data_changes_the_etag(cached):
+    client, state = cached
+    etag = client.get("/data").headers["ETag"]
+    state["version"] = 2
+    response = client.get("/data", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.data.startswith(b"v2")
+
+
+def test_parameters_are_normalized(cached):
+    client, _ = cached
+    one = client.get("/data?b=1&a=2&sid=Y&sid=X&blank=").headers["ETag"]
+    two = client.get("/data?sid=X&a=2&sid=Y&b=1").headers["ETag"]
+    assert one == two
+    assert client.get("/data?a=3&b=1").headers["ETag"] != one
+
+
+def test_post_bodies_are_replayed(cached):
+    client, state = cached
+    first = client.post("/data", data={"customer": "C1"})
+    again = client.post("/data", data={"customer": "C1"})
+    assert again.status_code == 200 and again.data == first.data
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert state["calls"] == 1
+    client.post("/data", data={"customer": "C2"})
+    assert state["calls"] == 2
+
+
+def test_errors_are_neither_cached_nor_validated(cached):
+    client, state = cached
+    state["status"] = 500
+    assert "ETag" not in client.post("/data").headers
+    client.post("/data")
+    assert state["calls"] == 2
+    response = client.get("/data?bad=1")  # the view reports bad parameters itself
+    assert response.status_code == 500 and "ETag" not in response.headers
+
+
+def test_anomaly_page_revalidates_after_ingest(client, monkeypatch, settle):
+    monkeypatch.setattr(anomalies, "REFRESH_INTERVAL_SECONDS", 0)  # as if the refresh interval had passed
+    client.get("/anomaly")  # the first refresh records the thresholds
+    settle()
+    etag = client.get("/anomaly").headers["ETag"]
+    assert client.get("/anomaly", headers={"If-None-Match": etag}).status_code == 304
+    sample = {"timestamp": "2026-03-01 10:00:00", "customer": "C1", "sid": "S1", "host": "h", "cpu": 99, "memory": 1}
+    assert client.post("/ingest/system_usage", json=[sample]).get_json()["inserted"] == 1
+    client.get("/anomaly")  # starts the background refresh
+    settle()
+    response = client.get("/anomaly", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"C1" in response.data
+
+
+def test_validators_follow_the_rollup_watermark(app, client, conn, monkeypatch, settle):
+    monkeypatch.setattr(rollups, "REFRESH_INTERVAL_SECONDS", 0)
+    day = date.today().isoformat()  # stays in read.db when the ingest starts maintenance
+    sample = {"timestamp": f"{day} 10:00:00", "customer": "C1", "sid": "S1", "host": "h", "cpu": 5, "memory": 1}
+    client.post("/ingest/system_usage", json=[sample])
+    settle()
+    form = {"customer": "C1", "date": day, "format": "csv"}
+    client.post("/download_dashboard", data=form)  # starts the rollup refresh
+    settle()
+    first = client.post("/download_dashboard", data=form)
+    updated_at = conn.execute("SELECT updated_at FROM etl_state WHERE name='rollup:system_usage'").fetchone()[0]
+    modified = formatdate(calendar.timegm(time.strptime(updated_at, "%Y-%m-%d %H:%M:%S")), usegmt=True)
+    assert first.headers["Last-Modified"] == modified
+    fleet = client.get("/api/fleet")
+    assert fleet.headers["Last-Modified"] == modified
+    assert client.get("/api/fleet", headers={"If-None-Match": fleet.headers["ETag"]}).status_code == 304
+    assert client.get("/api/fleet", headers={"If-Modified-Since": modified}).status_code == 304
+
+    client.post("/ingest/system_usage", json=[{**sample, "timestamp": f"{day} 11:00:00"}])
+    client.post("/download_dashboard", data=form)  # the old version until the refresh commits
+    settle()
+    response = client.post("/download_dashboard", data=form)
+    assert response.headers["ETag"] != first.headers["ETag"]
+    assert response.data.decode().count(day) == 2
+    assert client.get("/api/fleet", headers={"If-None-Match": fleet.headers["ETag"]}).status_code == 200
@@ -0,0 +1,69 @@
+import io
+import json
+import ingest
+
+GOOD = {"timestamp": "2026-03-01T10:00:00", "customer": "C1", "sid": "S1", "host": "s1db01", "cpu": "12.5", "memory": 40}
+
+
+def test_rejections_are_counted_per_record(conn):
+    records = [
+        GOOD,
+        {**GOOD, "customer": ""},                  # missing customer
+        {**GOOD, "cpu": "busy"},                   # not a number
+        {**GOOD, "memory": "inf"},                 # not finite
+        {**GOOD, "timestamp": "yesterday"},        # not a timestamp
+        "not a record",
+        {**GOOD, "timestamp": "2026-03-01T10:05:00+01:00", "cpu": None},
+    ]
+    result = ingest.load("system_usage", records, conn)
+    assert (result.inserted, result.rejected) == (2, 5)
+    assert [number for number, _ in result.errors] == [2, 3, 4, 5, 6]
+    assert result.errors[0][1] == "missing customer"
+    assert result.errors[1][1].startswith("cpu:")
+    rows = conn.execute("SELECT timestamp, ts, cpu, memory FROM system_usage ORDER BY rowid").fetchall()
+    assert rows == [("2026-03-01T10:00:00", 1772359200, 12.5, 40.0),
+                    ("2026-03-01T10:05:00+01:00", 1772355900, None, 40.0)]
+
+
+def test_source_timestamps_keep_fractional_seconds(conn):
+    ingest.load("system_usage", [{**GOOD, "timestamp": "2025-05-27T15:17:58.183062"}], conn)
+    assert conn.execute("SELECT timestamp, ts FROM system_usage").fetchone() == ("2025-05-27T15:17:58.183062", 1748359078)
+
+
+def test_error_list_is_capped(conn, monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_MAX_ERRORS", 3)
+    result = ingest.load("system_usage", [{**GOOD, "cpu": "x"}] * 10 + [GOOD], conn)
+    assert (result.inserted, result.rejected, len(result.errors)) == (1, 10, 3)
+
+
+def test_batches_are_all_written(conn):
+    records = [{**GOOD, "timestamp": f"2026-03-01 10:{i // 60:02d}:{i % 60:02d}"} for i in range(250)]
+    result = ingest.load("system_usage", records, conn, batch_rows=64)
+    assert result.inserted == 250
+    assert conn.execute("SELECT COUNT(*) FROM system_usage").fetchone()[0] == 250
+
+
+def test_unreadable_jsonl_lines_do_not_stop_the_stream(conn):
+    body = "\n".join([json.dumps(GOOD), "{broken", "", json.dumps({**GOOD, "host": "s1app01"})])
+    result = ingest.load_stream("system_usage", io.BytesIO(body.encode()), "jsonl", conn)
+    assert (result.inserted, result.rejected) == (2, 1)
+    assert result.errors[0][1].startswith("unreadable record")
+
+
+def test_csv_backup_rows(conn):
+    body = ("CUSTOMER,SYSTEM_ID,HOST,Database_type,SYS_START_TIME,ENTRY_TYPE_NAME,STATE_NAME\n"
+            "C1,S1,s1db01,S1,2026-03-01 23:10:00,complete data backup,successful\n"
+            ",S1,s1db01,S1,2026-03-01 23:20:00,complete data backup,failed\n")
+    result = ingest.load_stream("backup_dashboard", io.BytesIO(body.encode()), "csv", conn)
+    assert (result.inserted, result.rejected) == (1, 1)
+    assert conn.execute("SELECT start_ts FROM backup_dashboard").fetchall() == [(1772406600,)]
+
+
+def test_ingest_route_reports_counts(client):
+    response = client.post("/ingest/system_usage", json=[GOOD, {**GOOD, "cpu": "busy"}])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body["inserted"], body["rejected"]) == (1, 1)
+    assert [error["record"] for error in body["errors"]] == [2]
+    assert client.post("/ingest/nope", json=[GOOD]).status_code == 404
+    assert client.post("/ingest/system_usage", json={"not": "a list"}).status_code == 400
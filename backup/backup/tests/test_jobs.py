@@ -0,0 +1,106 @@
+import os
+import csv
+import io
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+import jobs
+import reports
+
+FORM = {"customer": "C1", "date": "2026-03-01", "format": "csv"}
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    # a fresh pool per test; its forked workers see the test's monkeypatches
+    pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork"))
+    monkeypatch.setattr(jobs, "_executor", pool)
+    monkeypatch.setattr(jobs, "_executor_pid", os.getpid())
+    yield pool
+    pool.shutdown(wait=True)
+
+
+@pytest.fixture
+def usage(client, settle):
+    samples = [{"timestamp": f"2026-03-01T10:{i:02d}:00", "customer": "C1", "sid": "S1", "host": "h",
+                "cpu": i, "memory": 50} for i in range(5)]
+    assert client.post("/ingest/system_usage", json=samples).get_json()["inserted"] == 5
+    settle()  # the ingest may have started partition maintenance
+    return samples
+
+
+def _wait(client, job_id, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/exports/jobs/{job_id}").get_json()
+        if status["status"] not in ("running", "stale"):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {status['status']}")
+
+
+def test_export_runs_to_completion(client, usage, executor):
+    submitted = client.post("/exports/download_dashboard", data=FORM)
+    assert submitted.status_code == 202
+    job_id = submitted.get_json()["job_id"]
+    status = _wait(client, job_id)
+    assert status["status"] == "done"
+    assert client.post("/exports/download_dashboard", data=FORM).get_json() == status  # shared artifact
+    download = client.get(status["download_url"])
+    assert download.status_code == 200
+    assert download.headers["Content-Disposition"] == 'attachment; filename="C1_Daily_Report.csv"'
+    rows = list(csv.reader(io.StringIO(download.data.decode())))
+    assert rows[0] == reports.USAGE_HEADERS
+    assert [row[2] for row in rows[1:]] == [sample["timestamp"] for sample in usage]
+
+
+def test_failed_job_reports_its_error_and_can_be_resubmitted(client, usage, executor, monkeypatch):
+    def broken(conn, report):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(reports, "rows", broken)
+    job_id = client.post("/exports/download_dashboard", data=FORM).get_json()["job_id"]
+    status = _wait(client, job_id)
+    assert (status["status"], status["error"]) == ("failed", "disk full")
+    assert client.get(f"/exports/jobs/{job_id}/download").status_code == 409
+
+    monkeypatch.undo()  # the next pool forks without the patch
+    executor.shutdown(wait=True)
+    retry = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork"))
+    monkeypatch.setattr(jobs, "_executor", retry)
+    monkeypatch.setattr(jobs, "_executor_pid", os.getpid())
+    assert client.post("/exports/download_dashboard", data=FORM).get_json()["job_id"] == job_id
+    assert _wait(client, job_id)["status"] == "done"
+    retry.shutdown(wait=True)
+
+
+def test_unknown_jobs_and_reports(client):
+    assert client.get("/exports/jobs/" + "0" * 32).status_code == 404
+    assert client.get("/exports/jobs/not-a-job").status_code == 404
+    assert client.post("/exports/nope", data=FORM).status_code == 404
+
+
+def test_sweep_removes_expired_files(app, tmp_path):
+    directory = tmp_path / jobs.EXPORT_DIR
+    directory.mkdir()
+    old, fresh = directory / "old.csv", directory / "fresh.csv"
+    old.write_text("x")
+    fresh.write_text("y")
+    expired = time.time() - jobs.EXPORT_TTL_SECONDS - 60
+    os.utime(old, (expired, expired))
+    with app.app_context():
+        jobs.sweep()
+    assert sorted(os.listdir(directory)) == ["fresh.csv"]
+
+
+def test_stale_claim_is_restarted(client, usage, executor, monkeypatch):
+    monkeypatch.setattr(jobs, "STALE_PART_SECONDS", 0)  # as if the claiming worker had died
+    job_id = client.post("/exports/download_dashboard", data=FORM).get_json()["job_id"]
+    _wait(client, job_id)
+    artifact = os.path.join(os.path.dirname(client.application.config["DB_PATH"]), jobs.EXPORT_DIR,
+                            f"{job_id}.csv")
+    os.replace(artifact, artifact + ".part")  # unfinished, and nobody working on it
+    assert client.get(f"/exports/jobs/{job_id}").get_json()["status"] == "stale"
+    client.post("/exports/download_dashboard", data=FORM)
+    assert _wait(client, job_id)["status"] == "done"
@@ -0,0 +1,49 @@
+import re
+import sqlite3
+import pytest
+import metrics
+
+
+def _value(text, sample):
+    match = re.search(rf"^{re.escape(sample)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_streamed_query_is_recorded_once_exhausted():
+    conn = sqlite3.connect(":memory:")
+    before = _value(metrics.render(), 'sql_rows_total{query="test_stream"}')
+    rows = metrics.timed_execute("test_stream", conn, "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL "
+                                 "SELECT i + 1 FROM n WHERE i < 12000) SELECT i FROM n")
+    assert next(rows) == (1,)
+    assert _value(metrics.render(), 'sql_rows_total{query="test_stream"}') == before  # still streaming
+    assert sum(1 for _ in rows) == 11999
+    text = metrics.render()
+    assert _value(text, 'sql_rows_total{query="test_stream"}') == before + 12000
+    assert _value(text, 'sql_query_duration_seconds_count{query="test_stream"}') >= 1
+
+
+def test_errors_are_raised_before_streaming():
+    conn = sqlite3.connect(":memory:")
+    before = _value(metrics.render(), 'sql_errors_total{query="test_broken"}')
+    with pytest.raises(sqlite3.OperationalError):
+        metrics.timed_execute("test_broken", conn, "SELECT * FROM missing")
+    assert _value(metrics.render(), 'sql_errors_total{query="test_broken"}') == before + 1
+
+
+def test_downloads_show_up_in_metrics(client, conn, settle):
+    with conn:
+        conn.execute("INSERT INTO system_usage (timestamp, ts, customer, sid, host, cpu, memory) "
+                     "VALUES ('2026-03-01 10:00:00', 1772359200, 'C1', 'S1', 'h', 99, 1)")
+    client.get("/download_anomalies?format=csv")  # starts the anomaly refresh
+    settle()
+    sample = 'sql_rows_total{query="download_anomalies"}'
+    before = _value(client.get("/metrics").data.decode(), sample)
+    assert client.get("/download_anomalies?format=csv").data.count(b"\n") == 2
+    text = client.get("/metrics").data.decode()
+    assert _value(text, sample) == before + 1
+    assert "# TYPE sql_query_duration_seconds histogram" in text
+    assert re.search(r'^sql_query_duration_seconds_bucket\{query="download_anomalies",le="\+Inf"\} \d+$',
+                     text, re.MULTILINE)
+    client.post("/download_dashboard", data={"customer": "C1", "date": "2026-03-01", "format": "csv"})
+    assert _value(client.get("/metrics").data.decode(),
+                  'sql_query_duration_seconds_count{query="download_dashboard"}') >= 1
@@ -0,0 +1,64 @@
+import base64
+import pytest
+import pagination
+
+
+def _rows(conn, count):
+    # three samples per timestamp, so pages split ties on (timestamp, id)
+    with conn:
+        conn.executemany(
+            "INSERT INTO anomalies (id, timestamp, customer, sid, host, cpu, memory) VALUES (?, ?, 'C', 'S', 'h', ?, 0)",
+            [(i, f"2026-01-01 00:{i // 3:02d}:00", float(i)) for i in range(1, count + 1)])
+
+
+def _page(conn, token=None, size=10):
+    return pagination.fetch_page(conn, "SELECT id FROM anomalies", "", (), "timestamp", "id", size, token)
+
+
+@pytest.mark.parametrize("direction, key", [("next", ("2026-01-01 00:03:00", 12)), ("prev", ("2026-01-01", 1))])
+def test_token_round_trip(direction, key):
+    token = pagination.encode_token(direction, key)
+    assert "=" not in token
+    assert pagination.decode_token(token) == (direction, key)
+
+
+@pytest.mark.parametrize("token", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"{not json").decode(),
+    base64.urlsafe_b64encode(b'["next", "2026-01-01"]').decode(),        # missing rowid
+    base64.urlsafe_b64encode(b'["back", "2026-01-01", 3]').decode(),     # unknown direction
+    base64.urlsafe_b64encode(b'["next", "2026-01-01", "3"]').decode(),   # rowid not an int
+    base64.urlsafe_b64encode(b'["next", "2026-01-01", 3]').decode()[:-4],  # truncated
+])
+def test_tampered_token_is_rejected(token):
+    with pytest.raises(ValueError, match="Invalid page token"):
+        pagination.decode_token(token)
+
+
+def test_pages_cover_every_row_once(conn):
+    _rows(conn, 25)
+    seen, token, pages = [], None, []
+    while True:
+        rows, token, prev_token = _page(conn, token)
+        pages.append((rows, prev_token))
+        seen.extend(row[0] for row in rows)
+        if token is None:
+            break
+    assert seen == list(range(25, 0, -1))
+    assert [len(rows) for rows, _ in pages] == [10, 10, 5]
+    assert pages[0][1] is None
+
+
+def test_prev_token_returns_the_previous_page(conn):
+    _rows(conn, 25)
+    first, next_token, _ = _page(conn)
+    second, _, prev_token = _page(conn, next_token)
+    assert second[0][0] == 15
+    back, _, newer = _page(conn, prev_token)
+    assert back == first
+    assert newer is None
+
+
+def test_anomaly_route_rejects_a_tampered_token(client):
+    response = client.get("/anomaly", query_string={"page_token": "garbage!"})
+    assert response.status_code == 400
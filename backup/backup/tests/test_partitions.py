@@ -0,0 +1,104 @@
+import os
+from datetime import date
+import pytest
+import archive
+import ingest
+import partitions
+import anomalies
+import dimensions
+import rollups
+
+DAY = "2026-01-15"
+FORM = {"customer": "C1", "date": DAY, "format": "csv"}
+USAGE = {"customer": "C1", "sid": "S1", "host": "s1db01", "report_type": "day", "date": DAY}
+SPAN = {**USAGE, "report_type": "custom", "start_date": "2026-01-14", "end_date": "2026-01-15"}
+
+
+def load_months(app, conn):
+    # January (rotated out below) and a hot month that stays in read.db
+    records = [{"timestamp": f"{day} {hour:02d}:{minute:02d}:00", "customer": "C1", "sid": "S1", "host": host,
+                "cpu": (hour * 7 + minute) % 100, "memory": 40 + hour}
+               for day in ("2026-01-14", DAY, "2026-03-01") for host in ("s1db01", "s1app01")
+               for hour in range(0, 24, 3) for minute in (0, 30)]
+    assert ingest.load("system_usage", records, conn).inserted == len(records)
+    with app.app_context():
+        rollups.catch_up(conn)
+        anomalies.catch_up(conn)
+
+
+@pytest.fixture
+def loaded(app, conn, monkeypatch):
+    # partitions only: the Parquet archive is covered in test_archive.py
+    monkeypatch.setattr(archive, "_loaded", True)
+    monkeypatch.setattr(archive, "pq", None)  # as if pyarrow were not installed
+    load_months(app, conn)
+
+
+def responses(client):
+    return (
+        client.get("/api/usage", query_string=USAGE).get_json(),
+        client.get("/api/usage", query_string=SPAN).get_json(),
+        client.post("/download_dashboard", data=FORM).data,
+        client.get("/download_anomalies?format=csv").data,
+    )
+
+
+def test_rotation_keeps_every_response(app, client, conn, loaded):
+    before = responses(client)
+    assert before[0]["series"][0]["t"] and before[3].count(b"\n") > 1  # something to compare
+    with app.app_context():
+        archived, dropped = partitions.maintain(conn, today=date(2026, 3, 10))
+        assert archived == {"2026-01": 64} and dropped == []
+        assert partitions.archived_months() == ["2026-01"]
+        assert not os.path.exists(archive.archive_path("system_usage", "2026-01"))
+    assert conn.execute("SELECT COUNT(*) FROM system_usage WHERE ts < ?", (1772323200,)).fetchone() == (0,)
+    assert responses(client) == before
+
+
+def test_retention_drops_the_month_but_keeps_its_rollups(app, client, conn, loaded):
+    with app.app_context():
+        partitions.maintain(conn, today=date(2026, 3, 10))
+        _, dropped = partitions.maintain(conn, today=date(2027, 3, 10))
+        assert dropped == ["2026-01"]
+        assert partitions.archived_months() == ["2026-03"]  # rotated out meanwhile
+    assert client.get("/api/usage", query_string=USAGE).get_json()["series"][0]["t"] == []
+    assert conn.execute("SELECT COUNT(*) FROM system_usage_daily WHERE bucket = ?", (DAY,)).fetchone() == (2,)
+    assert conn.execute("SELECT COUNT(*) FROM anomalies WHERE timestamp < '2026-02'").fetchone() == (0,)
+
+
+def test_retention_prunes_hosts_without_samples(app, conn, loaded):
+    gone = {"timestamp": f"{DAY} 08:00:00", "customer": "C1", "sid": "S1", "host": "s1old01", "cpu": 1, "memory": 1}
+    ingest.load("system_usage", [gone], conn)
+    with app.app_context():
+        assert dimensions.hosts("system_usage", "C1", "S1") == ["s1app01", "s1db01", "s1old01"]
+        partitions.maintain(conn, today=date(2026, 3, 10))
+        assert "s1old01" in dimensions.hosts("system_usage", "C1", "S1")  # archived, still there
+        partitions.maintain(conn, today=date(2027, 3, 10))
+        assert dimensions.hosts("system_usage", "C1", "S1") == ["s1app01", "s1db01"]
+    first = conn.execute("SELECT MIN(first_ts) FROM dimensions WHERE source='system_usage'").fetchone()[0]
+    assert first == 1769904000  # 2026-02-01, the retention cutoff
+
+
+def test_route_only_unions_the_months_in_range(app):
+    with app.app_context():
+        os.makedirs(partitions.partition_dir())
+        for month in ("2025-11", "2025-12", "2026-01"):
+            open(partitions.partition_path(month), "w").close()
+        sql = partitions.route("SELECT cpu FROM system_usage WHERE ts >= ? AND ts < ?", 1764547200, 1767225600)
+        assert "main.system_usage" in sql and "p_2025_12.system_usage" in sql  # December 2025 only
+        assert "p_2025_11" not in sql and "p_2026_01" not in sql
+        assert partitions.route("SELECT 1 FROM system_usage", 1772323200, 1772409600) == "SELECT 1 FROM system_usage"
+        for month in range(1, 10):
+            open(partitions.partition_path(f"2024-{month:02d}"), "w").close()
+        with pytest.raises(ValueError, match="archived months"):
+            partitions.route("SELECT 1 FROM system_usage", 0, 1772323200)
+
+
+def test_ingest_runs_due_maintenance_in_the_background(client, conn, settle):
+    sample = {"timestamp": "2026-03-01 10:00:00", "customer": "C1", "sid": "S1", "host": "h", "cpu": 1, "memory": 1}
+    client.post("/ingest/system_usage", json=[sample])
+    settle()
+    first = conn.execute("SELECT watermark FROM etl_state WHERE name=?", (partitions.MAINTAINED_STATE,)).fetchone()
+    assert first is not None
+    with client.application.app_context():
+        assert partitions.maybe_maintain() is None  # not due again for PARTITION_MAINTAIN_INTERVAL_SECONDS
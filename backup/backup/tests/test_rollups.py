@@ -0,0 +1,76 @@
+import pytest
+import rollups
+
+
+def _samples(conn, rows):
+    # rows: (ts, host, cpu, memory)
+    with conn:
+        conn.executemany(
+            "INSERT INTO system_usage (timestamp, ts, customer, sid, host, cpu, memory) "
+            "VALUES (strftime('%Y-%m-%d %H:%M:%S', ?, 'unixepoch'), ?, 'C', 'S', ?, ?, ?)",
+            [(ts, ts, host, cpu, memory) for ts, host, cpu, memory in rows])
+
+
+def _rollup(conn, grain, host="h"):
+    return conn.execute(
+        f"SELECT bucket, samples, cpu_min, cpu_avg, cpu_max, cpu_p95 FROM system_usage_{grain} "
+        "WHERE host=? ORDER BY bucket", (host,)).fetchall()
+
+
+DAY1 = 1772323200  # 2026-03-01 00:00:00 UTC
+
+
+def test_buckets_summarise_the_raw_samples(conn):
+    _samples(conn, [(DAY1 + 60 * i, "h", float(i), 50.0) for i in range(120)])  # two hours
+    rollups.catch_up(conn)
+    assert _rollup(conn, "hourly") == [("2026-03-01 00:00:00", 60, 0.0, 29.5, 59.0, 56.0),
+                                       ("2026-03-01 01:00:00", 60, 60.0, 89.5, 119.0, 116.0)]
+    assert _rollup(conn, "daily") == [("2026-03-01", 120, 0.0, 59.5, 119.0, 113.0)]
+    assert _rollup(conn, "monthly") == [("2026-03-01", 120, 0.0, 59.5, 119.0, 116.0)]  # p95 of hourly p95s
+
+
+def test_watermark_only_rereads_touched_days(conn):
+    _samples(conn, [(DAY1 + 3600, "h", 10.0, 1.0), (DAY1 + 86400 + 3600, "h", 20.0, 1.0)])
+    assert rollups.refresh(conn) == {"system_usage": 2, "file_system_usage": 0}
+    assert rollups.refresh(conn) == {"system_usage": 0, "file_system_usage": 0}
+    conn.execute("UPDATE system_usage_daily SET cpu_max = -1 WHERE bucket = '2026-03-02'")  # marks day 2
+    _samples(conn, [(DAY1 + 7200, "h", 30.0, 1.0)])  # a late sample for day 1
+    rollups.catch_up(conn)
+    daily = _rollup(conn, "daily")
+    assert daily[0] == ("2026-03-01", 2, 10.0, 20.0, 30.0, 30.0)  # old and new samples of the day
+    assert daily[1][4] == -1  # day 2 was not touched
+    assert conn.execute("SELECT watermark FROM etl_state WHERE name='rollup:system_usage'").fetchone() == (3,)
+
+
+def test_batches_add_up_to_one_pass(conn, monkeypatch):
+    _samples(conn, [(DAY1 + 600 * i, f"h{i % 3}", float(i % 17), float(i % 5)) for i in range(500)])
+    rollups.catch_up(conn)
+    whole = conn.execute("SELECT * FROM system_usage_hourly ORDER BY host, bucket").fetchall()
+    conn.execute("DELETE FROM system_usage_hourly")
+    conn.execute("DELETE FROM etl_state")
+    consumed = []
+    while rollups.refresh_source(conn, "system_usage", batch_rows=64):
+        consumed.append(conn.execute("SELECT watermark FROM etl_state WHERE name='rollup:system_usage'").fetchone()[0])
+    assert consumed == [64 * i for i in range(1, 8)] + [500]
+    assert conn.execute("SELECT * FROM system_usage_hourly ORDER BY host, bucket").fetchall() == whole
+
+
+def test_requests_never_wait_for_a_refresh(app, conn, monkeypatch, settle):
+    _samples(conn, [(DAY1 + 3600, "h", 10.0, 1.0)])
+    monkeypatch.setattr(rollups, "_last_refresh", {})
+    with rollups._lock:  # a refresh is already running elsewhere
+        with app.app_context():
+            rollups.maybe_refresh()  # returns at once; the catch-up waits its turn
+        assert _rollup(conn, "hourly") == []
+    settle()
+    assert _rollup(conn, "hourly") == [("2026-03-01 01:00:00", 1, 10.0, 10.0, 10.0, 10.0)]
+
+
+@pytest.mark.parametrize("start, end, grain", [
+    ("2026-03-01", "2026-03-02", None),
+    ("2026-03-01", "2026-04-01", "hourly"),
+    ("2026-01-01", "2026-12-31", "daily"),
+    ("2020-01-01", "2026-01-01", "monthly"),
+])
+def test_grain_follows_the_range(start, end, grain):
+    assert rollups.choose_grain(start, end) == grain
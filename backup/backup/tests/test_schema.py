@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import schema
+
+
+def _database_at(path, version, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(schema, "MIGRATIONS", [m for m in schema.MIGRATIONS if m[0] <= version])
+        assert schema.migrate(str(path)) == version
+    return sqlite3.connect(str(path))
+
+
+def test_epoch_columns_are_backfilled(tmp_path, monkeypatch):
+    conn = _database_at(tmp_path / "read.db", 6, monkeypatch)
+    with conn:
+        conn.executemany("INSERT INTO system_usage (timestamp, customer, sid, host, cpu, memory) VALUES (?, 'C', 'S', 'h', 1, 1)",
+                         [("2026-03-01 10:00:00",), ("2026-03-01T12:00:00+02:00",), ("garbage",)])
+        conn.execute("INSERT INTO backup_dashboard (CUSTOMER, SYS_START_TIME) VALUES ('C', '2026-03-01 23:10:00')")
+    schema.migrate(str(tmp_path / "read.db"))
+    assert schema.backfill_pending(str(tmp_path / "read.db"))  # start-up leaves existing rows alone
+    assert conn.execute("SELECT count(*) FROM system_usage WHERE ts IS NULL").fetchone() == (3,)
+    assert schema.backfill_epochs(str(tmp_path / "read.db"), batch_rows=2) == 4  # three usage rows, one backup row
+    assert not schema.backfill_pending(str(tmp_path / "read.db"))
+    assert conn.execute("SELECT ts FROM system_usage ORDER BY rowid").fetchall() == [(1772359200,), (1772359200,), (None,)]
+    assert conn.execute("SELECT start_ts FROM backup_dashboard").fetchall() == [(1772406600,)]
+
+
+def test_new_database_needs_no_backfill(tmp_path):
+    schema.migrate(str(tmp_path / "read.db"))
+    assert not schema.backfill_pending(str(tmp_path / "read.db"))
+
+
+def test_concurrent_starts_apply_each_migration_once(tmp_path, monkeypatch):
+    schema.migrate(str(tmp_path / "read.db"))
+    applied = []
+
+    def step(conn):
+        applied.append(threading.get_ident())
+        time.sleep(0.05)  # the other workers queue on the write lock meanwhile
+
+    monkeypatch.setattr(schema, "MIGRATIONS", schema.MIGRATIONS + [(99, "slow step", [step])])
+    with ThreadPoolExecutor(max_workers=4) as workers:
+        versions = list(workers.map(schema.migrate, [str(tmp_path / "read.db")] * 4))
+    assert versions == [99] * 4
+    assert len(applied) == 1
+
+
+def test_failed_migration_leaves_nothing_behind(tmp_path, monkeypatch):
+    version = schema.migrate(str(tmp_path / "read.db"))
+
+    def broken(conn):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    steps = ["CREATE TABLE half_done (x)", broken]
+    monkeypatch.setattr(schema, "MIGRATIONS", schema.MIGRATIONS + [(99, "broken step", steps)])
+    with pytest.raises(sqlite3.OperationalError):
+        schema.migrate(str(tmp_path / "read.db"))
+    conn = sqlite3.connect(str(tmp_path / "read.db"))
+    assert schema.current_version(conn) == version
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name='half_done'").fetchone() is None
+
+
+def test_insert_without_epoch_gets_one_from_the_trigger(tmp_path):
+    schema.migrate(str(tmp_path / "read.db"))
+    conn = sqlite3.connect(str(tmp_path / "read.db"))
+    with conn:
+        conn.execute("INSERT INTO file_system_usage (timestamp, customer, sid, host) VALUES ('2026-03-01 10:00:00', 'C', 'S', 'h')")
+        conn.execute("INSERT INTO system_usage (timestamp, ts, customer) VALUES ('2026-03-01 10:00:00', 42, 'C')")
+    assert conn.execute("SELECT ts FROM file_system_usage").fetchone() == (1772359200,)
+    assert conn.execute("SELECT ts FROM system_usage").fetchone() == (42,)  # explicit epochs are kept
+
+
+def test_range_queries_use_the_epoch_index(tmp_path):
+    schema.migrate(str(tmp_path / "read.db"))
+    conn = sqlite3.connect(str(tmp_path / "read.db"))
+    plan = " ".join(row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT cpu FROM system_usage WHERE customer=? AND sid=? AND host=? AND ts >= ? AND ts < ?",
+        ("C", "S", "h", 0, 1)))
+    assert "idx_system_usage_cust_sid_host_epoch" in plan
+
+
+def test_migrations_keep_source_timestamps(tmp_path, monkeypatch):
+    conn = _database_at(tmp_path / "read.db", 11, monkeypatch)
+    with conn:
+        conn.execute("INSERT INTO system_usage (timestamp, customer) VALUES ('2025-05-27T15:17:58.183062', 'C')")
+    schema.migrate(str(tmp_path / "read.db"))
+    assert conn.execute("SELECT timestamp, ts FROM system_usage").fetchone() == ("2025-05-27T15:17:58.183062", 1748359078)
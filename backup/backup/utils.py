@@ -1,33 +1,95 @@
 # utils.py
-import sqlite3
+import os
 import logging
+import threading
+import contextvars
+from flask import current_app, has_app_context
 from constants import DB_PATH
-import os
-# Ensure the logs directory exists
-os.makedirs("logs", exist_ok=True)
+from db import pool
+import metrics
+import calendar
+from datetime import date, datetime, timedelta
+
+_pinned_db = contextvars.ContextVar("pinned_db", default=None)
+_background = set()  # (job name, db path) running on a background thread
+_background_lock = threading.Lock()
+
+
+# ---- settings of the serving app (app.create_app); module defaults elsewhere ----
+def setting(name, default):
+    return current_app.config.get(name, default) if has_app_context() else default
 
-# Setup logging
-logging.basicConfig(
-    filename="/opt/myapp/app.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+def db_path():
+    # pinned by use_db() (export processes), else the app's DB_PATH, else read.db
+    return _pinned_db.get() or setting("DB_PATH", DB_PATH)
+
+def use_db(path):
+    # for code running outside an app context on another app's database
+    return _pinned_db.set(path)
+
+def data_dir(name):
+    # PARTITION_DIR / ARCHIVE_DIR / EXPORT_DIR, relative to the database's directory
+    return os.path.join(os.path.dirname(db_path()), name)
 
 def get_db_connection():
+    # pooled, per-thread connection to db_path() -- callers must not close it
     try:
-        return sqlite3.connect(DB_PATH)
+        return pool.connection(db_path())
     except Exception as e:
-        logging.error(f"Database connection error: {e}")
+        logging.error("Database connection error: %s", e)
         raise
 
-def fetch_query(sql, params=()):
+def in_background(name, target, *args):
+    # target(*args) on a daemon thread against db_path(), at most one per name
+    # and database at a time; returns the thread, or None if one is running
+    key = (name, db_path())
+    with _background_lock:
+        if key in _background:
+            return None
+        _background.add(key)
+    thread = threading.Thread(target=_run_in_background, args=(key, target, args), name=name, daemon=True)
+    thread.start()
+    return thread
+
+def _run_in_background(key, target, args):
+    use_db(key[1])  # a new thread has no app context
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(sql, params)
-        result = cursor.fetchall()
-        conn.close()
-        return result
+        target(*args)
+    except Exception:
+        logging.exception("Background %s failed", key[0])
+    finally:
+        with _background_lock:
+            _background.discard(key)
+
+def fetch_query(sql, params=(), name=None):
+    # `name` labels the query in /metrics; defaults to its constants.SQL key
+    try:
+        return metrics.fetchall(get_db_connection(), sql, params, name)
     except Exception as e:
-        logging.exception(f"Error executing query: {sql} with params {params}")
+        logging.exception("Error executing query: %s with params %s", sql, params)
         return []
+
+
+# ---- half-open timestamp ranges: [start, end) as ISO strings ----
+def day_range(day):
+    start = date.fromisoformat(day[:10])
+    return start.isoformat(), (start + timedelta(days=1)).isoformat()
+
+def date_span(start_date, end_date):
+    # inclusive end date from the forms -> exclusive upper bound
+    end = date.fromisoformat(end_date[:10]) + timedelta(days=1)
+    return date.fromisoformat(start_date[:10]).isoformat(), end.isoformat()
+
+def month_range(year_month):
+    start = date.fromisoformat(year_month[:7] + "-01")
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start.isoformat(), end.isoformat()
+
+
+# ---- INTEGER epoch-second columns (ts / start_ts); naive timestamps are UTC ----
+def epoch(value):
+    return calendar.timegm(datetime.fromisoformat(value).utctimetuple())
+
+def epoch_range(bounds):
+    start, end = bounds
+    return epoch(start), epoch(end)